@@ -0,0 +1,135 @@
+import sys
+import os
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+sys.path.append(os.path.abspath('src'))
+import pandas as pd
+
+from preprocessing import PRODUCT_KEYWORDS, RAW_DTYPES, clean_text, filter_chunk, preprocess_chunks
+
+# Preprocessing benchmark: generates a synthetic raw complaints CSV, then filters and cleans
+# it with the row-wise reference (one .apply per narrative, one lambda per product) and with
+# the vectorized engine on 1..N worker processes. Reports rows/second overall and per worker
+# and checks that every run produces the same rows.
+
+PRODUCTS = [
+    "Credit card or prepaid card", "Checking or savings account", "Mortgage", "Student loan",
+    "Money transfer, virtual currency, or money service", "Payday loan, title loan, or personal loan",
+    "Debt collection", "Vehicle loan or lease",
+]
+ISSUES = ["Billing dispute", "Fees or interest", "Managing an account", "Fraud or scam", "Closing an account"]
+COMPANIES = ["Bank of Example", "Acme Credit", "First National", "Union Savings", "Rapid Transfer Co"]
+SENTENCES = [
+    "On XX/XX/XXXX I contacted the company about my account.",
+    "They charged me a fee of ${amount} that I never agreed to.",
+    "My account ending in XXXX was closed without notice.",
+    "Customer service refused to refund the charge after I disputed it.",
+    "The transfer took more than {days} days to arrive.\n\nI called again on XX/XX/XXXX.",
+    "I noticed   unauthorized transactions on my statement\tlast month.",
+    "This has damaged my credit report and I want the company to correct it.",
+    "The representative said “we can’t help you” and hung up.",
+]
+
+def make_raw_csv(path, n, seed):
+    rng = random.Random(seed)
+    rows = []
+    for i in range(n):
+        narrative = None
+        if rng.random() < 0.6:
+            narrative = " ".join(rng.choice(SENTENCES).format(amount=rng.randint(10, 900), days=rng.randint(2, 30))
+                                 for _ in range(rng.randint(3, 25)))
+        rows.append({
+            "Date received": f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "Product": rng.choice(PRODUCTS),
+            "Issue": rng.choice(ISSUES),
+            "Sub-issue": "",
+            "Consumer complaint narrative": narrative,
+            "Company": rng.choice(COMPANIES),
+            "State": "CA",
+            "Complaint ID": 1000000 + i,
+        })
+    pd.DataFrame(rows).to_csv(path, index=False)
+
+
+def reference_filter(chunk):
+    # Row-wise preprocessing: a Python lambda per product value and clean_text per narrative
+    mask_product = chunk['Product'].astype(str).apply(lambda x: any(k in x.lower() for k in PRODUCT_KEYWORDS))
+    filtered = chunk[mask_product & chunk['Consumer complaint narrative'].notnull()].copy()
+    filtered['cleaned_narrative'] = filtered['Consumer complaint narrative'].apply(clean_text)
+    return filtered['cleaned_narrative']
+
+
+def timed_run(run):
+    start = time.perf_counter()
+    outputs = run()
+    return time.perf_counter() - start, pd.concat(outputs)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark complaint filtering and narrative cleaning.")
+    parser.add_argument("--rows", type=int, default=200000, help="Synthetic raw complaints to generate")
+    parser.add_argument("--chunk-rows", type=int, default=25000, help="Rows per chunk handed to a worker")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count() or 1}", help="Comma-separated worker counts to run")
+    parser.add_argument("--workspace", default=os.path.join(tempfile.gettempdir(), "preprocess-benchmark"))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args()
+
+    os.makedirs(args.workspace, exist_ok=True)
+    csv_path = os.path.join(args.workspace, f"raw_{args.rows}.csv")
+    if not os.path.exists(csv_path):
+        print(f"Generating {args.rows} synthetic raw complaints in {csv_path}...")
+        make_raw_csv(csv_path, args.rows, args.seed)
+
+    start = time.perf_counter()
+    chunks = list(pd.read_csv(csv_path, chunksize=args.chunk_rows, usecols=lambda c: c in RAW_DTYPES, dtype=RAW_DTYPES))
+    read_seconds = time.perf_counter() - start
+    print(f"Read {args.rows} rows in {len(chunks)} chunks in {read_seconds:.2f}s (not included below)")
+
+    results = []
+    print("Running row-wise reference...")
+    seconds, reference = timed_run(lambda: [reference_filter(chunk) for chunk in chunks])
+    results.append({"engine": "row-wise", "workers": 1, "seconds": round(seconds, 3), "identical": True})
+
+    for workers in [int(w) for w in args.workers.split(",") if w.strip()]:
+        print(f"Running vectorized engine on {workers} worker(s)...")
+        seconds, output = timed_run(lambda: [filtered['cleaned_narrative']
+                                             for filtered in preprocess_chunks(chunks, workers, task=filter_chunk)
+                                             if filtered is not None])
+        identical = output.index.equals(reference.index) and output.tolist() == reference.tolist()
+        results.append({"engine": "vectorized", "workers": workers, "seconds": round(seconds, 3), "identical": identical})
+
+    base_seconds = results[0]["seconds"]
+    print(f"\n{'engine':<12}{'workers':>8}{'seconds':>9}{'rows/s':>10}{'rows/s/core':>13}{'speedup':>9}  output")
+    for r in results:
+        r["rows_per_second"] = round(args.rows / r["seconds"])
+        r["rows_per_second_per_core"] = round(r["rows_per_second"] / r["workers"])
+        r["speedup"] = round(base_seconds / r["seconds"], 2)
+        print(f"{r['engine']:<12}{r['workers']:>8}{r['seconds']:>9}{r['rows_per_second']:>10}"
+              f"{r['rows_per_second_per_core']:>13}{r['speedup']:>8}x  {'same' if r['identical'] else 'DIFFERENT'}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "rows": args.rows,
+                "chunk_rows": args.chunk_rows,
+                "kept_rows": len(reference),
+                "read_seconds": round(read_seconds, 3),
+                "cpu_count": os.cpu_count(),
+                "platform": platform.platform(),
+                "results": results,
+            }, f, indent=2)
+        print(f"\nSaved results to {args.output}")
+
+    if not all(r["identical"] for r in results):
+        print("❌ FAIL: the vectorized engine's output differs from the row-wise reference")
+        sys.exit(1)
+    print("✅ PASS: identical output for every worker count")
+
+
+if __name__ == "__main__":
+    main()
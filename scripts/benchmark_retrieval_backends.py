@@ -0,0 +1,93 @@
+import sys
+import os
+import json
+import time
+import argparse
+sys.path.append(os.path.abspath('src'))
+import numpy as np
+import chromadb
+from numpy_index import NumpyIndex, numpy_index_dir
+from retrieval_backends import ChromaBackend, NumpyBackend
+from rag_pipeline import VECTOR_STORE_DIR, TOP_K
+
+parser = argparse.ArgumentParser(description="Compare Chroma (HNSW) and NumPy (exact) retrieval latency and recall.")
+parser.add_argument("--queries", type=int, default=200, help="Number of benchmark queries")
+parser.add_argument("--k", type=int, default=TOP_K)
+parser.add_argument("--batch-size", type=int, default=32, help="Queries per call for the batched NumPy run")
+parser.add_argument("--filter-product", help="Also apply a product equality filter")
+parser.add_argument("--output", help="Write results as JSON to this file")
+args = parser.parse_args()
+
+
+def percentiles(samples):
+    arr = np.asarray(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(arr, 50)), 3),
+            "p95_ms": round(float(np.percentile(arr, 95)), 3),
+            "p99_ms": round(float(np.percentile(arr, 99)), 3),
+            "mean_ms": round(float(arr.mean()), 3)}
+
+
+print(f"Loading indexes from {VECTOR_STORE_DIR}...")
+collection = chromadb.PersistentClient(path=VECTOR_STORE_DIR).get_collection("complaints_rag")
+index = NumpyIndex(numpy_index_dir(VECTOR_STORE_DIR))
+chroma = ChromaBackend(collection)
+exact = NumpyBackend(index)
+filters = {"product": args.filter_product} if args.filter_product else None
+
+# Queries: stored chunk vectors with noise, so they look like real (near-duplicate-free) queries
+rng = np.random.default_rng(42)
+rows = rng.choice(np.flatnonzero(index.live), size=min(args.queries, index.live_count), replace=False)
+base = np.asarray(index.embeddings[np.sort(rows)], dtype=np.float32)
+queries = base + rng.normal(scale=0.05, size=base.shape).astype(np.float32)
+print(f"Running {len(queries)} queries, k={args.k}, filters={filters}")
+
+# Warm up both paths
+chroma.query(queries[:1], args.k, filters)
+exact.query(queries[:1], args.k, filters)
+
+chroma_times, numpy_times, recalls = [], [], []
+for q in queries:
+    start = time.perf_counter()
+    chroma_docs = chroma.query([q], args.k, filters)[0]
+    chroma_times.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    exact_docs = exact.query([q], args.k, filters)[0]
+    numpy_times.append(time.perf_counter() - start)
+
+    truth = {d["id"] for d in exact_docs}
+    if truth:
+        recalls.append(len(truth & {d["id"] for d in chroma_docs}) / len(truth))
+
+start = time.perf_counter()
+for i in range(0, len(queries), args.batch_size):
+    exact.query(queries[i:i + args.batch_size], args.k, filters)
+batched_elapsed = time.perf_counter() - start
+
+results = {
+    "chunks": index.live_count,
+    "dim": index.dim,
+    "dtype": str(index.embeddings.dtype),
+    "queries": len(queries),
+    "k": args.k,
+    "filters": filters,
+    "chroma": percentiles(chroma_times),
+    "numpy": percentiles(numpy_times),
+    "numpy_batched_qps": round(len(queries) / batched_elapsed, 1),
+    "chroma_qps": round(len(queries) / sum(chroma_times), 1),
+    # NumPy search is exact, so it is the ground truth for Chroma's HNSW recall
+    "chroma_recall_at_k": round(float(np.mean(recalls)), 4) if recalls else None,
+}
+
+print(f"\n{'Backend':<16}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+for name in ("chroma", "numpy"):
+    r = results[name]
+    print(f"{name:<16}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}")
+print(f"\nChroma throughput: {results['chroma_qps']} q/s")
+print(f"NumPy batched throughput (batch {args.batch_size}): {results['numpy_batched_qps']} q/s")
+print(f"Chroma recall@{args.k} vs exact: {results['chroma_recall_at_k']}")
+
+if args.output:
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Saved results to {args.output}")
@@ -0,0 +1,380 @@
+import sys
+import os
+import json
+import time
+import random
+import shutil
+import platform
+import argparse
+import tempfile
+import threading
+import subprocess
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.abspath('src'))
+import numpy as np
+import pandas as pd
+
+# Offline serving benchmark: builds a synthetic complaints CSV and vector store, starts the
+# API with the deterministic "offline" embedder/LLM stand-ins, drives the endpoints at a
+# fixed concurrency and writes throughput / latency / time-to-first-token per scenario.
+
+QUESTIONS = [
+    "What are the fees for late payment?",
+    "Why are customers unhappy with credit cards?",
+    "What problems do people report with money transfers?",
+    "Are there complaints about unauthorized transactions?",
+    "What issues come up with savings account interest?",
+    "How do companies handle billing disputes?",
+    "What are common complaints about personal loan repayment?",
+    "Do customers report delays in receiving transferred funds?",
+]
+PRODUCTS = {
+    "Credit card": ["Billing dispute", "Late fee", "Credit limit decreased", "Unauthorized charge"],
+    "Personal loan": ["Payment processing", "Loan servicing", "Unexpected fees", "Credit reporting"],
+    "Savings account": ["Interest not paid", "Account closed", "Deposit hold", "Fees charged"],
+    "Money transfers": ["Funds not received", "Wrong amount", "Transfer delayed", "Fraudulent transfer"],
+}
+COMPANIES = ["Bank of Example", "Acme Credit", "First National", "Union Savings", "Rapid Transfer Co", "Metro Lending"]
+STATES = ["CA", "NY", "TX", "FL", "IL", "WA"]
+RESPONSES = ["Closed with explanation", "Closed with monetary relief", "In progress", "Closed with non-monetary relief"]
+SENTENCES = [
+    "I contacted the company about my {product} account several times.",
+    "They charged me a fee of ${amount} that I never agreed to.",
+    "The issue was {issue} and nobody could explain why.",
+    "Customer service refused to refund the charge after I disputed it.",
+    "My payment was made on time but it was reported as late.",
+    "The transfer of ${amount} took more than {days} days to arrive.",
+    "I noticed unauthorized transactions on my statement last month.",
+    "The interest rate on the account changed without any notice.",
+    "I was told the problem would be fixed within {days} days but it was not.",
+    "This has damaged my credit report and I want the company to correct it.",
+]
+# Columns of the raw CFPB export, in file order (the recent-complaints endpoint reads by position)
+RAW_COLUMNS = [
+    "Date received", "Product", "Sub-product", "Issue", "Sub-issue", "Consumer complaint narrative",
+    "Company public response", "Company", "State", "ZIP code", "Tags", "Consumer consent provided?",
+    "Submitted via", "Date sent to company", "Company response to consumer", "Timely response?",
+    "Consumer disputed?", "Complaint ID",
+]
+
+parser = argparse.ArgumentParser(description="Offline load benchmark for the RAG API.")
+parser.add_argument("--workspace", default=os.path.join(tempfile.gettempdir(), "rag-benchmark"),
+                    help="Directory for the synthetic CSV, vector store, database and server log")
+parser.add_argument("--rebuild", action="store_true", help="Regenerate the synthetic data even if it exists")
+parser.add_argument("--complaints", type=int, default=2000, help="Synthetic complaints to generate")
+parser.add_argument("--scenarios", default="ask,ws_ask,complaints_stats,complaints_search,complaints_trends,complaints_compare,complaints_recent")
+parser.add_argument("--requests", type=int, default=100, help="Measured requests per scenario")
+parser.add_argument("--concurrency", type=int, default=8)
+parser.add_argument("--warmup", type=int, default=5, help="Unmeasured requests per scenario")
+parser.add_argument("--allow-cache", action="store_true", help="Repeat questions verbatim so the answer cache can hit")
+parser.add_argument("--no-lake", action="store_true", help="Serve /api/complaints/* from the CSV instead of the Parquet lake")
+parser.add_argument("--retrieval-backend", default="chroma", choices=["chroma", "numpy"])
+parser.add_argument("--port", type=int, default=8765)
+parser.add_argument("--output", default="benchmark_results.json")
+parser.add_argument("--baseline", help="Compare against this results file and exit 1 on regression")
+parser.add_argument("--save-baseline", help="Also write the results to this baseline file")
+parser.add_argument("--tolerance", type=float, default=0.25,
+                    help="Allowed relative p95 latency increase / throughput decrease against the baseline")
+args = parser.parse_args()
+
+CSV_PATH = os.path.join(args.workspace, "complaints.csv")
+LAKE_DIR = os.path.join(args.workspace, "lake")
+STORE_DIR = os.path.join(args.workspace, "vector_store")
+BASE_URL = f"http://127.0.0.1:{args.port}"
+
+
+# --- Synthetic data ---
+
+def make_complaints(n, seed=42):
+    rng = random.Random(seed)
+    start = date(2024, 1, 1)
+    rows = []
+    for i in range(n):
+        product = rng.choice(list(PRODUCTS))
+        issue = rng.choice(PRODUCTS[product])
+        fill = {"product": product.lower(), "issue": issue.lower(), "amount": rng.randint(10, 900), "days": rng.randint(2, 30)}
+        narrative = " ".join(rng.choice(SENTENCES).format(**fill) for _ in range(rng.randint(3, 9)))
+        received = start + timedelta(days=rng.randint(0, 420))
+        rows.append({
+            "Date received": received.isoformat(),
+            "Product": product,
+            "Sub-product": "",
+            "Issue": issue,
+            "Sub-issue": "",
+            "Consumer complaint narrative": narrative,
+            "Company public response": "",
+            "Company": rng.choice(COMPANIES),
+            "State": rng.choice(STATES),
+            "ZIP code": f"{rng.randint(10000, 99999)}",
+            "Tags": "",
+            "Consumer consent provided?": "Consent provided",
+            "Submitted via": "Web",
+            "Date sent to company": received.isoformat(),
+            "Company response to consumer": rng.choice(RESPONSES),
+            "Timely response?": "Yes",
+            "Consumer disputed?": "N/A",
+            "Complaint ID": 9000000 + i,
+        })
+    return pd.DataFrame(rows, columns=RAW_COLUMNS)
+
+
+def prepare_workspace():
+    if os.path.exists(os.path.join(STORE_DIR, "index_version.txt")) and not args.rebuild:
+        print(f"Reusing synthetic workspace in {args.workspace}")
+        return
+    shutil.rmtree(args.workspace, ignore_errors=True)
+    os.makedirs(args.workspace)
+
+    print(f"Generating {args.complaints} synthetic complaints...")
+    raw = make_complaints(args.complaints)
+    raw.to_csv(CSV_PATH, index=False)
+    from data_lake import COMPLAINTS_LAYOUT, convert_csv
+    convert_csv(CSV_PATH, LAKE_DIR, COMPLAINTS_LAYOUT)
+
+    # Index with the same chunking and the offline embedder the server will query with
+    os.environ["VECTOR_STORE_DIR"] = STORE_DIR
+    os.environ["EMBEDDING_BACKEND"] = "offline"
+    # Every run embeds from scratch so index build times stay comparable
+    os.environ["EMBEDDING_CACHE_DIR"] = ""
+    from embedding_pipeline import create_vector_store
+    processed = pd.DataFrame({
+        "complaint_id": raw["Complaint ID"],
+        "product": raw["Product"],
+        "issue": raw["Issue"],
+        "sub_issue": raw["Sub-issue"],
+        "company": raw["Company"],
+        "date_received": raw["Date received"],
+        "cleaned_narrative": raw["Consumer complaint narrative"].str.lower(),
+    })
+    create_vector_store(processed)
+
+
+# --- Server ---
+
+def start_server():
+    env = dict(
+        os.environ,
+        LLM_BACKEND="offline",
+        EMBEDDING_BACKEND="offline",
+        RETRIEVAL_BACKEND=args.retrieval_backend,
+        VECTOR_STORE_DIR=STORE_DIR,
+        COMPLAINTS_CSV=CSV_PATH,
+        COMPLAINTS_LAKE=os.path.join(args.workspace, "no_lake") if args.no_lake else LAKE_DIR,
+        STATS_CUBE_DIR=os.path.join(args.workspace, "stats_cube"),
+        SEARCH_INDEX_PATH=os.path.join(args.workspace, "search_index.db"),
+        DATABASE_URL=f"sqlite:///{os.path.join(args.workspace, 'benchmark.db')}",
+        ANSWER_MODE_CALIBRATION=os.path.join(args.workspace, "answer_mode_calibration.json"),
+        MODEL_PRELOAD="",
+    )
+    log = open(os.path.join(args.workspace, "server.log"), "w")
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.api:app", "--host", "127.0.0.1", "--port", str(args.port)],
+        env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+    return server, log
+
+
+def wait_ready(server, timeout=300):
+    import requests
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Server exited with code {server.returncode}; see {args.workspace}/server.log")
+        try:
+            if requests.get(f"{BASE_URL}/ready", timeout=2).status_code == 200:
+                return
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError(f"Server not ready after {timeout}s")
+
+
+def login():
+    import requests
+    response = requests.post(f"{BASE_URL}/api/auth/login", data={"username": "admin@creditrust.com", "password": "admin123"})
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+# --- Load generation ---
+
+_local = threading.local()
+
+
+def _session(token):
+    import requests
+    if getattr(_local, "session", None) is None:
+        _local.session = requests.Session()
+        _local.session.headers["Authorization"] = f"Bearer {token}"
+    return _local.session
+
+
+def _question(i, scenario):
+    # The scenario name keeps ws_ask from replaying the questions /ask just cached
+    question = QUESTIONS[i % len(QUESTIONS)]
+    return question if args.allow_cache else f"{question} ({scenario} request {i})"
+
+
+def ask(i, token):
+    start = time.perf_counter()
+    response = _session(token).post(f"{BASE_URL}/ask", json={"question": _question(i, "ask")})
+    return time.perf_counter() - start, None, response.status_code == 200
+
+
+def ws_ask(i, token):
+    # One socket per worker thread, several questions per socket (as the UI does)
+    from websockets.sync.client import connect
+    if getattr(_local, "ws", None) is None:
+        _local.ws = connect(f"ws://127.0.0.1:{args.port}/ws/ask")
+    start = time.perf_counter()
+    _local.ws.send(json.dumps({"token": token, "question": _question(i, "ws_ask")}))
+    ttft = None
+    while True:
+        message = json.loads(_local.ws.recv())
+        if message["type"] == "token" and ttft is None:
+            ttft = time.perf_counter() - start
+        elif message["type"] == "done":
+            return time.perf_counter() - start, ttft, True
+        elif message["type"] in ("error", "cancelled"):
+            return time.perf_counter() - start, ttft, False
+
+
+def get(path):
+    def call(i, token):
+        start = time.perf_counter()
+        response = _session(token).get(f"{BASE_URL}{path}")
+        return time.perf_counter() - start, None, response.status_code == 200
+    return call
+
+
+SCENARIOS = {
+    "ask": ask,
+    "ws_ask": ws_ask,
+    "complaints_stats": get("/api/complaints/stats"),
+    "complaints_search": get("/api/complaints/search?q=fee&page=1&limit=50"),
+    "complaints_trends": get("/api/complaints/trends"),
+    "complaints_compare": get("/api/complaints/compare?productA=Credit%20card&productB=Savings%20account"),
+    "complaints_recent": get("/api/complaints/recent?limit=20"),
+}
+
+
+def percentiles(samples):
+    if not samples:
+        return None
+    arr = np.asarray(samples) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(arr, 50)), 2),
+        "p95_ms": round(float(np.percentile(arr, 95)), 2),
+        "p99_ms": round(float(np.percentile(arr, 99)), 2),
+        "mean_ms": round(float(arr.mean()), 2),
+    }
+
+
+def run_scenario(name, token):
+    call = SCENARIOS[name]
+
+    def safe(i):
+        try:
+            return call(i, token)
+        except Exception as e:
+            print(f"  {name} request {i} failed: {e}")
+            return 0.0, None, False
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        list(pool.map(safe, range(-args.warmup, 0)))
+        start = time.perf_counter()
+        results = list(pool.map(safe, range(args.requests)))
+        elapsed = time.perf_counter() - start
+
+    ok = [r for r in results if r[2]]
+    return {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "duration_s": round(elapsed, 3),
+        "throughput_rps": round(len(ok) / elapsed, 2) if elapsed else 0.0,
+        "latency": percentiles([r[0] for r in ok]),
+        "ttft": percentiles([r[1] for r in ok if r[1] is not None]),
+    }
+
+
+def compare(results, baseline):
+    regressions = []
+    print(f"\n{'Scenario':<22}{'p95 ms':>10}{'base':>10}{'rps':>10}{'base':>10}")
+    for name, current in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base or not current["latency"] or not base["latency"]:
+            continue
+        p95, base_p95 = current["latency"]["p95_ms"], base["latency"]["p95_ms"]
+        rps, base_rps = current["throughput_rps"], base["throughput_rps"]
+        print(f"{name:<22}{p95:>10}{base_p95:>10}{rps:>10}{base_rps:>10}")
+        if base_p95 and p95 > base_p95 * (1 + args.tolerance):
+            regressions.append(f"{name}: p95 {p95} ms vs baseline {base_p95} ms")
+        if base_rps and rps < base_rps * (1 - args.tolerance):
+            regressions.append(f"{name}: throughput {rps} rps vs baseline {base_rps} rps")
+        if current["errors"] > base.get("errors", 0):
+            regressions.append(f"{name}: {current['errors']} errors vs baseline {base.get('errors', 0)}")
+    return regressions
+
+
+if __name__ == "__main__":
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        print(f"❌ Unknown scenarios: {', '.join(unknown)}. Choose from: {', '.join(SCENARIOS)}")
+        sys.exit(2)
+
+    prepare_workspace()
+    if os.path.exists(os.path.join(args.workspace, "benchmark.db")):
+        os.remove(os.path.join(args.workspace, "benchmark.db"))
+
+    print(f"Starting API on port {args.port} with offline models...")
+    server, log = start_server()
+    try:
+        wait_ready(server)
+        token = login()
+        results = {
+            "config": {
+                "requests": args.requests,
+                "concurrency": args.concurrency,
+                "warmup": args.warmup,
+                "complaints": args.complaints,
+                "allow_cache": args.allow_cache,
+                "retrieval_backend": args.retrieval_backend,
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "cpus": os.cpu_count(),
+            },
+            "scenarios": {},
+        }
+        for name in scenarios:
+            print(f"Running {name} ({args.requests} requests, concurrency {args.concurrency})...")
+            summary = run_scenario(name, token)
+            results["scenarios"][name] = summary
+            latency = summary["latency"] or {}
+            line = f"  {summary['throughput_rps']} rps, p50 {latency.get('p50_ms')} ms, p95 {latency.get('p95_ms')} ms, p99 {latency.get('p99_ms')} ms"
+            if summary["ttft"]:
+                line += f", TTFT p50 {summary['ttft']['p50_ms']} ms"
+            print(line + (f", {summary['errors']} errors" if summary["errors"] else ""))
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+        log.close()
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nSaved results to {args.output}")
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {args.save_baseline}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f))
+        if regressions:
+            print("\n❌ FAIL: regressions against baseline")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print(f"\n✅ PASS: within {args.tolerance:.0%} of baseline")
@@ -0,0 +1,108 @@
+import sys
+import os
+import json
+import time
+import argparse
+sys.path.append(os.path.abspath('src'))
+import numpy as np
+from rag_pipeline import RAGPipeline, ANSWER_MODE_CALIBRATION
+
+# answerable: the complaint corpus can answer it; unanswerable: off-topic for the corpus
+DEFAULT_LABELED_QUESTIONS = [
+    {"question": "What are the fees for late payment?", "answerable": True},
+    {"question": "Why are customers unhappy with credit cards?", "answerable": True},
+    {"question": "What problems do people report with money transfers?", "answerable": True},
+    {"question": "Are there complaints about unauthorized transactions?", "answerable": True},
+    {"question": "What issues come up with savings account interest?", "answerable": True},
+    {"question": "How do companies handle billing disputes?", "answerable": True},
+    {"question": "What are common complaints about personal loan repayment?", "answerable": True},
+    {"question": "Do customers report delays in receiving transferred funds?", "answerable": True},
+    {"question": "What do consumers say about closing their accounts?", "answerable": True},
+    {"question": "Are there complaints about credit limit decreases?", "answerable": True},
+    {"question": "What is the capital of Australia?", "answerable": False},
+    {"question": "How do I bake sourdough bread at home?", "answerable": False},
+    {"question": "Who won the football world cup in 2014?", "answerable": False},
+    {"question": "What is the boiling point of water on a mountain?", "answerable": False},
+    {"question": "Recommend a good science fiction novel.", "answerable": False},
+    {"question": "How many moons does Jupiter have?", "answerable": False},
+]
+LATENCY_MODES = ("generative", "extractive", "retrieval")
+
+parser = argparse.ArgumentParser(description="Calibrate the relevance gate and per-mode latency for answer modes.")
+parser.add_argument("--questions", help='JSON file with a list of {"question": ..., "answerable": true|false, "filters": {...}}')
+parser.add_argument("--min-recall", type=float, default=0.95, help="Fraction of answerable questions that must pass the gate")
+parser.add_argument("--latency-samples", type=int, default=5, help="Questions timed per mode (0 to skip)")
+parser.add_argument("--output", default=ANSWER_MODE_CALIBRATION)
+args = parser.parse_args()
+
+
+def pick_threshold(answerable, unanswerable, min_recall):
+    # Smallest distance cut that keeps min_recall of answerable questions; it gates the
+    # most unanswerable questions among all cuts that meet the recall target
+    answerable = np.sort(np.asarray(answerable))
+    keep = max(1, int(np.ceil(min_recall * len(answerable))))
+    threshold = float(answerable[keep - 1])
+    # Move the cut halfway to the next distance above it so it is not on a sample
+    above = [d for d in list(answerable) + list(unanswerable) if d > threshold]
+    if above:
+        threshold = (threshold + min(above)) / 2
+    return threshold
+
+
+labeled = DEFAULT_LABELED_QUESTIONS
+if args.questions:
+    with open(args.questions) as f:
+        labeled = json.load(f)
+
+rag = RAGPipeline()
+
+print(f"Scoring retrieval for {len(labeled)} labeled questions...")
+rows = []
+for item in labeled:
+    docs = rag.retrieve_context(item["question"], item.get("filters"))
+    best = float(docs[0]["score"]) if docs else float("inf")
+    rows.append({"question": item["question"], "answerable": bool(item["answerable"]), "best_distance": best})
+    print(f"  {best:8.4f}  {'answerable' if item['answerable'] else 'off-topic ':<11} {item['question']}")
+
+answerable = [r["best_distance"] for r in rows if r["answerable"]]
+unanswerable = [r["best_distance"] for r in rows if not r["answerable"]]
+if not answerable:
+    print("❌ FAIL: need at least one answerable question to calibrate the gate")
+    sys.exit(1)
+
+threshold = pick_threshold(answerable, unanswerable, args.min_recall)
+recall = float(np.mean([d <= threshold for d in answerable]))
+gated = float(np.mean([d > threshold for d in unanswerable])) if unanswerable else None
+print(f"\nrelevance_max_distance = {threshold:.4f}")
+print(f"  answerable passing the gate: {recall:.2%}")
+if gated is not None:
+    print(f"  off-topic gated (LLM skipped): {gated:.2%}")
+
+mode_latency = {}
+if args.latency_samples > 0:
+    samples = [r["question"] for r in rows if r["answerable"]][:args.latency_samples]
+    print(f"\nTiming {len(samples)} questions per mode...")
+    for mode in LATENCY_MODES:
+        times = []
+        for question in samples:
+            start = time.perf_counter()
+            rag.answer_question(question, mode=mode)
+            times.append((time.perf_counter() - start) * 1000)
+        mode_latency[mode] = {
+            "p50_ms": round(float(np.percentile(times, 50)), 2),
+            "p95_ms": round(float(np.percentile(times, 95)), 2),
+        }
+        print(f"  {mode:<11} p50 {mode_latency[mode]['p50_ms']:>9} ms   p95 {mode_latency[mode]['p95_ms']:>9} ms")
+
+calibration = {
+    "relevance_max_distance": threshold,
+    "min_recall": args.min_recall,
+    "answerable_recall": recall,
+    "unanswerable_gated": gated,
+    "mode_latency_ms": mode_latency,
+    "questions": rows,
+}
+os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+with open(args.output, "w") as f:
+    json.dump(calibration, f, indent=2)
+print(f"\n✅ Saved calibration to {args.output}")
@@ -0,0 +1,53 @@
+import sys
+import os
+import json
+import argparse
+sys.path.append(os.path.abspath('src'))
+import chromadb
+from inference_backends import load_embedder, compare_retrieval_overlap, BACKENDS
+from rag_pipeline import VECTOR_STORE_DIR, EMBEDDING_MODEL_NAME, TOP_K
+
+DEFAULT_QUESTIONS = [
+    "What are the fees for late payment?",
+    "Why are customers unhappy with credit cards?",
+    "What problems do people report with money transfers?",
+    "Are there complaints about unauthorized transactions?",
+    "What issues come up with savings account interest?",
+    "How do companies handle billing disputes?",
+    "What are common complaints about personal loan repayment?",
+    "Do customers report delays in receiving transferred funds?",
+    "What do consumers say about closing their accounts?",
+    "Are there complaints about credit limit decreases?",
+]
+
+parser = argparse.ArgumentParser(description="Compare retrieval of a quantized embedder against fp32.")
+parser.add_argument("--backend", default="int8", choices=[b for b in BACKENDS if b not in ("fp32", "offline")])
+parser.add_argument("--questions", help="JSON file with a list of questions")
+parser.add_argument("--k", type=int, default=TOP_K)
+parser.add_argument("--min-overlap", type=float, default=0.8, help="Fail if mean top-k overlap is below this")
+args = parser.parse_args()
+
+questions = DEFAULT_QUESTIONS
+if args.questions:
+    with open(args.questions) as f:
+        questions = json.load(f)
+
+print(f"Loading collection from {VECTOR_STORE_DIR}...")
+collection = chromadb.PersistentClient(path=VECTOR_STORE_DIR).get_collection("complaints_rag")
+
+print(f"Loading {EMBEDDING_MODEL_NAME} as fp32 and {args.backend}...")
+reference = load_embedder(EMBEDDING_MODEL_NAME, "fp32")
+candidate = load_embedder(EMBEDDING_MODEL_NAME, args.backend)
+
+report = compare_retrieval_overlap(collection, questions, reference, candidate, k=args.k)
+
+for row in report["per_question"]:
+    print(f"  {row['overlap']:.2f}  {row['question']}")
+print(f"\nMean top-{args.k} overlap: {report['mean_overlap']:.3f} (min {report['min_overlap']:.3f})")
+print(f"Query embed latency: fp32 {report['reference_embed_ms']} ms, {args.backend} {report['candidate_embed_ms']} ms")
+
+if report["mean_overlap"] >= args.min_overlap:
+    print(f"✅ PASS: {args.backend} retrieval matches fp32 within tolerance")
+else:
+    print(f"❌ FAIL: {args.backend} overlap {report['mean_overlap']:.3f} < {args.min_overlap}")
+    sys.exit(1)
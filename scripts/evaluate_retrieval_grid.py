@@ -0,0 +1,207 @@
+import sys
+import os
+import json
+import time
+import shutil
+import argparse
+import itertools
+sys.path.append(os.path.abspath('src'))
+import numpy as np
+import pandas as pd
+
+parser = argparse.ArgumentParser(description="Measure retrieval quality and latency over a grid of chunking and index parameters.")
+parser.add_argument("--input", default="data/processed/complaints_sample.csv", help="Processed complaints CSV to index")
+parser.add_argument("--limit", type=int, default=5000, help="Complaints read from --input (0 for all)")
+parser.add_argument("--questions", help='JSON file with a list of {"question": ..., "relevant_ids": [...], "filters": {...}}')
+parser.add_argument("--num-questions", type=int, default=200, help="Generated questions when --questions is not given")
+parser.add_argument("--save-questions", help="Write the question set used to this JSON file")
+parser.add_argument("--chunk-sizes", default="500", help="Comma-separated CHUNK_SIZE values")
+parser.add_argument("--chunk-overlaps", default="50", help="Comma-separated CHUNK_OVERLAP values")
+parser.add_argument("--top-k", default="5", help="Comma-separated TOP_K values")
+parser.add_argument("--hnsw-m", default="16", help="Comma-separated Chroma hnsw:M values")
+parser.add_argument("--hnsw-construction-ef", default="100", help="Comma-separated Chroma hnsw:construction_ef values")
+parser.add_argument("--hnsw-search-ef", default="10", help="Comma-separated Chroma hnsw:search_ef values")
+parser.add_argument("--backends", default="chroma,numpy", help="Retrieval backends to query (see RETRIEVAL_BACKENDS)")
+parser.add_argument("--no-dedup", action="store_true", help="Index duplicate narratives separately")
+parser.add_argument("--embedding-cache", action="store_true",
+                    help="Reuse cached chunk embeddings (faster sweeps; build times then exclude cached embedding work)")
+parser.add_argument("--workspace", default="benchmarks/retrieval_grid", help="Directory for the per-configuration indexes")
+parser.add_argument("--keep-indexes", action="store_true", help="Keep each configuration's index in --workspace")
+parser.add_argument("--seed", type=int, default=42)
+parser.add_argument("--output", help="Write results as JSON to this file")
+args = parser.parse_args()
+
+if not args.embedding_cache:
+    os.environ["EMBEDDING_CACHE_DIR"] = ""
+
+import chromadb
+from embedding_pipeline import create_vector_store
+from inference_backends import load_embedder
+from rag_pipeline import RAGPipeline, EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND
+from retrieval_backends import load_backend
+
+QUESTION_WORDS = 12
+
+
+def int_list(value):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+class RetrievalOnlyPipeline(RAGPipeline):
+    """RAGPipeline with only a vector store attached, so retrieve_context runs unchanged without an LLM."""
+
+    def __init__(self, store_dir, backend):
+        self.chroma_client = chromadb.PersistentClient(path=store_dir)
+        self.collection = self.chroma_client.get_collection("complaints_rag")
+        self.retriever = load_backend(backend, self.collection, store_dir)
+
+
+def make_questions(df, count, seed):
+    # Known-item questions: a word window from one complaint's narrative, which is the relevant one
+    rng = np.random.default_rng(seed)
+    rows = df[df['cleaned_narrative'].fillna('').str.split().str.len() >= 2 * QUESTION_WORDS]
+    picked = rows.iloc[rng.permutation(len(rows))[:count]]
+    questions = []
+    for _, row in picked.iterrows():
+        words = str(row['cleaned_narrative']).split()
+        start = int(rng.integers(0, len(words) - QUESTION_WORDS))
+        questions.append({
+            "question": " ".join(words[start:start + QUESTION_WORDS]),
+            "relevant_ids": [str(row['complaint_id'])],
+        })
+    return questions
+
+
+def retrieved_ids(doc):
+    # A representative chunk also stands for the complaints folded into it by dedup
+    meta = doc['metadata']
+    ids = {str(meta['complaint_id'])}
+    ids.update(cid for cid in str(meta.get('duplicate_ids') or '').split(',') if cid)
+    return ids
+
+
+def score(questions, results, k):
+    recalls, reciprocal_ranks = [], []
+    for item, docs in zip(questions, results):
+        relevant = set(map(str, item["relevant_ids"]))
+        found = set()
+        first_rank = None
+        for rank, doc in enumerate(docs[:k], start=1):
+            hits = retrieved_ids(doc) & relevant
+            if hits and first_rank is None:
+                first_rank = rank
+            found |= hits
+        recalls.append(len(found) / len(relevant))
+        reciprocal_ranks.append(1 / first_rank if first_rank else 0.0)
+    return float(np.mean(recalls)), float(np.mean(reciprocal_ranks))
+
+
+def percentiles(samples):
+    arr = np.asarray(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(arr, 50)), 3),
+            "p95_ms": round(float(np.percentile(arr, 95)), 3),
+            "p99_ms": round(float(np.percentile(arr, 99)), 3)}
+
+
+def dir_bytes(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+print(f"Loading complaints from {args.input}...")
+df = pd.read_csv(args.input, nrows=args.limit or None)
+if args.questions:
+    with open(args.questions) as f:
+        questions = json.load(f)
+else:
+    questions = make_questions(df, args.num_questions, args.seed)
+if not questions:
+    print("❌ FAIL: no questions to evaluate")
+    sys.exit(1)
+if args.save_questions:
+    with open(args.save_questions, "w") as f:
+        json.dump(questions, f, indent=2)
+
+print(f"Embedding {len(questions)} questions with {EMBEDDING_MODEL_NAME} ({EMBEDDING_BACKEND})...")
+embedder = load_embedder(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND)
+start = time.perf_counter()
+query_vecs = [embedder.encode(item["question"]) for item in questions]
+embed_seconds = (time.perf_counter() - start) / len(questions)
+
+backends = [b.strip() for b in args.backends.split(",") if b.strip()]
+top_ks = int_list(args.top_k)
+hnsw_grid = list(itertools.product(int_list(args.hnsw_m), int_list(args.hnsw_construction_ef), int_list(args.hnsw_search_ef)))
+results = []
+
+for chunk_size, chunk_overlap in itertools.product(int_list(args.chunk_sizes), int_list(args.chunk_overlaps)):
+    if chunk_overlap >= chunk_size:
+        print(f"Skipping chunk_size={chunk_size}, overlap={chunk_overlap}: overlap must be smaller")
+        continue
+    for grid_index, (m, construction_ef, search_ef) in enumerate(hnsw_grid):
+        name = f"cs{chunk_size}_ov{chunk_overlap}_m{m}_cef{construction_ef}_sef{search_ef}"
+        store_dir = os.path.join(args.workspace, name)
+        shutil.rmtree(store_dir, ignore_errors=True)
+        os.makedirs(store_dir)
+        print(f"\n=== {name} ===")
+        hnsw = {"hnsw:M": m, "hnsw:construction_ef": construction_ef, "hnsw:search_ef": search_ef}
+        start = time.perf_counter()
+        create_vector_store(df, dedup=not args.no_dedup, store_dir=store_dir,
+                            chunk_size=chunk_size, chunk_overlap=chunk_overlap, hnsw=hnsw)
+        build_seconds = time.perf_counter() - start
+        numpy_bytes = dir_bytes(os.path.join(store_dir, "numpy_index"))
+        chroma_bytes = dir_bytes(store_dir) - numpy_bytes
+
+        for backend in backends:
+            # Exact search ignores the HNSW settings; score it once per chunking
+            if backend == "numpy" and grid_index > 0:
+                continue
+            rag = RetrievalOnlyPipeline(store_dir, backend)
+            for k in top_ks:
+                for item, vec in list(zip(questions, query_vecs))[:5]:
+                    rag.retrieve_context(item["question"], item.get("filters"), k=k, query_vec=vec)
+                times, retrieved = [], []
+                for item, vec in zip(questions, query_vecs):
+                    start = time.perf_counter()
+                    docs = rag.retrieve_context(item["question"], item.get("filters"), k=k, query_vec=vec)
+                    times.append(time.perf_counter() - start)
+                    retrieved.append(docs)
+                recall, mrr = score(questions, retrieved, k)
+                results.append({
+                    "chunk_size": chunk_size,
+                    "chunk_overlap": chunk_overlap,
+                    "hnsw_m": m if backend == "chroma" else None,
+                    "hnsw_construction_ef": construction_ef if backend == "chroma" else None,
+                    "hnsw_search_ef": search_ef if backend == "chroma" else None,
+                    "backend": backend,
+                    "k": k,
+                    "recall_at_k": round(recall, 4),
+                    "mrr": round(mrr, 4),
+                    "search_latency": percentiles(times),
+                    "build_seconds": round(build_seconds, 2),
+                    "chunks": rag.collection.count(),
+                    "chroma_bytes": chroma_bytes,
+                    "numpy_index_bytes": numpy_bytes,
+                })
+        if not args.keep_indexes:
+            shutil.rmtree(store_dir, ignore_errors=True)
+
+print(f"\nQuestions: {len(questions)}, query embedding {embed_seconds * 1000:.1f} ms each (not included below)")
+print(f"{'chunk':>6}{'ovl':>5}{'M':>4}{'cEF':>5}{'sEF':>5}  {'backend':<8}{'k':>3}{'recall':>8}{'MRR':>7}"
+      f"{'p50 ms':>9}{'p95 ms':>9}{'build s':>9}{'MB':>8}{'chunks':>8}")
+for r in results:
+    size_mb = (r["chroma_bytes"] if r["backend"] == "chroma" else r["numpy_index_bytes"]) / 1e6
+    hnsw_cols = "".join(f"{'-' if r[key] is None else r[key]:>{width}}" for key, width in
+                        (("hnsw_m", 4), ("hnsw_construction_ef", 5), ("hnsw_search_ef", 5)))
+    print(f"{r['chunk_size']:>6}{r['chunk_overlap']:>5}{hnsw_cols}  {r['backend']:<8}{r['k']:>3}"
+          f"{r['recall_at_k']:>8}{r['mrr']:>7}{r['search_latency']['p50_ms']:>9}{r['search_latency']['p95_ms']:>9}"
+          f"{r['build_seconds']:>9}{size_mb:>8.1f}{r['chunks']:>8}")
+
+if args.output:
+    with open(args.output, "w") as f:
+        json.dump({
+            "input": args.input,
+            "complaints": len(df),
+            "questions": len(questions),
+            "query_embed_ms": round(embed_seconds * 1000, 3),
+            "results": results,
+        }, f, indent=2)
+    print(f"\n✅ Saved results to {args.output}")
@@ -0,0 +1,129 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+def normalize_question(question):
+    return " ".join(str(question).lower().split()).strip(" ?!.")
+
+
+def _scope_key(filters, model):
+    # IN filters match regardless of value order
+    clean = {k: sorted(v) if isinstance(v, list) else v for k, v in (filters or {}).items() if v}
+    return json.dumps(clean, sort_keys=True, default=str), model
+
+
+class AnswerCache:
+    """LRU + TTL cache of full RAG answers, scoped by filters and active model.
+
+    Lookups hit on the exact normalized question; when `similarity_threshold` is set,
+    they can also hit on a cached question whose embedding has cosine similarity
+    above the threshold within the same scope.
+    """
+
+    def __init__(self, max_entries=256, ttl_seconds=3600, similarity_threshold=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _expired(self, entry, now):
+        return self.ttl_seconds and now - entry["created"] > self.ttl_seconds
+
+    def get(self, question, filters=None, model=None, embedding=None, count_miss=True):
+        """The cached result, or None. With count_miss=False a miss is not counted, for an
+        exact-only probe that is followed by a lookup with the question's embedding."""
+        scope = _scope_key(filters, model)
+        key = (normalize_question(question),) + scope
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self._expired(entry, now):
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["result"]
+
+            if embedding is not None and self.similarity_threshold is not None:
+                match = self._semantic_lookup(scope, embedding, now)
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self.semantic_hits += 1
+                    return self._entries[match]["result"]
+
+            if count_miss:
+                self.misses += 1
+            return None
+
+    def _semantic_lookup(self, scope, embedding, now):
+        candidates = [
+            (key, entry) for key, entry in self._entries.items()
+            if key[1:] == scope and entry["embedding"] is not None and not self._expired(entry, now)
+        ]
+        if not candidates:
+            return None
+
+        query = _unit(embedding)
+        matrix = np.stack([entry["embedding"] for _, entry in candidates])
+        sims = matrix @ query
+        best = int(np.argmax(sims))
+        if sims[best] >= self.similarity_threshold:
+            return candidates[best][0]
+        return None
+
+    def put(self, question, result, filters=None, model=None, embedding=None):
+        key = (normalize_question(question),) + _scope_key(filters, model)
+        entry = {
+            "result": result,
+            "embedding": _unit(embedding) if embedding is not None else None,
+            "created": time.time(),
+        }
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self, reason=None):
+        with self._lock:
+            if self._entries:
+                print(f"Invalidating answer cache ({len(self._entries)} entries): {reason}")
+            self._entries.clear()
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "similarity_threshold": self.similarity_threshold,
+                "hits": self.hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.hits + self.semantic_hits) / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+def _unit(vector):
+    vec = np.asarray(vector, dtype=np.float32).ravel()
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
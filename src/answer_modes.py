@@ -0,0 +1,164 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, deque
+
+# generative: retrieve + LLM; extractive: top-scoring retrieved sentences, no LLM;
+# retrieval: sources only; auto: generative unless the relevance gate or the latency
+# budget says otherwise
+ANSWER_MODES = ("auto", "generative", "extractive", "retrieval")
+# Same wording the prompt asks the model to use when the context has no answer
+NO_INFO_ANSWER = "I don't have enough information."
+EXTRACTIVE_MAX_SENTENCES = 3
+# Recent requests per mode kept for latency percentiles
+LATENCY_WINDOW = 1000
+
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+_WORD = re.compile(r"[a-z0-9']+")
+_STOPWORDS = frozenset(
+    "a an and are as at be by do does for from have how i in is it my of on or that the their "
+    "there they this to was were what when where which who why with you your about any".split()
+)
+
+
+def validate_mode(mode):
+    if mode not in ANSWER_MODES:
+        raise ValueError(f"Unknown answer mode '{mode}'. Choose one of: {', '.join(ANSWER_MODES)}")
+    return mode
+
+
+def load_calibration(path):
+    # Written by scripts/calibrate_answer_modes.py; missing file means no gate
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def _terms(text):
+    return [w for w in _WORD.findall(text.lower()) if w not in _STOPWORDS and len(w) > 1]
+
+
+def extract_answer(question, docs, max_sentences=EXTRACTIVE_MAX_SENTENCES):
+    """Returns the retrieved sentences that best match the question's terms.
+
+    Sentences are scored by the IDF-weighted question terms they contain (IDF over the
+    retrieved sentences), normalized by length, with a small bonus for sentences from
+    higher-ranked chunks. The chosen sentences keep their retrieval order.
+    """
+    sentences = []
+    for rank, doc in enumerate(docs):
+        for sentence in _SENTENCE_SPLIT.split(doc['text'].replace("\n", " ")):
+            sentence = sentence.strip()
+            if len(sentence) > 20:
+                sentences.append((rank, sentence, set(_terms(sentence))))
+    query_terms = set(_terms(question))
+    if not sentences or not query_terms:
+        return ""
+
+    doc_freq = Counter(term for _, _, terms in sentences for term in terms & query_terms)
+    n = len(sentences)
+    scored = []
+    seen = set()
+    for i, (rank, sentence, terms) in enumerate(sentences):
+        if sentence.lower() in seen:
+            continue
+        seen.add(sentence.lower())
+        overlap = terms & query_terms
+        if not overlap:
+            continue
+        score = sum(math.log(1 + n / doc_freq[t]) for t in overlap) / math.sqrt(len(terms))
+        score *= 1.0 / (1 + 0.1 * rank)
+        scored.append((score, i, sentence))
+
+    best = sorted(scored, reverse=True)[:max_sentences]
+    return " ".join(sentence for _, _, sentence in sorted(best, key=lambda s: s[1]))
+
+
+class ModeLatencyStats:
+    """Per-mode request counts and latency percentiles over a sliding window."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._counts = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, mode, seconds):
+        with self._lock:
+            self._samples.setdefault(mode, deque(maxlen=self.window)).append(seconds * 1000)
+            self._counts[mode] += 1
+
+    def percentile(self, mode, pct):
+        with self._lock:
+            samples = sorted(self._samples.get(mode, ()))
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * pct / 100))]
+
+    def stats(self):
+        with self._lock:
+            modes = {mode: sorted(samples) for mode, samples in self._samples.items()}
+            counts = dict(self._counts)
+        report = {}
+        for mode, samples in modes.items():
+            report[mode] = {
+                "requests": counts[mode],
+                "avg_ms": round(sum(samples) / len(samples), 2),
+                "p50_ms": round(samples[len(samples) // 2], 2),
+                "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 2),
+            }
+        return report
+
+
+class AnswerModePolicy:
+    """Decides how a request is answered once its retrieval results are known.
+
+    `relevance_max_distance` is the calibrated gate: if even the nearest chunk is
+    farther than this, the LLM is skipped and the no-information answer returned.
+    With a latency budget, auto mode falls back to extractive when the observed p95
+    of generative answers (or the calibrated estimate before any are observed) does
+    not fit in what is left of the budget.
+    """
+
+    def __init__(self, default_mode="auto", relevance_max_distance=None, generative_estimate_ms=None, latency=None):
+        self.default_mode = validate_mode(default_mode)
+        self.relevance_max_distance = relevance_max_distance
+        self.generative_estimate_ms = generative_estimate_ms
+        self.latency = latency or ModeLatencyStats()
+
+    @classmethod
+    def from_calibration(cls, default_mode, path, relevance_max_distance=None):
+        calibration = load_calibration(path)
+        if relevance_max_distance is None:
+            relevance_max_distance = calibration.get("relevance_max_distance")
+        generative_ms = calibration.get("mode_latency_ms", {}).get("generative", {}).get("p95_ms")
+        return cls(default_mode, relevance_max_distance, generative_ms)
+
+    def is_relevant(self, docs):
+        if self.relevance_max_distance is None:
+            return True
+        return bool(docs) and docs[0]['score'] <= self.relevance_max_distance
+
+    def choose(self, mode, docs, elapsed_ms=0.0, latency_budget_ms=None):
+        """Returns the mode that actually runs: generative, extractive, retrieval or gated."""
+        mode = validate_mode(mode or self.default_mode)
+        if mode == "retrieval":
+            return mode
+        if mode == "auto" and not self.is_relevant(docs):
+            return "gated"
+        if mode == "auto" and latency_budget_ms is not None:
+            expected = self.latency.percentile("generative", 95) or self.generative_estimate_ms
+            if expected is not None and elapsed_ms + expected > latency_budget_ms:
+                return "extractive"
+        return "extractive" if mode == "extractive" else "generative"
+
+    def stats(self):
+        return {
+            "default_mode": self.default_mode,
+            "relevance_max_distance": self.relevance_max_distance,
+            "generative_estimate_ms": self.generative_estimate_ms,
+            "latency": self.latency.stats(),
+        }
@@ -1,23 +1,28 @@
 from fastapi import FastAPI, HTTPException, Depends, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import List, Optional, Union
 import uvicorn
 import sys
 import os
 import csv
 import json
-from datetime import datetime
+import math
+import time
+from datetime import datetime, date
 from sqlalchemy.orm import Session
 
 # Ensure src is in path
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from rag_pipeline import RAGPipeline
 from database import get_db, User, RoleEnum, QueryHistory
 from auth import get_password_hash, verify_password, create_access_token, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES, SECRET_KEY, ALGORITHM
 from datetime import timedelta
-from stats_engine import StatsEngine
+from inference_backends import BACKENDS
+from components import Component, ComponentUnavailable, start_phases, readiness_report
+from streaming import AsyncTokenStream
+from metrics import REGISTRY, STAGE_SECONDS, snapshot, timed
 from jose import jwt, JWTError
 import asyncio
 
@@ -33,11 +38,64 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-print("Loading RAG Pipeline shortly...")
-rag_pipeline = RAGPipeline()
-
-print("Initializing StatsEngine...")
-stats_engine = StatsEngine(os.path.join(os.path.dirname(__file__), "..", "data", "complaints.csv"))
+# --- Components ---
+# Heavy imports and model/data loads run in background threads after startup, so the
+# API (auth, history, health) serves immediately. Endpoints that need a component wait
+# up to COMPONENT_WAIT_SECONDS for it and otherwise fail fast with 503.
+COMPONENT_WAIT_SECONDS = float(os.getenv("COMPONENT_WAIT_SECONDS", "30"))
+COMPLAINTS_CSV = os.getenv("COMPLAINTS_CSV", os.path.join(os.path.dirname(__file__), "..", "data", "complaints.csv"))
+# Parquet copy of the complaints (see data_lake.py); used instead of the CSV once built
+COMPLAINTS_LAKE = os.getenv("COMPLAINTS_LAKE", os.path.join(os.path.dirname(__file__), "..", "data", "lake", "complaints"))
+# Pre-aggregated counts behind the stats, compare and trends APIs (see stats_cube.py)
+STATS_CUBE_DIR = os.getenv("STATS_CUBE_DIR", os.path.join(os.path.dirname(__file__), "..", "data", "stats_cube"))
+# Full-text index behind /api/complaints/search (see search_index.py)
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", os.path.join(os.path.dirname(__file__), "..", "data", "search_index.db"))
+RECENT_COLUMNS = ['Complaint ID', 'Product', 'Issue', 'Company', 'State', 'Date received', 'Consumer complaint narrative']
+
+def _build_rag_pipeline():
+    start = time.perf_counter()
+    from rag_pipeline import RAGPipeline
+    import_seconds = time.perf_counter() - start
+    pipeline = RAGPipeline()
+    pipeline.load_timings["imports"] = import_seconds
+    return pipeline
+
+def _build_stats_engine():
+    from stats_engine import StatsEngine
+    engine = StatsEngine(COMPLAINTS_CSV, COMPLAINTS_LAKE, STATS_CUBE_DIR, SEARCH_INDEX_PATH)
+    engine.get_stats()
+    return engine
+
+components = {
+    "rag_pipeline": Component("rag_pipeline", _build_rag_pipeline, phase=1),
+    "stats_engine": Component("stats_engine", _build_stats_engine, phase=2),
+}
+
+def _require(name):
+    def dependency():
+        try:
+            return components[name].get(timeout=COMPONENT_WAIT_SECONDS)
+        except ComponentUnavailable as e:
+            # A failed component is retried on the first request after its backoff
+            retry_after = math.ceil(e.retry_in) if e.retry_in is not None else 5
+            raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(max(retry_after, 1))})
+    return dependency
+
+get_rag_pipeline = _require("rag_pipeline")
+get_stats_engine = _require("stats_engine")
+
+def _component_metrics():
+    metrics = [
+        snapshot("component_ready", "1 once a background component has loaded", "gauge",
+                 [((name,), int(c.ready)) for name, c in components.items()], ["component"]),
+        snapshot("component_load_seconds", "Time a background component took to load", "gauge",
+                 [((name,), c.load_seconds) for name, c in components.items()], ["component"]),
+    ]
+    if components["rag_pipeline"].ready:
+        metrics.extend(components["rag_pipeline"].value.collect_metrics())
+    return metrics
+
+REGISTRY.add_collector(_component_metrics)
 
 # --- Initialization ---
 @app.on_event("startup")
@@ -54,29 +112,39 @@ def startup_event():
         )
         db.add(admin)
         db.commit()
-    # Trigger initial load of stats asynchronously so it doesn't block startup completely
-    # But for a portfolio, we might want it synchronous so first load isn't slow
-    stats_engine.get_stats()
+    # Phase 1: RAG pipeline (vector store, embedder, LLM); phase 2: stats cube over the complaints.
+    # Both load in the background, phase 2 once phase 1 is ready or failed; /ready reports progress.
+    start_phases(components)
 
 # --- Pydantic Models ---
 class FilterParams(BaseModel):
-    product: Optional[str] = None
-    company: Optional[str] = None
+    # Each field takes one value or a list of values (matches any of them)
+    product: Optional[Union[str, List[str]]] = None
+    company: Optional[Union[str, List[str]]] = None
+    issue: Optional[Union[str, List[str]]] = None
+    sub_issue: Optional[Union[str, List[str]]] = None
+    # Inclusive range on date_received
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
 
 class QuestionRequest(BaseModel):
     question: str
     filters: Optional[FilterParams] = None
+    mode: Optional[str] = None # auto | generative | extractive | retrieval
+    latency_budget_ms: Optional[float] = None # auto mode answers extractively if generation would exceed it
 
 class SourceItem(BaseModel):
     text: str
     product: str
     company: str
     complaint_id: str
+    duplicate_count: int = 0 # Other complaints with the same narrative, not indexed separately
 
 class AnswerResponse(BaseModel):
     question: str
     answer: str
     sources: List[SourceItem]
+    mode: Optional[str] = None # How the answer was produced: generative | extractive | retrieval | gated
 
 class UserCreate(BaseModel):
     email: str
@@ -94,6 +162,9 @@ class UserResponse(BaseModel):
 
 class ModelSwitchRequest(BaseModel):
     model_name: str
+    backend: Optional[str] = None # fp32 | int8 | onnx | offline
+    embedding_backend: Optional[str] = None
+    wait: bool = False # Block until the model is loaded instead of switching in the background
     
 class ProfileUpdate(BaseModel):
     name: Optional[str] = None
@@ -143,17 +214,36 @@ def update_profile(profile: ProfileUpdate, db: Session = Depends(get_db), curren
 # --- Settings Endpoints ---
 
 @app.get("/api/settings/model")
-def get_active_model(current_user: User = Depends(get_current_user)):
-    return {"active_model": rag_pipeline.active_model}
+def get_active_model(current_user: User = Depends(get_current_user), rag_pipeline = Depends(get_rag_pipeline)):
+    return {
+        "active_model": rag_pipeline.active_model,
+        "backend": rag_pipeline.llm_backend,
+        "embedding_backend": rag_pipeline.embedding_backend,
+        "available_backends": list(BACKENDS),
+        "model_pool": rag_pipeline.models.stats(),
+    }
 
 @app.post("/api/settings/model")
-def set_active_model(req: ModelSwitchRequest, current_user: User = Depends(get_current_user)):
+def set_active_model(req: ModelSwitchRequest, current_user: User = Depends(get_current_user), rag_pipeline = Depends(get_rag_pipeline)):
     try:
-        new_model = rag_pipeline.switch_model(req.model_name)
-        return {"status": "success", "active_model": new_model}
+        state = rag_pipeline.switch_model(req.model_name, backend=req.backend, embedding_backend=req.embedding_backend, wait=req.wait)
+        # "loading": the model is loading in the background and becomes active when ready
+        return {
+            "status": "success" if state == "active" else state,
+            "active_model": rag_pipeline.active_model,
+            "requested_model": req.model_name,
+            "backend": rag_pipeline.llm_backend,
+            "embedding_backend": rag_pipeline.embedding_backend,
+        }
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/pipeline/stats")
+def get_pipeline_stats(current_user: User = Depends(get_current_user), rag_pipeline = Depends(get_rag_pipeline)):
+    return rag_pipeline.get_runtime_stats()
+
 # --- History Endpoints ---
 @app.get("/api/history")
 def get_query_history(limit: int = 50, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
@@ -187,83 +277,166 @@ def delete_query_history(history_id: int, db: Session = Depends(get_db), current
 def health_check():
     return {"status": "ok", "message": "RAG API is running"}
 
+@app.get("/ready")
+def readiness_check():
+    report = readiness_report(components)
+    return JSONResponse(status_code=200 if report["ready"] else 503, content=report)
+
+@app.get("/metrics")
+def metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/ask", response_model=AnswerResponse)
-def ask_question(request: QuestionRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def ask_question(request: QuestionRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user), rag_pipeline = Depends(get_rag_pipeline)):
     try:
-        filters_dict = request.filters.model_dump(exclude_none=True) if request.filters else None
+        filters_dict = request.filters.model_dump(mode="json", exclude_none=True) if request.filters else None
         
         start_time = datetime.now()
-        result = rag_pipeline.answer_question(request.question, filters=filters_dict)
+        result = rag_pipeline.answer_question(
+            request.question, filters=filters_dict, mode=request.mode, latency_budget_ms=request.latency_budget_ms
+        )
         elapsed = (datetime.now() - start_time).total_seconds()
         
         # Save to DB
-        history_item = QueryHistory(
-            user_id=current_user.id,
-            question=request.question,
-            answer=result.get("answer", ""),
-            sources_json=json.dumps([s for s in result.get("sources", [])]),
-            product_filter=filters_dict.get("product") if filters_dict else None,
-            response_time=str(round(elapsed, 2))
-        )
-        db.add(history_item)
-        db.commit()
+        with STAGE_SECONDS.time(stage="history_write"):
+            history_item = QueryHistory(
+                user_id=current_user.id,
+                question=request.question,
+                answer=result.get("answer", ""),
+                sources_json=json.dumps([s for s in result.get("sources", [])]),
+                product_filter=_product_filter(filters_dict),
+                response_time=str(round(elapsed, 2))
+            )
+            db.add(history_item)
+            db.commit()
         
         return result
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+def _authenticate_ws_token(db: Session, token: Optional[str]):
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        user_id: str = payload.get("sub")
+        if user_id is None:
+            return None
+    except JWTError:
+        return None
+    return db.query(User).filter(User.id == int(user_id)).first()
+
+def _product_filter(filters):
+    product = filters.get("product") if filters else None
+    return ", ".join(product) if isinstance(product, list) else product
+
+@timed(STAGE_SECONDS, stage="history_write")
+def _save_history(db: Session, user_id: int, question: str, answer: str, sources: list, filters: Optional[dict], elapsed: float):
+    history_item = QueryHistory(
+        user_id=user_id,
+        question=question,
+        answer=answer.strip(),
+        sources_json=json.dumps(sources),
+        product_filter=_product_filter(filters),
+        response_time=str(round(elapsed, 2))
+    )
+    db.add(history_item)
+    db.commit()
+
 @app.websocket("/ws/ask")
 async def websocket_ask(websocket: WebSocket, db: Session = Depends(get_db)):
+    # One connection can carry several questions. The first message must carry the
+    # token; every message with a "question" streams an answer. {"type": "cancel"}
+    # or closing the socket stops the answer currently being generated.
     await websocket.accept()
-    try:
-        data = await websocket.receive_text()
-        request_data = json.loads(data)
-        token = request_data.get("token")
-        if not token:
-            await websocket.close(code=1008)
-            return
-            
+    incoming = asyncio.Queue()
+    state = {"stream": None, "disconnected": False}
+
+    async def read_messages():
+        # Runs alongside streaming so cancels and disconnects are seen immediately
         try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-            user_id: str = payload.get("sub")
-            if user_id is None:
-                await websocket.close(code=1008)
-                return
-            user = db.query(User).filter(User.id == int(user_id)).first()
-            if not user:
-                await websocket.close(code=1008)
-                return
-        except JWTError:
-            await websocket.close(code=1008)
-            return
-            
-        question = request_data.get("question")
-        filters = request_data.get("filters", None)
-        
-        start_time = datetime.now()
-        token_gen, sources = rag_pipeline.answer_question_stream(question, filters=filters)
-        
-        full_answer = ""
-        for text in token_gen:
-            full_answer += text
-            await websocket.send_json({"type": "token", "content": text})
-            await asyncio.sleep(0.01) # Small delay to yield loop
-            
-        elapsed = (datetime.now() - start_time).total_seconds()
-        await websocket.send_json({"type": "sources", "content": sources})
-        await websocket.send_json({"type": "done", "response_time": elapsed})
-        
-        # Save to history
-        history_item = QueryHistory(
-            user_id=user.id,
-            question=question,
-            answer=full_answer.strip(),
-            sources_json=json.dumps(sources),
-            product_filter=filters.get("product") if filters else None,
-            response_time=str(round(elapsed, 2))
-        )
-        db.add(history_item)
-        db.commit()
+            while True:
+                message = json.loads(await websocket.receive_text())
+                if message.get("type") == "cancel":
+                    if state["stream"] is not None:
+                        state["stream"].cancel()
+                else:
+                    await incoming.put(message)
+        except (WebSocketDisconnect, RuntimeError):
+            pass
+        except ValueError:
+            await incoming.put({"type": "invalid"})
+        finally:
+            state["disconnected"] = True
+            if state["stream"] is not None:
+                state["stream"].cancel()
+            await incoming.put(None)
+
+    reader = asyncio.create_task(read_messages())
+    user = None
+    try:
+        while True:
+            request_data = await incoming.get()
+            if request_data is None or request_data.get("type") == "invalid":
+                break
+
+            if user is None:
+                user = await asyncio.to_thread(_authenticate_ws_token, db, request_data.get("token"))
+                if user is None:
+                    await websocket.close(code=1008)
+                    return
+
+            question = request_data.get("question")
+            if not question:
+                continue
+            filters = request_data.get("filters", None)
+
+            try:
+                rag_pipeline = await asyncio.to_thread(components["rag_pipeline"].get, COMPONENT_WAIT_SECONDS)
+            except ComponentUnavailable as e:
+                await websocket.send_json({"type": "error", "message": str(e)})
+                continue
+
+            start_time = time.perf_counter()
+            stream = AsyncTokenStream()
+            state["stream"] = stream
+            if state["disconnected"]:
+                stream.cancel()
+            full_answer = ""
+            try:
+                # Retrieval is blocking, so it runs off the event loop; tokens arrive on `stream`
+                _, sources = await asyncio.to_thread(
+                    rag_pipeline.answer_question_stream, question, filters, stream,
+                    mode=request_data.get("mode"), latency_budget_ms=request_data.get("latency_budget_ms"),
+                )
+                async for text in stream:
+                    full_answer += text
+                    await websocket.send_json({"type": "token", "content": text})
+            except (WebSocketDisconnect, RuntimeError):
+                stream.cancel()
+                break
+            except Exception as e:
+                print(f"WebSocket error: {e}")
+                await websocket.send_json({"type": "error", "message": str(e)})
+                continue
+            finally:
+                state["stream"] = None
+
+            if stream.cancelled.is_set():
+                if state["disconnected"]:
+                    break
+                await websocket.send_json({"type": "cancelled"})
+                continue
+
+            elapsed = time.perf_counter() - start_time
+            await websocket.send_json({"type": "sources", "content": sources})
+            await websocket.send_json({"type": "done", "response_time": elapsed})
+
+            # Save to history
+            await asyncio.to_thread(_save_history, db, user.id, question, full_answer, sources, filters, elapsed)
 
     except WebSocketDisconnect:
         pass
@@ -274,27 +447,55 @@ async def websocket_ask(websocket: WebSocket, db: Session = Depends(get_db)):
         except:
             pass
     finally:
+        reader.cancel()
         try:
             await websocket.close()
         except:
             pass
 
 @app.get("/api/complaints/stats")
-def get_complaint_stats(current_user: User = Depends(get_current_user)):
+def get_complaint_stats(current_user: User = Depends(get_current_user), stats_engine = Depends(get_stats_engine)):
     return stats_engine.get_stats()
 
 @app.get("/api/complaints/stats/refresh")
-def refresh_complaint_stats(current_user: User = Depends(get_current_user)):
+def refresh_complaint_stats(rebuild: bool = False, current_user: User = Depends(get_current_user),
+                            stats_engine = Depends(get_stats_engine)):
+    # ?rebuild=true re-aggregates and re-indexes everything instead of the changed months
     if current_user.role != RoleEnum.admin:
         raise HTTPException(status_code=403, detail="Not authorized")
-    return stats_engine.load_and_compute(force=True)
+    return stats_engine.load_and_compute(force=True, rebuild=rebuild)
+
+def _recent_from_lake(limit):
+    # Only the newest month partitions that can hold `limit` rows are opened
+    import pandas as pd
+    from data_lake import newest_months, read_lake
+    df = read_lake(COMPLAINTS_LAKE, columns=RECENT_COLUMNS, months=newest_months(COMPLAINTS_LAKE, limit))
+    df = df.sort_values(['Date received', 'Complaint ID'], ascending=False).head(limit)
+    text = lambda value, default: str(value) if pd.notna(value) else default
+    return [
+        {
+            "id": f"CFPB-{row['Complaint ID']}",
+            "product": text(row['Product'], "Unknown"),
+            "issue": text(row['Issue'], "Unknown"),
+            "company": text(row['Company'], "Unknown"),
+            "state": text(row['State'], "Unknown"),
+            "date": text(row['Date received'], datetime.now().strftime("%Y-%m-%d")),
+            "narrative": text(row['Consumer complaint narrative'], ""),
+        }
+        for _, row in df.iterrows()
+    ]
 
 @app.get("/api/complaints/recent")
 def get_recent_complaints(limit: int = 20, current_user: User = Depends(get_current_user)):
     complaints = []
-    file_path = os.path.join(os.path.dirname(__file__), "..", "data", "complaints.csv")
+    file_path = COMPLAINTS_CSV
     
-    if os.path.exists(file_path):
+    if os.path.isdir(COMPLAINTS_LAKE):
+        try:
+            complaints = _recent_from_lake(limit)
+        except Exception as e:
+            print(f"Error reading data lake: {e}")
+    elif os.path.exists(file_path):
         try:
             with open(file_path, mode='r', encoding='utf-8') as f:
                 reader = csv.reader(f)
@@ -328,15 +529,19 @@ def get_recent_complaints(limit: int = 20, current_user: User = Depends(get_curr
     return complaints
 
 @app.get("/api/complaints/search")
-def search_complaints(q: Optional[str] = None, product: Optional[str] = None, page: int = 1, limit: int = 50, current_user: User = Depends(get_current_user)):
-    return stats_engine.search_complaints(query=q, product=product, page=page, limit=limit)
+def search_complaints(q: Optional[str] = None, product: Optional[str] = None, page: int = 1, limit: int = 50, sort: Optional[str] = None, current_user: User = Depends(get_current_user), stats_engine = Depends(get_stats_engine)):
+    # sort: "relevance" (default with a query) or "date" (newest first)
+    try:
+        return stats_engine.search_complaints(query=q, product=product, page=page, limit=limit, sort=sort)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/api/complaints/compare")
-def compare_products(productA: str, productB: str, current_user: User = Depends(get_current_user)):
+def compare_products(productA: str, productB: str, current_user: User = Depends(get_current_user), stats_engine = Depends(get_stats_engine)):
     return stats_engine.compare_products(productA, productB)
 
 @app.get("/api/complaints/trends")
-def get_trends(current_user: User = Depends(get_current_user)):
+def get_trends(current_user: User = Depends(get_current_user), stats_engine = Depends(get_stats_engine)):
     return stats_engine.get_trends()
 
 if __name__ == "__main__":
@@ -0,0 +1,356 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from metrics import PROMPT_TOKENS, OUTPUT_TOKENS, TIME_TO_FIRST_TOKEN
+
+# Defaults (overridable per batcher)
+DEFAULT_MAX_BATCH_SIZE = 8
+DEFAULT_MAX_WAIT_MS = 15
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """Collects items submitted from many threads and processes them in batches.
+
+    A single worker thread waits for the first item, then keeps collecting until
+    either `max_batch_size` items are queued or `max_wait_ms` has passed. Subclasses
+    implement `_run_batch(items)` and return one result per item.
+    """
+
+    def __init__(self, name, max_batch_size=DEFAULT_MAX_BATCH_SIZE, max_wait_ms=DEFAULT_MAX_WAIT_MS):
+        self.name = name
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+
+        # Tuning stats
+        self._batches = 0
+        self._items = 0
+        self._max_batch_seen = 0
+        self._queue_wait_total = 0.0
+        self._queue_wait_max = 0.0
+        self._batch_time_total = 0.0
+        self._last_batch_size = 0
+
+        self._worker = threading.Thread(target=self._run, name=f"{name}-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, item):
+        future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(f"{self.name} batcher is closed")
+            self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def close(self, wait=False):
+        # Items already queued are still processed before the worker exits
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(_STOP)
+        if wait:
+            self._worker.join()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is _STOP:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                if remaining > 0:
+                    entry = self._queue.get(timeout=remaining)
+                else:
+                    entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                # Re-queue the sentinel so the worker exits after this batch
+                self._queue.put(_STOP)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            started = time.perf_counter()
+            items = [entry[0] for entry in batch]
+            futures = [entry[1] for entry in batch]
+            waits = [started - entry[2] for entry in batch]
+
+            try:
+                results = self._run_batch(items)
+            except Exception as e:
+                self._on_error(items, e)
+                for future in futures:
+                    future.set_exception(e)
+            else:
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+
+            self._record(len(batch), waits, time.perf_counter() - started)
+
+    def _run_batch(self, items):
+        raise NotImplementedError
+
+    def _on_error(self, items, error):
+        pass
+
+    def _record(self, size, waits, batch_time):
+        with self._lock:
+            self._batches += 1
+            self._items += size
+            self._last_batch_size = size
+            self._max_batch_seen = max(self._max_batch_seen, size)
+            self._queue_wait_total += sum(waits)
+            self._queue_wait_max = max(self._queue_wait_max, max(waits))
+            self._batch_time_total += batch_time
+
+    def stats(self):
+        with self._lock:
+            batches = self._batches or 1
+            items = self._items or 1
+            avg_batch = self._items / batches if self._batches else 0.0
+            return {
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+                "batches": self._batches,
+                "requests": self._items,
+                "queue_depth": self._queue.qsize(),
+                "last_batch_size": self._last_batch_size,
+                "max_batch_size_seen": self._max_batch_seen,
+                "avg_batch_size": round(avg_batch, 3),
+                "avg_occupancy": round(avg_batch / self.max_batch_size, 3),
+                "avg_queue_wait_ms": round(self._queue_wait_total / items * 1000, 3),
+                "max_queue_wait_ms": round(self._queue_wait_max * 1000, 3),
+                "avg_batch_time_ms": round(self._batch_time_total / batches * 1000, 3),
+            }
+
+
+class TokenQueue:
+    """Thread-safe token sink for synchronous consumers; iterate it to receive text chunks."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._error = None
+        self.cancelled = threading.Event()
+
+    def put(self, text):
+        self._queue.put(text)
+
+    def close(self, error=None):
+        self._error = error
+        self._queue.put(_STOP)
+
+    def cancel(self):
+        self.cancelled.set()
+
+    def __iter__(self):
+        while True:
+            text = self._queue.get()
+            if text is _STOP:
+                break
+            yield text
+        # Surface generation errors to the consumer
+        if self._error is not None:
+            raise self._error
+
+
+class GenerationRequest:
+    def __init__(self, prompt, sink=None, started=None):
+        self.prompt = prompt
+        self.sink = sink
+        # perf_counter() when the caller's request began, for time-to-first-token
+        self.started = started
+        self.first_token_at = None
+        # Streaming sinks own the cancel flag so consumers can stop generation
+        self.cancelled = sink.cancelled if sink is not None else threading.Event()
+        self._closed = False
+
+    def close_sink(self, error=None):
+        if self.sink is not None and not self._closed:
+            self._closed = True
+            self.sink.close(error)
+
+
+def _make_batch_streamer(tokenizer, requests):
+    from transformers.generation.streamers import BaseStreamer
+
+    class BatchStreamer(BaseStreamer):
+        """Fans per-step tokens of a batched `generate` call out to each streaming request."""
+
+        def __init__(self):
+            self.skip_next = True
+            self.token_ids = [[] for _ in requests]
+            self.printed = ["" for _ in requests]
+            self.finished = [False for _ in requests]
+
+        def put(self, value):
+            # First call carries the prompt (decoder start tokens for seq2seq)
+            if self.skip_next:
+                self.skip_next = False
+                return
+            rows = value.reshape(len(requests), -1).tolist()
+            for i, req in enumerate(requests):
+                if req.sink is None or self.finished[i]:
+                    continue
+                if req.cancelled.is_set():
+                    # Release the consumer right away; the stopping criteria ends the row
+                    self.finished[i] = True
+                    req.close_sink()
+                    continue
+                for token_id in rows[i]:
+                    if token_id == tokenizer.eos_token_id:
+                        self.finished[i] = True
+                        break
+                    self.token_ids[i].append(token_id)
+                self._emit(i, final=self.finished[i])
+
+        def end(self):
+            for i, req in enumerate(requests):
+                if req.sink is not None and not req.cancelled.is_set():
+                    self._emit(i, final=True)
+
+        def _emit(self, i, final=False):
+            text = tokenizer.decode(self.token_ids[i], skip_special_tokens=True)
+            # Wait for complete characters unless this is the last flush
+            if text.endswith("\ufffd") and not final:
+                return
+            new_text = text[len(self.printed[i]):]
+            if new_text:
+                req = requests[i]
+                if req.first_token_at is None:
+                    req.first_token_at = time.perf_counter()
+                    if req.started is not None:
+                        TIME_TO_FIRST_TOKEN.observe(req.first_token_at - req.started)
+                req.sink.put(new_text)
+                self.printed[i] = text
+
+    return BatchStreamer()
+
+
+def _make_cancel_criteria(requests):
+    import torch
+    from transformers import StoppingCriteria, StoppingCriteriaList
+
+    class CancelledRows(StoppingCriteria):
+        """Marks cancelled requests as done; generate stops once every row is done."""
+
+        def __call__(self, input_ids, scores, **kwargs):
+            flags = [req.cancelled.is_set() for req in requests]
+            return torch.tensor(flags, dtype=torch.bool, device=input_ids.device)
+
+    return StoppingCriteriaList([CancelledRows()])
+
+
+class GenerationBatcher(MicroBatcher):
+    """Pads concurrent prompts into one `model.generate` call and fans results back out."""
+
+    def __init__(self, model, tokenizer, max_new_tokens=200, name="generation", **kwargs):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_new_tokens = max_new_tokens
+        self.is_encoder_decoder = getattr(model.config, "is_encoder_decoder", False)
+
+        if not self.is_encoder_decoder:
+            # Decoder-only models need left padding and a pad token for batching
+            tokenizer.padding_side = "left"
+            if tokenizer.pad_token is None:
+                tokenizer.pad_token = tokenizer.eos_token
+        super().__init__(name, **kwargs)
+
+    def generate(self, prompt):
+        return self.submit(GenerationRequest(prompt)).result()
+
+    def stream(self, prompt):
+        sink = TokenQueue()
+        self.stream_to(prompt, sink)
+        return iter(sink)
+
+    def stream_to(self, prompt, sink, started=None):
+        # `sink` needs put(text), close(error=None) and a `cancelled` threading.Event.
+        # The returned future resolves to the full answer text.
+        return self.submit(GenerationRequest(prompt, sink=sink, started=started))
+
+    def _run_batch(self, requests):
+        import torch
+
+        # Requests cancelled while queued never reach the model
+        live = [req for req in requests if not req.cancelled.is_set()]
+        for req in requests:
+            if req.cancelled.is_set():
+                req.close_sink()
+        if not live:
+            return ["" for _ in requests]
+
+        prompts = [req.prompt for req in live]
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True, truncation=True)
+        if hasattr(self.model, "device"):
+            inputs = {k: v.to(self.model.device) for k, v in inputs.items()}
+
+        for length in inputs["attention_mask"].sum(dim=1).tolist():
+            PROMPT_TOKENS.observe(length)
+
+        generation_kwargs = dict(inputs, max_new_tokens=self.max_new_tokens)
+        if any(req.sink is not None for req in live):
+            generation_kwargs["streamer"] = _make_batch_streamer(self.tokenizer, live)
+            generation_kwargs["stopping_criteria"] = _make_cancel_criteria(live)
+
+        with torch.no_grad():
+            outputs = self.model.generate(**generation_kwargs)
+
+        if not self.is_encoder_decoder:
+            # Decoder-only outputs echo the (padded) prompt
+            outputs = outputs[:, inputs["input_ids"].shape[1]:]
+
+        special = {self.tokenizer.pad_token_id, self.tokenizer.eos_token_id}
+        for row in outputs.tolist():
+            OUTPUT_TOKENS.observe(sum(1 for token_id in row if token_id not in special))
+
+        for req in live:
+            req.close_sink()
+        texts = [text.strip() for text in self.tokenizer.batch_decode(outputs, skip_special_tokens=True)]
+        by_request = dict(zip(map(id, live), texts))
+        return [by_request.get(id(req), "") for req in requests]
+
+    def _on_error(self, requests, error):
+        for req in requests:
+            req.close_sink(error)
+
+
+class EmbeddingBatcher(MicroBatcher):
+    """Coalesces concurrent `encode` calls into one batched SentenceTransformer forward pass."""
+
+    def __init__(self, embedder, name="embedding", **kwargs):
+        self.embedder = embedder
+        super().__init__(name, **kwargs)
+
+    def encode(self, text):
+        return self.submit(text).result()
+
+    def _run_batch(self, texts):
+        # Identical texts in one batch are encoded once
+        unique = list(dict.fromkeys(texts))
+        vectors = self.embedder.encode(unique)
+        by_text = dict(zip(unique, vectors))
+        return [by_text[text] for text in texts]
@@ -0,0 +1,168 @@
+import os
+import threading
+import time
+
+PROCESS_START = time.time()
+# A failed component is loaded again on the next demand, at the earliest this many seconds
+# after the failure, doubling per consecutive failure up to the maximum
+COMPONENT_RETRY_SECONDS = float(os.getenv("COMPONENT_RETRY_SECONDS", "5"))
+COMPONENT_RETRY_MAX_SECONDS = float(os.getenv("COMPONENT_RETRY_MAX_SECONDS", "300"))
+
+
+class ComponentUnavailable(Exception):
+    def __init__(self, name, state, error=None, retry_in=None):
+        self.name = name
+        self.state = state
+        self.error = error
+        # Seconds until a failed component may be retried
+        self.retry_in = retry_in
+        detail = f"Component '{name}' is {state}"
+        if error:
+            detail += f": {error}"
+        super().__init__(detail)
+
+
+class Component:
+    """A service dependency that is built once, in the background, on first demand.
+
+    `factory()` runs on its own thread. Callers use `get(timeout)` to wait for the
+    value; it raises ComponentUnavailable if loading failed or is still running when
+    the timeout expires. A failed load is started again by the next `start()`/`get()`
+    once its backoff (see COMPONENT_RETRY_SECONDS) has passed. Callbacks registered with
+    `add_done_callback` run after every load attempt, ready or failed. `details()` on the
+    built value (if present) is included in the readiness report, e.g. per-stage load timings.
+    """
+
+    def __init__(self, name, factory, phase=1):
+        self.name = name
+        self.phase = phase
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+        self.state = "pending"
+        self.value = None
+        self.error = None
+        self.started_at = None
+        self.load_seconds = None
+        self.ready_after_start = None
+        self.failures = 0
+        self.retry_at = None
+        self._callbacks = []
+
+    def retry_in(self):
+        # Seconds until a failed component may be loaded again (0 once it may)
+        if self.state != "failed":
+            return None
+        return max(0.0, self.retry_at - time.time())
+
+    def add_done_callback(self, callback):
+        # callback(component) runs on the loader thread when a load finishes
+        self._callbacks.append(callback)
+
+    def start(self):
+        with self._lock:
+            if self.state == "failed" and self.retry_in() == 0:
+                print(f"Retrying component {self.name} (attempt {self.failures + 1})...")
+                self._done.clear()
+            elif self.state != "pending":
+                return
+            self.state = "loading"
+            self.started_at = time.time()
+        threading.Thread(target=self._build, name=f"load-{self.name}", daemon=True).start()
+
+    def _build(self):
+        try:
+            value = self._factory()
+            with self._lock:
+                self.value = value
+                self.error = None
+                self.failures = 0
+                self.state = "ready"
+        except Exception as e:
+            with self._lock:
+                self.error = str(e)
+                self.failures += 1
+                backoff = min(COMPONENT_RETRY_SECONDS * 2 ** (self.failures - 1), COMPONENT_RETRY_MAX_SECONDS)
+                self.retry_at = time.time() + backoff
+                self.state = "failed"
+            print(f"Component {self.name} failed to load: {e} (retry in {backoff:.0f}s)")
+        finally:
+            now = time.time()
+            self.load_seconds = now - self.started_at
+            self.ready_after_start = now - PROCESS_START
+            self._done.set()
+        if self.state == "ready":
+            print(f"Component {self.name} ready in {self.load_seconds:.2f}s")
+        for callback in list(self._callbacks):
+            callback(self)
+
+    def get(self, timeout=None):
+        self.start()
+        self._done.wait(timeout)
+        if self.state != "ready":
+            raise ComponentUnavailable(self.name, self.state, self.error, self.retry_in())
+        return self.value
+
+    @property
+    def ready(self):
+        return self.state == "ready"
+
+    def status(self):
+        status = {
+            "state": self.state,
+            "phase": self.phase,
+            "load_seconds": round(self.load_seconds, 3) if self.load_seconds is not None else None,
+            "ready_after_process_start": round(self.ready_after_start, 3) if self.ready_after_start is not None else None,
+        }
+        if self.state == "loading":
+            status["loading_for"] = round(time.time() - self.started_at, 3)
+        if self.error:
+            status["error"] = self.error
+        if self.state == "failed":
+            status["failures"] = self.failures
+            status["retry_in"] = round(self.retry_in(), 3)
+        if self.ready and hasattr(self.value, "details"):
+            status["details"] = self.value.details()
+        return status
+
+
+def start_phase(components, phase):
+    for component in components.values():
+        if component.phase == phase:
+            component.start()
+
+
+def start_phases(components):
+    """Starts the first phase now and each later phase once every component of the
+    phase before it has finished loading, ready or failed."""
+    phases = sorted({component.phase for component in components.values()})
+    for phase, next_phase in zip(phases, phases[1:]):
+        _chain_phase(components, phase, next_phase)
+    if phases:
+        start_phase(components, phases[0])
+
+
+def _chain_phase(components, phase, next_phase):
+    members = [component for component in components.values() if component.phase == phase]
+    lock = threading.Lock()
+    started = []
+
+    def on_done(_):
+        with lock:
+            if started or any(member.state not in ("ready", "failed") for member in members):
+                return
+            started.append(next_phase)
+        print(f"Phase {phase} finished, starting phase {next_phase}")
+        start_phase(components, next_phase)
+
+    for member in members:
+        member.add_done_callback(on_done)
+
+
+def readiness_report(components):
+    report = {name: component.status() for name, component in components.items()}
+    return {
+        "ready": all(component.ready for component in components.values()),
+        "uptime_seconds": round(time.time() - PROCESS_START, 3),
+        "components": report,
+    }
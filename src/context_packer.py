@@ -0,0 +1,146 @@
+import threading
+from collections import OrderedDict
+
+from ingest_stream import CHUNK_OVERLAP
+
+# Fallback when neither the tokenizer nor the model config report a usable limit
+DEFAULT_MAX_INPUT_TOKENS = 512
+# Adjacent chunks share at most the indexing overlap
+MAX_CHUNK_OVERLAP_CHARS = CHUNK_OVERLAP
+# Shorter suffix/prefix matches ("the", "100") are treated as coincidence, not overlap
+MIN_CHUNK_OVERLAP_CHARS = 10
+# Don't bother adding a truncated tail entry smaller than this
+MIN_PARTIAL_ENTRY_TOKENS = 32
+
+
+def model_input_limit(tokenizer, model=None):
+    limit = getattr(tokenizer, "model_max_length", None)
+    # Tokenizers without a configured limit report a huge sentinel value
+    if limit and limit < 100000:
+        return int(limit)
+    config = getattr(model, "config", None)
+    for attr in ("n_positions", "max_position_embeddings"):
+        value = getattr(config, attr, None)
+        if value:
+            return int(value)
+    return DEFAULT_MAX_INPUT_TOKENS
+
+
+def _word_boundary(text, i):
+    return i <= 0 or i >= len(text) or not (text[i - 1].isalnum() and text[i].isalnum())
+
+
+def _strip_overlap(previous, following):
+    # Adjacent chunks repeat up to CHUNK_OVERLAP characters; drop the repeated prefix. The
+    # splitter cuts between words, so only a match of whole words counts as overlap
+    max_k = min(len(previous), len(following), MAX_CHUNK_OVERLAP_CHARS)
+    for k in range(max_k, MIN_CHUNK_OVERLAP_CHARS - 1, -1):
+        if previous.endswith(following[:k]) and _word_boundary(previous, len(previous) - k) \
+                and _word_boundary(following, k):
+            return following[k:]
+    return " " + following
+
+
+def merge_complaint_chunks(docs):
+    """Groups retrieved chunks by complaint, keeping the rank of each complaint's best chunk.
+
+    Duplicate chunk ids are dropped, and chunks of one complaint are stitched together in
+    `chunk_index` order, with the overlap between consecutive chunks removed.
+    """
+    groups = OrderedDict()
+    for doc in docs:
+        meta = doc['metadata']
+        complaint_id = meta.get('complaint_id') or doc.get('id')
+        group = groups.setdefault(complaint_id, OrderedDict())
+        chunk_key = doc.get('id') or (complaint_id, meta.get('chunk_index'))
+        group.setdefault(chunk_key, doc)
+
+    merged = []
+    for complaint_id, chunks in groups.items():
+        ordered = sorted(chunks.values(), key=lambda d: int(d['metadata'].get('chunk_index', 0) or 0))
+        text = ""
+        last_index = None
+        for doc in ordered:
+            chunk_text = doc['text'].replace("\n", " ").strip()
+            index = int(doc['metadata'].get('chunk_index', 0) or 0)
+            if last_index is None:
+                text = chunk_text
+            elif index == last_index + 1:
+                text += _strip_overlap(text, chunk_text)
+            else:
+                text += " ... " + chunk_text
+            last_index = index
+
+        first = next(iter(chunks.values()))
+        merged.append({
+            "key": tuple(chunks.keys()),
+            "text": text,
+            "metadata": first['metadata'],
+            "complaint_id": complaint_id,
+        })
+    return merged
+
+
+class ContextPacker:
+    """Packs retrieved chunks into a prompt context measured in the model's own tokens."""
+
+    def __init__(self, tokenizer, max_input_tokens, cache_size=20000):
+        self.tokenizer = tokenizer
+        self.max_input_tokens = max_input_tokens
+        self.cache_size = cache_size
+        self._token_counts = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def count_tokens(self, text, key=None):
+        if key is not None:
+            with self._lock:
+                count = self._token_counts.get(key)
+                if count is not None:
+                    self._token_counts.move_to_end(key)
+                    self.cache_hits += 1
+                    return count
+        count = len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+        if key is not None:
+            with self._lock:
+                self.cache_misses += 1
+                self._token_counts[key] = count
+                while len(self._token_counts) > self.cache_size:
+                    self._token_counts.popitem(last=False)
+        return count
+
+    def _truncate(self, text, max_tokens):
+        ids = self.tokenizer(text, add_special_tokens=False)["input_ids"][:max_tokens]
+        return self.tokenizer.decode(ids, skip_special_tokens=True)
+
+    def pack(self, docs, reserved_tokens=0):
+        """Returns (context, packed_entries) fitting in max_input_tokens - reserved_tokens."""
+        budget = self.max_input_tokens - reserved_tokens
+        context = []
+        packed = []
+        used = 0
+        for entry in merge_complaint_chunks(docs):
+            line = f"- [Product: {entry['metadata']['product']}] {entry['text']}\n"
+            tokens = self.count_tokens(line, key=entry['key'])
+            if used + tokens <= budget:
+                context.append(line)
+                packed.append(entry)
+                used += tokens
+                continue
+            # Fill the remainder with a truncated entry instead of letting the encoder cut it
+            remaining = budget - used
+            if remaining >= MIN_PARTIAL_ENTRY_TOKENS:
+                context.append(self._truncate(line, remaining).rstrip() + "\n")
+                packed.append(entry)
+            break
+        return "".join(context), packed
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_input_tokens": self.max_input_tokens,
+                "cached_token_counts": len(self._token_counts),
+                "cache_hits": self.cache_hits,
+                "cache_misses": self.cache_misses,
+            }
@@ -0,0 +1,277 @@
+import argparse
+import itertools
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+# Columnar copies of the complaints CSVs: Parquet files partitioned by product and
+# year-month (hive layout, e.g. Product=Credit%20card/month=2023-05/part-0.parquet).
+# Readers project the columns they use and prune partitions by product or month.
+DATA_LAKE_DIR = os.getenv("DATA_LAKE_DIR", 'data/lake')
+COMPLAINTS_LAKE = os.getenv("COMPLAINTS_LAKE", os.path.join(DATA_LAKE_DIR, 'complaints'))
+PROCESSED_LAKE = os.getenv("PROCESSED_LAKE", os.path.join(DATA_LAKE_DIR, 'filtered_complaints'))
+LAKE_INFO_FILENAME = '_lake.json'
+MONTH_COLUMN = 'month'
+CONVERT_CHUNK_ROWS = int(os.getenv("LAKE_CONVERT_CHUNK_ROWS", "200000"))
+BATCH_ROWS = 100000
+
+# Column types per dataset. Columns not listed are stored as strings; "category" columns
+# are dictionary-encoded. `product` and `date` name the columns the partitions come from.
+COMPLAINTS_LAYOUT = {
+    "product": "Product",
+    "date": "Date received",
+    "types": {
+        'Date received': 'date',
+        'Product': 'category',
+        'Sub-product': 'category',
+        'Issue': 'category',
+        'Sub-issue': 'category',
+        'Company public response': 'category',
+        'Company': 'category',
+        'State': 'category',
+        'Tags': 'category',
+        'Consumer consent provided?': 'category',
+        'Submitted via': 'category',
+        'Date sent to company': 'date',
+        'Company response to consumer': 'category',
+        'Timely response?': 'category',
+        'Consumer disputed?': 'category',
+        'Complaint ID': 'int',
+    },
+}
+PROCESSED_LAYOUT = {
+    "product": "product",
+    "date": "date_received",
+    "types": {
+        'complaint_id': 'int',
+        'product': 'category',
+        'issue': 'category',
+        'sub_issue': 'category',
+        'company': 'category',
+        'date_received': 'date',
+    },
+}
+LAYOUTS = {"complaints": COMPLAINTS_LAYOUT, "processed": PROCESSED_LAYOUT}
+
+_ARROW_TYPES = {
+    'date': pa.date32(),
+    'category': pa.dictionary(pa.int32(), pa.string()),
+    'int': pa.int64(),
+    'text': pa.string(),
+}
+
+
+def lake_exists(lake_dir):
+    return os.path.exists(os.path.join(lake_dir, LAKE_INFO_FILENAME))
+
+
+def load_lake_info(lake_dir):
+    with open(os.path.join(lake_dir, LAKE_INFO_FILENAME)) as f:
+        return json.load(f)
+
+
+def _to_arrow(frame, layout, columns):
+    """Converts one pandas chunk to a RecordBatch with the layout's types plus the month key."""
+    arrays = []
+    for name in columns:
+        kind = layout["types"].get(name, 'text')
+        values = frame[name] if name in frame.columns else pd.Series([None] * len(frame), dtype=object)
+        if kind == 'date':
+            dates = pd.to_datetime(values, errors='coerce')
+            arrays.append(pa.array(dates, type=pa.timestamp('ns'), from_pandas=True).cast(pa.date32()))
+        elif kind == 'int':
+            arrays.append(pa.array(pd.to_numeric(values, errors='coerce').astype('Int64'), type=pa.int64()))
+        elif kind == 'category' and name != layout["product"]:
+            arrays.append(pa.array(values.astype(object), type=pa.string(), from_pandas=True).dictionary_encode())
+        else:
+            # The product column becomes the partition key, which is written as a plain string
+            arrays.append(pa.array(values.astype(object), type=pa.string(), from_pandas=True))
+    months = pd.to_datetime(frame[layout["date"]], errors='coerce').dt.strftime('%Y-%m')
+    arrays.append(pa.array(months.astype(object), type=pa.string(), from_pandas=True))
+    return pa.RecordBatch.from_arrays(arrays, names=list(columns) + [MONTH_COLUMN])
+
+
+def _schema(layout, columns):
+    fields = []
+    for name in columns:
+        kind = layout["types"].get(name, 'text')
+        if name == layout["product"]:
+            kind = 'text'
+        fields.append(pa.field(name, _ARROW_TYPES[kind]))
+    return pa.schema(fields + [pa.field(MONTH_COLUMN, pa.string())])
+
+
+def _partitioning(layout):
+    return ds.partitioning(
+        pa.schema([pa.field(layout["product"], pa.string()), pa.field(MONTH_COLUMN, pa.string())]),
+        flavor='hive',
+    )
+
+
+def write_lake(frames, lake_dir, layout, source=None):
+    """Writes an iterable of DataFrames to `lake_dir` as one partitioned Parquet dataset.
+
+    Frames stream straight into the Parquet writers, one at a time. The dataset is built
+    next to `lake_dir` and swapped in at the end, so readers never see a partial lake.
+    Returns the lake info (row counts per month, columns, layout) saved with it, or None
+    (leaving any existing lake alone) when there are no frames.
+    """
+    frames = iter(frames)
+    first = next(frames, None)
+    if first is None:
+        return None
+    columns = list(first.columns)
+    rows_by_month = {}
+    # month ('' for rows without a date) -> [rows, sum (mod 2**64) of the rows' value
+    # hashes]: changes with any edited value, whatever the row order, chunking or encoding
+    checksums = {}
+    total_rows = 0
+
+    def batches():
+        nonlocal total_rows
+        for frame in itertools.chain([first], frames):
+            batch = _to_arrow(frame, layout, columns)
+            codes, months = pd.factorize(batch.column(MONTH_COLUMN).to_pandas().fillna(''))
+            sums = np.zeros(len(months), dtype=np.uint64)
+            np.add.at(sums, codes, pd.util.hash_pandas_object(frame.reindex(columns=columns), index=False).to_numpy())
+            counts = np.bincount(codes, minlength=len(months))
+            for month, count, total in zip(months, counts, sums):
+                if month:
+                    rows_by_month[month] = rows_by_month.get(month, 0) + int(count)
+                rows, hashed = checksums.get(month, (0, 0))
+                checksums[month] = (rows + int(count), (hashed + int(total)) % (1 << 64))
+            total_rows += batch.num_rows
+            yield batch
+
+    tmp_dir = lake_dir.rstrip('/') + '.tmp'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    ds.write_dataset(
+        pa.RecordBatchReader.from_batches(_schema(layout, columns), batches()),
+        tmp_dir,
+        format='parquet',
+        partitioning=_partitioning(layout),
+        basename_template='part-{i}.parquet',
+        max_partitions=100000,
+        existing_data_behavior='overwrite_or_ignore',
+    )
+
+    info = {
+        "layout": layout,
+        "columns": columns,
+        "rows": total_rows,
+        "rows_by_month": dict(sorted(rows_by_month.items())),
+        "checksums_by_month": {month: f"{rows}:{hashed:016x}" for month, (rows, hashed) in sorted(checksums.items())},
+        "source": source,
+        "created": time.strftime('%Y-%m-%dT%H:%M:%S'),
+    }
+    with open(os.path.join(tmp_dir, LAKE_INFO_FILENAME), 'w') as f:
+        json.dump(info, f, indent=2)
+
+    old_dir = lake_dir.rstrip('/') + '.old'
+    if os.path.exists(lake_dir):
+        os.replace(lake_dir, old_dir)
+    os.replace(tmp_dir, lake_dir)
+    shutil.rmtree(old_dir, ignore_errors=True)
+    return info
+
+
+def convert_csv(csv_path, lake_dir, layout, chunk_rows=CONVERT_CHUNK_ROWS):
+    """Streams a complaints CSV into a partitioned Parquet lake (see write_lake)."""
+    stat = os.stat(csv_path)
+    source = {"path": os.path.abspath(csv_path), "size": stat.st_size, "mtime": int(stat.st_mtime)}
+    # Every column is read as text; write_lake applies the layout's types
+    frames = pd.read_csv(csv_path, dtype=str, chunksize=chunk_rows)
+    return write_lake(frames, lake_dir, layout, source=source)
+
+
+def open_lake(lake_dir, info=None):
+    info = info or load_lake_info(lake_dir)
+    return ds.dataset(lake_dir, format='parquet', partitioning=_partitioning(info["layout"]))
+
+
+def _filter(info, products=None, months=None):
+    expression = None
+    if products is not None:
+        expression = ds.field(info["layout"]["product"]).isin(list(products))
+    if months is not None:
+        # '' stands for the rows without a date
+        month_filter = ds.field(MONTH_COLUMN).isin(pa.array([m for m in months if m], type=pa.string()))
+        if '' in months:
+            month_filter = month_filter | ds.field(MONTH_COLUMN).is_null()
+        expression = month_filter if expression is None else expression & month_filter
+    return expression
+
+
+def _to_pandas(table, info):
+    # The product partition key comes back as plain strings; store it like the other categoricals
+    product = info["layout"]["product"]
+    if product in table.column_names:
+        index = table.column_names.index(product)
+        table = table.set_column(index, product, table.column(product).dictionary_encode())
+    return table.to_pandas()
+
+
+def read_lake(lake_dir, columns=None, products=None, months=None):
+    """Loads `columns` of the complaints in the given products/months into one DataFrame.
+
+    Only the Parquet files of matching partitions are opened, and only the projected
+    columns are decoded. Categorical columns come back as pandas categoricals.
+    """
+    info = load_lake_info(lake_dir)
+    table = open_lake(lake_dir, info).to_table(columns=columns, filter=_filter(info, products, months))
+    return _to_pandas(table, info)
+
+
+def iter_lake(lake_dir, columns=None, products=None, months=None, batch_rows=BATCH_ROWS):
+    """Yields DataFrames of at most `batch_rows` rows; see read_lake."""
+    info = load_lake_info(lake_dir)
+    scanner = open_lake(lake_dir, info).scanner(columns=columns, filter=_filter(info, products, months),
+                                          batch_size=batch_rows)
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            yield _to_pandas(pa.Table.from_batches([batch]), info)
+
+
+def newest_months(lake_dir, min_rows):
+    """The most recent months, newest first, that together hold at least `min_rows` rows."""
+    months = []
+    rows = 0
+    for month, count in sorted(load_lake_info(lake_dir)["rows_by_month"].items(), reverse=True):
+        if rows >= min_rows:
+            break
+        months.append(month)
+        rows += count
+    return months
+
+
+def load_month_checksums(lake_dir, info=None):
+    # Lakes written before checksums were recorded fall back to their row counts
+    info = info or load_lake_info(lake_dir)
+    return info.get("checksums_by_month") or {month: str(rows) for month, rows in info["rows_by_month"].items()}
+
+
+def changed_months(checksums, previous):
+    """Months whose checksum (see write_lake) differs between two {month: checksum} maps,
+    sorted; '' is the rows without a date. Months missing from `checksums` were removed."""
+    return sorted(m for m in set(checksums) | set(previous) if checksums.get(m) != previous.get(m))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert a complaints CSV into a partitioned Parquet data lake.")
+    parser.add_argument("--input", default='data/raw/complaints.csv', help="Complaints CSV to convert")
+    parser.add_argument("--output", default=COMPLAINTS_LAKE, help="Lake directory to (re)write")
+    parser.add_argument("--layout", choices=sorted(LAYOUTS), default="complaints",
+                        help="Column types: raw CFPB export (complaints) or filtered_complaints.csv (processed)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    print(f"Converting {args.input} to {args.output}...")
+    info = convert_csv(args.input, args.output, LAYOUTS[args.layout])
+    print(f"✅ {info['rows']} rows in {len(info['rows_by_month'])} months written in "
+          f"{time.perf_counter() - start:.1f}s")
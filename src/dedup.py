@@ -0,0 +1,250 @@
+import hashlib
+import json
+import os
+import re
+import zlib
+from array import array
+
+import numpy as np
+
+# Narratives whose estimated word-shingle Jaccard similarity is at least this are merged
+DEDUP_THRESHOLD = float(os.getenv("DEDUP_THRESHOLD", "0.85"))
+SHINGLE_WORDS = 5
+# 64 MinHash values split into 8 bands of 8: pairs above ~0.77 similarity share a band
+NUM_PERM = 64
+LSH_BANDS = 8
+# Members per representative; a larger cluster is split, each part with its own
+# representative, so every member id fits in the representative's duplicate_ids
+MAX_LISTED_DUPLICATES = 200
+# Only complaints that agree on these fields are merged, so the representative's values
+# answer the equality filters on them for its whole cluster. The other filters are
+# answered from the members' ids (duplicate_ids) and dates (duplicate_dates), which
+# metadata_index.MetadataIndex matches as well.
+DEDUP_SCOPE_FIELDS = ('product', 'company', 'issue', 'sub_issue')
+DATE_FIELD = 'date_received'
+# Clusters of a full-corpus build, kept in the vector store so a resumed run reuses them
+DUPLICATES_FILENAME = 'duplicates.json'
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+# Folds a band's values into one key; collisions are harmless, candidates are verified
+_BAND_MIX = _rng.randint(1, 1 << 62, size=NUM_PERM // LSH_BANDS, dtype=np.uint64) | np.uint64(1)
+_SCOPE_MIX = np.uint64(_rng.randint(1, 1 << 62, dtype=np.uint64) | 1)
+
+_WORD = re.compile(r"\w+")
+
+
+def normalize(text):
+    # Case, punctuation and whitespace differences don't make a narrative distinct
+    return " ".join(_WORD.findall(str(text).lower()))
+
+
+def exact_key(normalized):
+    return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).digest()
+
+
+def minhash(normalized):
+    """64 MinHash values over the word 5-shingles of a normalized narrative."""
+    words = normalized.split()
+    shingles = {" ".join(words[i:i + SHINGLE_WORDS]) for i in range(max(1, len(words) - SHINGLE_WORDS + 1))}
+    hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+    permuted = (hashes[None, :] * _PERM_A[:, None] + _PERM_B[:, None]) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=1).astype(np.uint32)
+
+
+class NarrativeDeduper:
+    """Groups complaints with identical or near-identical narratives.
+
+    Narratives are fed frame by frame with `add`. Exact copies (after normalization) are
+    matched by hash; the rest get a MinHash signature, and `clusters()` compares the pairs
+    that collide in an LSH band. Narratives are only merged within one scope (the
+    DEDUP_SCOPE_FIELDS values passed to `add`), so the same letter sent to two companies
+    stays two complaints. Each cluster's representative is its first complaint in
+    input order, so the result does not depend on how the input was split into frames.
+    """
+
+    def __init__(self, threshold=DEDUP_THRESHOLD):
+        self.threshold = threshold
+        self.ids = []
+        self.lengths = []
+        self.dates = []
+        self._first_by_key = {}
+        self._exact_of = {}
+        self._scope_codes = {}
+        # Flat uint32 MinHash values, NUM_PERM per narrative that is not an exact copy, and
+        # the scope code of each
+        self._signatures = array('I')
+        self._signature_rows = []
+        self._signature_scopes = array('I')
+
+    def add(self, complaint_ids, narratives, scopes=None, dates=None):
+        """`scopes` gives one hashable scope per complaint (e.g. a (product, company) tuple),
+        `dates` each complaint's date_received ('YYYY-MM-DD')."""
+        if scopes is None:
+            scopes = [None] * len(complaint_ids)
+        if dates is None:
+            dates = [''] * len(complaint_ids)
+        for cid, text, scope, date in zip(complaint_ids, narratives, scopes, dates):
+            if text is None or (isinstance(text, float) and text != text):
+                continue
+            row = len(self.ids)
+            self.ids.append(str(cid))
+            self.lengths.append(len(str(text)))
+            self.dates.append(date)
+            normalized = normalize(text)
+            scope_code = self._scope_codes.setdefault(scope, len(self._scope_codes))
+            first = self._first_by_key.setdefault((scope_code, exact_key(normalized)), row)
+            if first != row:
+                self._exact_of[row] = first
+                continue
+            self._signatures.frombytes(minhash(normalized).tobytes())
+            self._signature_rows.append(row)
+            self._signature_scopes.append(scope_code)
+
+    def clusters(self):
+        """Returns {representative_id: [member_ids]} for every cluster with duplicates.
+
+        Clusters of more than MAX_LISTED_DUPLICATES members are split into parts of that
+        size, each led by its first complaint.
+        """
+        parent = list(range(len(self.ids)))
+
+        def find(row):
+            while parent[row] != row:
+                parent[row] = parent[parent[row]]
+                row = parent[row]
+            return row
+
+        def union(a, b):
+            a, b = find(a), find(b)
+            if a != b:
+                # The earlier row stays the root, i.e. the representative
+                parent[max(a, b)] = min(a, b)
+
+        for row, first in self._exact_of.items():
+            union(row, first)
+
+        if len(self._signature_rows) > 1:
+            signatures = np.frombuffer(self._signatures, dtype=np.uint32).reshape(-1, NUM_PERM)
+            rows = np.asarray(self._signature_rows)
+            scopes = np.frombuffer(self._signature_scopes, dtype=np.uint32)
+            for band in np.split(signatures, LSH_BANDS, axis=1):
+                # Band keys include the scope, so only same-scope narratives become candidates
+                keys = (band.astype(np.uint64) * _BAND_MIX).sum(axis=1) + scopes.astype(np.uint64) * _SCOPE_MIX
+                order = np.argsort(keys, kind='stable')
+                sorted_keys = keys[order]
+                starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+                sizes = np.diff(np.r_[starts, len(order)])
+                for start, size in zip(starts[sizes > 1], sizes[sizes > 1]):
+                    group = order[start:start + size]
+                    # Verify each candidate against the group's first signature
+                    similarity = (signatures[group[1:]] == signatures[group[0]]).mean(axis=1)
+                    same_scope = scopes[group[1:]] == scopes[group[0]]
+                    for member in group[1:][(similarity >= self.threshold) & same_scope]:
+                        union(rows[group[0]], rows[member])
+
+        # Roots are the earliest row of their cluster, so each list is in input order
+        rows_of_root = {}
+        for row in range(len(self.ids)):
+            root = find(row)
+            if root != row:
+                rows_of_root.setdefault(root, [root]).append(row)
+        members = {}
+        for rows in rows_of_root.values():
+            for start in range(0, len(rows), MAX_LISTED_DUPLICATES + 1):
+                part = rows[start:start + MAX_LISTED_DUPLICATES + 1]
+                if len(part) > 1:
+                    members[self.ids[part[0]]] = [self.ids[row] for row in part[1:]]
+        return members
+
+    def member_dates(self, clusters):
+        """{representative_id: comma-joined sorted member dates other than its own}, for
+        clusters whose members were received on other days."""
+        rows_of = {cid: row for row, cid in enumerate(self.ids)}
+        dates = {}
+        for rep, ids in clusters.items():
+            own = self.dates[rows_of[rep]]
+            other = sorted({self.dates[rows_of[cid]] for cid in ids} - {own, ''})
+            if other:
+                dates[rep] = ",".join(other)
+        return dates
+
+    def report(self, clusters):
+        rows_of = {cid: row for row, cid in enumerate(self.ids)}
+        removed = [rows_of[cid] for ids in clusters.values() for cid in ids]
+        removed_chars = sum(self.lengths[row] for row in removed)
+        total_chars = sum(self.lengths)
+        return {
+            "narratives": len(self.ids),
+            "exact_duplicates": len(self._exact_of),
+            "near_duplicates": len(removed) - len(self._exact_of),
+            "clusters": len(clusters),
+            "kept": len(self.ids) - len(removed),
+            "removed_chars": removed_chars,
+            "removed_fraction": round(removed_chars / total_chars, 4) if total_chars else 0.0,
+        }
+
+
+def _day(value):
+    # date_received as 'YYYY-MM-DD' ('' when missing), like metadata_index.parse_day reads it
+    return '' if value is None or value != value else str(value)[:10]
+
+
+def find_duplicates(frames, threshold=DEDUP_THRESHOLD):
+    """Runs the deduper over DataFrames; returns (clusters, member_dates, report)."""
+    deduper = NarrativeDeduper(threshold)
+    for frame in frames:
+        fields = [field for field in DEDUP_SCOPE_FIELDS if field in frame.columns]
+        scopes = list(frame[fields].astype(str).itertuples(index=False, name=None)) if fields else None
+        dates = [_day(value) for value in frame[DATE_FIELD]] if DATE_FIELD in frame.columns else None
+        deduper.add(frame['complaint_id'].tolist(), frame['cleaned_narrative'].tolist(), scopes, dates)
+    clusters = deduper.clusters()
+    return clusters, deduper.member_dates(clusters), deduper.report(clusters)
+
+
+def duplicate_lookup(clusters):
+    # Member complaint_id -> representative complaint_id
+    return {cid: rep for rep, ids in clusters.items() for cid in ids}
+
+
+def drop_duplicates(frame, clusters, lookup, member_dates=None):
+    """Removes cluster members from `frame` and records their ids and dates on their representatives."""
+    ids = frame['complaint_id'].astype(str)
+    frame = frame[~ids.isin(lookup)].copy()
+    ids = frame['complaint_id'].astype(str)
+    members = ids.map(clusters)
+    frame['duplicate_count'] = members.map(lambda m: len(m) if isinstance(m, list) else 0)
+    frame['duplicate_ids'] = members.map(lambda m: ",".join(m) if isinstance(m, list) else '')
+    frame['duplicate_dates'] = ids.map(member_dates or {}).fillna('')
+    return frame
+
+
+def save_duplicates(store_dir, clusters, member_dates, report):
+    with open(os.path.join(store_dir, DUPLICATES_FILENAME), 'w') as f:
+        json.dump({"clusters": clusters, "dates": member_dates, "report": report}, f)
+
+
+def load_duplicates(store_dir):
+    with open(os.path.join(store_dir, DUPLICATES_FILENAME)) as f:
+        data = json.load(f)
+    return data["clusters"], data.get("dates", {}), data["report"]
+
+
+def print_dedup_report(report, chunks_written=None, embed_seconds=None, bytes_per_chunk=None):
+    print("\n--- Deduplication ---")
+    print(f"Narratives: {report['narratives']}, kept: {report['kept']} "
+          f"({report['exact_duplicates']} exact and {report['near_duplicates']} near duplicates "
+          f"in {report['clusters']} clusters)")
+    print(f"Narrative text removed: {report['removed_chars']} chars ({100 * report['removed_fraction']:.1f}%)")
+    if chunks_written and report['removed_fraction'] < 1:
+        # Chunk count scales with text length, so removed text estimates the chunks not produced
+        saved = round(chunks_written * report['removed_fraction'] / (1 - report['removed_fraction']))
+        line = f"Estimated chunks not embedded or stored: {saved}"
+        if embed_seconds:
+            line += f", ~{saved * embed_seconds / chunks_written:.1f}s of embedding"
+        if bytes_per_chunk:
+            line += f", ~{saved * bytes_per_chunk / 1e6:.1f} MB of index"
+        print(line)
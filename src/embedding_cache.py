@@ -0,0 +1,128 @@
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+# Chunk embeddings computed by earlier ingestion runs, reused whenever the same chunk
+# text is embedded again by the same model (re-chunking, re-sampling, rebuilds).
+# An empty EMBEDDING_CACHE_DIR turns the cache off.
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", 'data/embedding_cache')
+EMBEDDING_CACHE_DTYPE = os.getenv("EMBEDDING_CACHE_DTYPE", "float16") # float16 | float32
+KEY_BYTES = 16
+
+
+def text_key(text):
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=KEY_BYTES).digest()
+
+
+class EmbeddingCache:
+    """Append-only on-disk map from chunk-text hash to embedding, for one model.
+
+    keys.bin holds 16-byte blake2b digests and vectors.bin the matching rows, so a key's
+    position is its vector's row. Vectors are read through a memory map; only the
+    key -> row dict is held in memory. Meant for one writing process at a time.
+    """
+
+    def __init__(self, root, model_name, backend, dtype=EMBEDDING_CACHE_DTYPE):
+        self.dir = os.path.join(root, re.sub(r'[^A-Za-z0-9_.-]+', '_', f"{model_name}__{backend}"))
+        os.makedirs(self.dir, exist_ok=True)
+        self._keys_path = os.path.join(self.dir, 'keys.bin')
+        self._vectors_path = os.path.join(self.dir, 'vectors.bin')
+        self._info_path = os.path.join(self.dir, 'cache.json')
+        self.dtype = dtype
+        self.dim = None
+        self.hits = 0
+        self.misses = 0
+        self._vectors = None
+
+        if os.path.exists(self._info_path):
+            with open(self._info_path) as f:
+                info = json.load(f)
+            self.dim = info['dim']
+            self.dtype = info['dtype']
+        keys = np.fromfile(self._keys_path, dtype=f'V{KEY_BYTES}') if os.path.exists(self._keys_path) else []
+        count = len(keys)
+        if self.dim:
+            # A write interrupted between the two files leaves a tail without its pair
+            row_bytes = self.dim * np.dtype(self.dtype).itemsize
+            count = min(count, os.path.getsize(self._vectors_path) // row_bytes)
+            for path, size in ((self._keys_path, count * KEY_BYTES), (self._vectors_path, count * row_bytes)):
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+        self._row_of = {bytes(key): row for row, key in enumerate(keys[:count])}
+        self.count = count
+
+    def __len__(self):
+        return self.count
+
+    def _read(self, rows):
+        if self._vectors is None or len(self._vectors) < self.count:
+            self._vectors = np.memmap(self._vectors_path, dtype=self.dtype, mode='r', shape=(self.count, self.dim))
+        return np.asarray(self._vectors[rows], dtype=np.float32)
+
+    def _append(self, keys, vectors):
+        if self.dim is None:
+            self.dim = int(vectors.shape[1])
+            with open(self._info_path, 'w') as f:
+                json.dump({"dim": self.dim, "dtype": self.dtype}, f)
+        # Vectors first: keys.bin only ever lists rows whose vector is on disk
+        with open(self._vectors_path, 'ab') as f:
+            f.write(np.ascontiguousarray(vectors, dtype=self.dtype).tobytes())
+        with open(self._keys_path, 'ab') as f:
+            f.write(b''.join(keys))
+        for key in keys:
+            self._row_of[key] = self.count
+            self.count += 1
+
+    def lookup(self, texts, encode):
+        """Returns float32 embeddings for `texts`, calling `encode` only on unseen texts.
+
+        Fresh vectors are stored and then read back like cached ones, so a text gets the
+        same (dtype-rounded) vector whether or not it was in the cache.
+        """
+        keys = [text_key(text) for text in texts]
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in self._row_of and key not in missing:
+                missing[key] = text
+        self.misses += len(missing)
+        self.hits += len(keys) - len(missing)
+        if missing:
+            vectors = np.asarray(encode(list(missing.values())), dtype=np.float32).reshape(len(missing), -1)
+            self._append(list(missing), vectors)
+        if not keys:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return self._read([self._row_of[key] for key in keys])
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "entries": self.count,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+class CachedEmbedder:
+    """Wraps a SentenceTransformer-like embedder so `encode` goes through an EmbeddingCache."""
+
+    def __init__(self, model, cache):
+        self.model = model
+        self.cache = cache
+
+    def get_sentence_embedding_dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts, **kwargs):
+        if isinstance(texts, str):
+            return self.cache.lookup([texts], lambda batch: self.model.encode(batch, **kwargs))[0]
+        return self.cache.lookup(list(texts), lambda batch: self.model.encode(batch, **kwargs))
+
+
+def print_cache_stats(cache):
+    stats = cache.stats()
+    print(f"Embedding cache: {stats['hits']} hits, {stats['misses']} computed "
+          f"({100 * stats['hit_rate']:.1f}% reused), {stats['entries']} entries in {cache.dir}")
@@ -1,23 +1,57 @@
 import pandas as pd
 import numpy as np
 from tqdm import tqdm
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from sentence_transformers import SentenceTransformer
 import chromadb
 from chromadb.config import Settings
 import os
 import shutil
+import argparse
+import time
+from index_version import bump_index_version
+from data_lake import PROCESSED_LAKE, lake_exists, read_lake
+from inference_backends import load_embedder
+from embedding_cache import EMBEDDING_CACHE_DIR, CachedEmbedder, EmbeddingCache, print_cache_stats
+from numpy_index import NumpyIndex, NumpyIndexWriter, update_numpy_index, numpy_index_dir
+from ingest_stream import CHUNK_OVERLAP, CHUNK_SIZE, IngestPipeline, chunk_records, frame_records, print_report
+from dedup import (
+    DEDUP_SCOPE_FIELDS, drop_duplicates, duplicate_lookup, find_duplicates, load_duplicates, print_dedup_report,
+    save_duplicates
+)
+from ingest_manifest import (
+    build_manifest, chunk_ids, clear_checkpoint, diff_manifest, hash_complaints, load_checkpoint,
+    load_manifest, load_sample_info, save_checkpoint, save_manifest, save_sample_info
+)
 
 # Configuration
-INPUT_FILE = 'data/processed/filtered_complaints.csv'
-SAMPLE_OUTPUT_FILE = 'data/processed/complaints_sample.csv'
-VECTOR_STORE_DIR = 'vector_store'
+INPUT_FILE = os.getenv("INPUT_FILE", 'data/processed/filtered_complaints.csv')
+# Columns of the processed complaints that get indexed
+INPUT_COLUMNS = ['complaint_id', 'product', 'issue', 'sub_issue', 'company', 'date_received', 'cleaned_narrative']
+SAMPLE_OUTPUT_FILE = os.getenv("SAMPLE_OUTPUT_FILE", 'data/processed/complaints_sample.csv')
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", 'vector_store')
 SAMPLE_SIZE = 15000
 RANDOM_SEED = 42
 
-CHUNK_SIZE = 500
-CHUNK_OVERLAP = 50
 EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "fp32") # fp32 | int8 | onnx | offline
+NUMPY_INDEX_DTYPE = os.getenv("NUMPY_INDEX_DTYPE", "float32") # float32 | float16
+# Full-corpus mode: rows read from the CSV at a time, and seconds between checkpoints
+FULL_CORPUS_FRAME_ROWS = int(os.getenv("FULL_CORPUS_FRAME_ROWS", "5000"))
+CHECKPOINT_INTERVAL = float(os.getenv("INGEST_CHECKPOINT_INTERVAL", "60"))
+# Embed one narrative per cluster of exact/near-duplicate complaints (see dedup.py)
+DEDUP_NARRATIVES = os.getenv("DEDUP_NARRATIVES", "1") == "1"
+# Chroma HNSW parameters for new collections, e.g. "M=32,construction_ef=200,search_ef=64"
+CHROMA_HNSW_PARAMS = ("M", "construction_ef", "search_ef")
+
+def parse_hnsw_settings(spec):
+    settings = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        if name not in CHROMA_HNSW_PARAMS:
+            raise ValueError(f"Unknown HNSW parameter '{name}'. Choose from: {', '.join(CHROMA_HNSW_PARAMS)}")
+        settings[f"hnsw:{name}"] = int(value)
+    return settings
+
+CHROMA_HNSW = parse_hnsw_settings(os.getenv("CHROMA_HNSW", ""))
 
 def ensure_dir_clean(directory):
     if os.path.exists(directory):
@@ -27,8 +61,13 @@ def ensure_dir_clean(directory):
         os.makedirs(directory)
 
 def load_and_sample_data():
-    print(f"Loading data from {INPUT_FILE}...")
-    df = pd.read_csv(INPUT_FILE)
+    if lake_exists(PROCESSED_LAKE):
+        # Columnar copy written by the preprocessing script: only the indexed columns are read
+        print(f"Loading data from {PROCESSED_LAKE} (Parquet)...")
+        df = read_lake(PROCESSED_LAKE, columns=INPUT_COLUMNS)
+    else:
+        print(f"Loading data from {INPUT_FILE}...")
+        df = pd.read_csv(INPUT_FILE)
     print(f"Total records: {len(df)}")
     
     print("Creating stratified sample...")
@@ -61,55 +100,22 @@ def load_and_sample_data():
 
 def chunk_data(df):
     print("Chunking data...")
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=CHUNK_SIZE,
-        chunk_overlap=CHUNK_OVERLAP,
-        length_function=len,
-        separators=["\n\n", "\n", ".", " ", ""]
-    )
-    
-    documents = []
-    
-    for _, row in tqdm(df.iterrows(), total=len(df), desc="Chunking"):
-        narrative = row['cleaned_narrative']
-        if pd.isna(narrative):
-            continue
-            
-        chunks = text_splitter.split_text(str(narrative))
-        total_chunks = len(chunks)
-        
-        for i, chunk in enumerate(chunks):
-            # Create metadata dict
-            meta = {
-                'complaint_id': str(row['complaint_id']),
-                'product': str(row['product']),
-                'issue': str(row['issue']),
-                'sub_issue': str(row.get('sub_issue', '')),
-                'company': str(row['company']),
-                'date_received': str(row['date_received']),
-                'chunk_index': i,
-                'total_chunks': total_chunks
-            }
-            # Clean none/nan values in metadata
-            meta = {k: v if v != 'nan' else '' for k, v in meta.items()}
-            
-            documents.append({
-                'text': chunk,
-                'metadata': meta,
-                'id': f"{row['complaint_id']}_{i}"
-            })
-            
+    documents = chunk_records(frame_records(df), CHUNK_SIZE, CHUNK_OVERLAP)
     print(f"Generated {len(documents)} chunks from {len(df)} complaints.")
     return documents
 
-def create_vector_store(documents):
-    print(f"Initializing Embedding Model: {EMBEDDING_MODEL_NAME}...")
-    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
-    
-    # Calculate embeddings
-    texts = [doc['text'] for doc in documents]
-    
-    print("Generating Embeddings (this may take a while)...")
+def load_ingest_embedder():
+    # Chunk embeddings go through the on-disk cache, so unchanged chunk texts are never re-encoded
+    model = load_embedder(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND)
+    if not EMBEDDING_CACHE_DIR:
+        return model
+    return CachedEmbedder(model, EmbeddingCache(EMBEDDING_CACHE_DIR, EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND))
+
+def print_embedder_stats(model):
+    if isinstance(model, CachedEmbedder):
+        print_cache_stats(model.cache)
+
+def embed_texts(model, texts):
     # Batch processing for embeddings
     batch_size = 256
     embeddings = []
@@ -117,39 +123,335 @@ def create_vector_store(documents):
         batch_texts = texts[i:i+batch_size]
         batch_embeddings = model.encode(batch_texts)
         embeddings.extend(batch_embeddings)
-        
-    print(f"Generated {len(embeddings)} embeddings.")
-    
+    return embeddings
+
+def _manifest_entries(hashes, chunk_counts, lookup):
+    # Complaints folded into a representative are recorded with 0 chunks and a pointer to it
+    entries = {}
+    for cid, h in hashes.items():
+        entries[cid] = {"hash": h, "chunks": chunk_counts.pop(cid, 0)}
+        if cid in lookup:
+            entries[cid]["duplicate_of"] = lookup[cid]
+    return entries
+
+def _print_dedup_savings(dedup_report, report, index_writer):
+    print_dedup_report(
+        dedup_report,
+        chunks_written=report["stages"]["write"]["items"],
+        embed_seconds=report["stages"]["embed"]["busy_seconds"],
+        bytes_per_chunk=index_writer.row_bytes(),
+    )
+
+def create_vector_store(data, dedup=DEDUP_NARRATIVES, store_dir=VECTOR_STORE_DIR, chunk_size=CHUNK_SIZE,
+                        chunk_overlap=CHUNK_OVERLAP, hnsw=CHROMA_HNSW, sampled=False):
+    """Rebuilds complaints_rag, the NumPy index and the ingest manifest from `data`.
+
+    `data` is a DataFrame or an iterable of DataFrames (e.g. a chunked read_csv); rows
+    stream through IngestPipeline, so only a few batches are held in memory at a time.
+    With `dedup`, a DataFrame is first clustered into exact/near-duplicate narratives and
+    only each cluster's representative is embedded. `hnsw` holds Chroma "hnsw:*"
+    collection settings (see parse_hnsw_settings). `sampled` records that `data` is a
+    sample of the corpus, which incremental_update checks before growing it.
+    """
+    frames = [data] if isinstance(data, pd.DataFrame) else data
+    clusters, member_dates, dedup_report = {}, {}, None
+    if dedup and isinstance(data, pd.DataFrame):
+        print("Finding duplicate narratives...")
+        clusters, member_dates, dedup_report = find_duplicates([data])
+    lookup = duplicate_lookup(clusters)
+
+    print(f"Initializing Embedding Model: {EMBEDDING_MODEL_NAME} ({EMBEDDING_BACKEND})...")
+    model = load_ingest_embedder()
+
     # Initialize ChromaDB
-    print(f"Initializing ChromaDB in {VECTOR_STORE_DIR}...")
-    client = chromadb.PersistentClient(path=VECTOR_STORE_DIR)
-    
+    print(f"Initializing ChromaDB in {store_dir}...")
+    client = chromadb.PersistentClient(path=store_dir)
+
     # Delete collection if exists to start fresh (for this task)
     try:
         client.delete_collection("complaints_rag")
     except Exception as e:
         print(f"Collection delete skipped: {e}")
-        
-    collection = client.create_collection(name="complaints_rag")
-    
-    # Add to ChromaDB in batches to avoid message size limits
-    ids = [doc['id'] for doc in documents]
-    metadatas = [doc['metadata'] for doc in documents]
-    
-    print("Indexing to ChromaDB...")
-    chroma_batch_size = 5000 # Chroma limit is usually ~40k but safer lower
-    for i in tqdm(range(0, len(ids), chroma_batch_size), desc="Indexing"):
-        end_idx = i + chroma_batch_size
-        collection.add(
-            documents=texts[i:end_idx],
-            embeddings=embeddings[i:end_idx],
-            metadatas=metadatas[i:end_idx],
-            ids=ids[i:end_idx]
-        )
-        
+
+    collection = client.create_collection(name="complaints_rag", metadata=hnsw or None)
+
+    # Exact-search matrix for the numpy retrieval backend, written alongside Chroma
+    index_writer = NumpyIndexWriter(numpy_index_dir(store_dir), dtype=NUMPY_INDEX_DTYPE)
+
+    def add_to_chroma(ids, embeddings, texts, metadatas):
+        collection.add(documents=texts, embeddings=embeddings, metadatas=metadatas, ids=ids)
+
+    hashes = {}
+    chunk_counts = {}
+
+    def prepared(frames):
+        for frame in frames:
+            hashes.update(hash_complaints(frame))
+            yield drop_duplicates(frame, clusters, lookup, member_dates) if clusters else frame
+
+    def count_chunks(documents):
+        for doc in documents:
+            complaint_id = doc['metadata']['complaint_id']
+            chunk_counts[complaint_id] = chunk_counts.get(complaint_id, 0) + 1
+
+    print("Chunking, embedding and indexing...")
+    pipeline = IngestPipeline(model, [add_to_chroma, index_writer.add], chunk_size, chunk_overlap,
+                              on_written=count_chunks)
+    try:
+        report = pipeline.run(prepared(frames))
+    except BaseException:
+        index_writer.abort()
+        raise
+    index_writer.finish()
+    print_report(report)
+    print_embedder_stats(model)
+    if dedup_report is not None:
+        _print_dedup_savings(dedup_report, report, index_writer)
+
+    save_manifest(store_dir, _manifest_entries(hashes, chunk_counts, lookup))
+    save_sample_info(store_dir, {"complaints": len(hashes)} if sampled else None)
+
+    # Signal running RAG pipelines that cached answers are stale
+    bump_index_version(store_dir)
     print("Indexing Complete.")
     return client, collection
 
+def count_rows(path):
+    return sum(len(frame) for frame in pd.read_csv(path, usecols=['complaint_id'], chunksize=200000))
+
+def format_duration(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{seconds:02d}s"
+
+def ingest_full_corpus(input_file=INPUT_FILE, resume=True, dedup=DEDUP_NARRATIVES):
+    """Indexes every complaint in `input_file` without sampling or loading it whole.
+
+    The CSV is streamed in FULL_CORPUS_FRAME_ROWS-row frames. Every CHECKPOINT_INTERVAL
+    seconds, at a frame boundary, the manifest of complaints indexed so far and a
+    checkpoint (rows done, NumPy writer state) are saved. Running again with the same input
+    and settings resumes from the last checkpoint; chunks written after it are upserted
+    again, which overwrites them.
+
+    With `dedup`, a first pass over the CSV clusters duplicate narratives (saved next to
+    the checkpoint) and only each cluster's representative is embedded.
+    """
+    stat = os.stat(input_file)
+    settings = {
+        "input": os.path.abspath(input_file),
+        "input_size": stat.st_size,
+        "input_mtime": int(stat.st_mtime),
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "hnsw": CHROMA_HNSW,
+        "embedding_backend": EMBEDDING_BACKEND,
+        "numpy_index_dtype": NUMPY_INDEX_DTYPE,
+        "dedup": dedup,
+    }
+    checkpoint = load_checkpoint(VECTOR_STORE_DIR) if resume else None
+    if checkpoint is not None and checkpoint["settings"] != settings:
+        print("Checkpoint belongs to a different input file or settings; starting over.")
+        checkpoint = None
+
+    print(f"Initializing Embedding Model: {EMBEDDING_MODEL_NAME} ({EMBEDDING_BACKEND})...")
+    model = load_ingest_embedder()
+    client = chromadb.PersistentClient(path=VECTOR_STORE_DIR)
+    index_dir = numpy_index_dir(VECTOR_STORE_DIR)
+
+    if checkpoint is None:
+        print(f"Counting rows in {input_file}...")
+        total_rows = count_rows(input_file)
+        rows_done = 0
+        manifest = {}
+        try:
+            client.delete_collection("complaints_rag")
+        except Exception as e:
+            print(f"Collection delete skipped: {e}")
+        collection = client.create_collection(name="complaints_rag", metadata=CHROMA_HNSW or None)
+        index_writer = NumpyIndexWriter(index_dir, dtype=NUMPY_INDEX_DTYPE)
+        # The previous manifest no longer describes the emptied collection
+        save_manifest(VECTOR_STORE_DIR, manifest)
+        save_sample_info(VECTOR_STORE_DIR, None)
+        clusters, member_dates, dedup_report = {}, {}, None
+        if dedup:
+            print("Finding duplicate narratives...")
+            clusters, member_dates, dedup_report = find_duplicates(pd.read_csv(
+                input_file, usecols=['complaint_id', 'cleaned_narrative', 'date_received', *DEDUP_SCOPE_FIELDS],
+                chunksize=FULL_CORPUS_FRAME_ROWS
+            ))
+            save_duplicates(VECTOR_STORE_DIR, clusters, member_dates, dedup_report)
+    else:
+        total_rows = checkpoint["total_rows"]
+        rows_done = checkpoint["rows_done"]
+        manifest = load_manifest(VECTOR_STORE_DIR) or {}
+        collection = client.get_or_create_collection(name="complaints_rag")
+        index_writer = NumpyIndexWriter.resume(index_dir, checkpoint["numpy_index"])
+        clusters, member_dates, dedup_report = load_duplicates(VECTOR_STORE_DIR) if dedup else ({}, {}, None)
+        print(f"Resuming from checkpoint: {rows_done}/{total_rows} rows already indexed.")
+    print(f"Indexing {total_rows - rows_done} of {total_rows} complaints from {input_file}...")
+
+    lookup = duplicate_lookup(clusters)
+    frame_hashes = {}
+    frame_rows = {}
+    chunk_counts = {}
+
+    def frames():
+        # Re-reads (without embedding) the rows finished before the checkpoint
+        seen = 0
+        index = 0
+        for frame in pd.read_csv(input_file, chunksize=FULL_CORPUS_FRAME_ROWS):
+            start, seen = seen, seen + len(frame)
+            if seen <= rows_done:
+                continue
+            if start < rows_done:
+                frame = frame.iloc[rows_done - start:]
+            frame_hashes[index] = hash_complaints(frame)
+            frame_rows[index] = len(frame)
+            index += 1
+            yield drop_duplicates(frame, clusters, lookup, member_dates) if clusters else frame
+
+    def upsert_to_chroma(ids, embeddings, texts, metadatas):
+        collection.upsert(documents=texts, embeddings=embeddings, metadatas=metadatas, ids=ids)
+
+    def count_chunks(documents):
+        for doc in documents:
+            complaint_id = doc['metadata']['complaint_id']
+            chunk_counts[complaint_id] = chunk_counts.get(complaint_id, 0) + 1
+
+    def save_progress():
+        save_manifest(VECTOR_STORE_DIR, manifest)
+        save_checkpoint(VECTOR_STORE_DIR, {
+            "settings": settings,
+            "total_rows": total_rows,
+            "rows_done": rows_done,
+            "numpy_index": index_writer.checkpoint(),
+        })
+        bump_index_version(VECTOR_STORE_DIR)
+
+    start_rows = rows_done
+    started = time.perf_counter()
+    last_checkpoint = started
+
+    def frame_written(index):
+        nonlocal rows_done, last_checkpoint
+        manifest.update(_manifest_entries(frame_hashes.pop(index), chunk_counts, lookup))
+        rows_done += frame_rows.pop(index)
+
+        now = time.perf_counter()
+        rate = (rows_done - start_rows) / (now - started)
+        eta = format_duration((total_rows - rows_done) / rate) if rate else "?"
+        print(f"  {rows_done}/{total_rows} rows ({100 * rows_done / max(total_rows, 1):.1f}%), "
+              f"{rate:.0f} rows/s, ETA {eta}")
+        if now - last_checkpoint >= CHECKPOINT_INTERVAL:
+            save_progress()
+            last_checkpoint = now
+
+    pipeline = IngestPipeline(model, [upsert_to_chroma, index_writer.add], CHUNK_SIZE, CHUNK_OVERLAP,
+                              on_written=count_chunks, on_frame_written=frame_written)
+    try:
+        report = pipeline.run(frames())
+    except BaseException:
+        # Keep the partial NumPy index for the next run to resume
+        print(f"❌ Ingestion stopped; run again to resume from the last checkpoint ({VECTOR_STORE_DIR}).")
+        raise
+    index_writer.finish()
+    save_manifest(VECTOR_STORE_DIR, manifest)
+    clear_checkpoint(VECTOR_STORE_DIR)
+    bump_index_version(VECTOR_STORE_DIR)
+    print_report(report)
+    print_embedder_stats(model)
+    if dedup_report is not None:
+        _print_dedup_savings(dedup_report, report, index_writer)
+    print(f"Full-corpus indexing complete: {len(manifest)} complaints, {index_writer.count} chunks.")
+    return client, collection
+
+def incremental_update(df, extend_sample=False):
+    """Brings complaints_rag in line with `df` by indexing only what changed.
+
+    The manifest records each indexed complaint's content hash and chunk count. New and
+    changed complaints are chunked, embedded and upserted; removed ones (and the old
+    chunks of changed ones) are deleted, and the NumPy index gets the same delta appended
+    and tombstoned. The collection stays queryable throughout. Returns the number of
+    complaints (new, changed, removed).
+
+    After the default (sampled) build, every complaint of the full corpus outside the
+    sample is new, and would be embedded in one in-memory batch. That is refused unless
+    `extend_sample` is set; `--full` indexes the full corpus resumably instead.
+    """
+    start = time.perf_counter()
+    manifest = load_manifest(VECTOR_STORE_DIR)
+    hashes = hash_complaints(df)
+    if manifest is None:
+        print("No ingest manifest found; building the index from scratch.")
+        create_vector_store(df)
+        return len(hashes), 0, 0
+
+    new, changed, removed = diff_manifest(manifest, hashes)
+    # Duplicates folded into a changed or removed representative get indexed on their own
+    gone = set(changed) | set(removed)
+    orphans = [cid for cid, entry in manifest.items()
+               if entry.get("duplicate_of") in gone and cid in hashes and cid not in gone]
+    if orphans:
+        print(f"{len(orphans)} duplicates lost their representative and will be indexed separately.")
+        changed += orphans
+    print(f"Delta: {len(new)} new, {len(changed)} changed, {len(removed)} removed "
+          f"({len(hashes) - len(new) - len(changed)} unchanged).")
+    sample_info = load_sample_info(VECTOR_STORE_DIR)
+    if sample_info is not None and new and not extend_sample:
+        print(f"❌ The index holds a {sample_info['complaints']}-complaint sample; this update would embed "
+              f"{len(new)} complaints outside it in one batch. Run with --full to index the full corpus, "
+              f"or pass --extend-sample to add them incrementally.")
+        return 0, 0, 0
+    if not (new or changed or removed):
+        print("Index is up to date.")
+        return 0, 0, 0
+
+    client = chromadb.PersistentClient(path=VECTOR_STORE_DIR)
+    collection = client.get_or_create_collection(name="complaints_rag")
+
+    # Old chunks of changed complaints go too: a shorter narrative leaves fewer chunks
+    stale_ids = chunk_ids(manifest, changed + removed)
+    chroma_batch_size = 5000
+    for i in range(0, len(stale_ids), chroma_batch_size):
+        collection.delete(ids=stale_ids[i:i + chroma_batch_size])
+
+    delta_ids = set(new) | set(changed)
+    documents = chunk_data(df[df['complaint_id'].astype(str).isin(delta_ids)])
+    ids = [doc['id'] for doc in documents]
+    texts = [doc['text'] for doc in documents]
+    metadatas = [doc['metadata'] for doc in documents]
+    embeddings = []
+    if documents:
+        model = load_ingest_embedder()
+        embeddings = embed_texts(model, texts)
+        print_embedder_stats(model)
+        for i in tqdm(range(0, len(ids), chroma_batch_size), desc="Upserting"):
+            end_idx = i + chroma_batch_size
+            collection.upsert(
+                documents=texts[i:end_idx],
+                embeddings=embeddings[i:end_idx],
+                metadatas=metadatas[i:end_idx],
+                ids=ids[i:end_idx]
+            )
+
+    index_dir = numpy_index_dir(VECTOR_STORE_DIR)
+    if NumpyIndex.exists(index_dir):
+        # Rows of new complaints are dropped too, in case an earlier run indexed them
+        update_numpy_index(index_dir, new + changed + removed, ids, embeddings, texts, metadatas)
+    else:
+        print(f"No NumPy index at {index_dir}; run a full rebuild to create it.")
+
+    for cid in removed:
+        del manifest[cid]
+    manifest.update(build_manifest({cid: hashes[cid] for cid in delta_ids}, documents))
+    save_manifest(VECTOR_STORE_DIR, manifest)
+    if extend_sample:
+        save_sample_info(VECTOR_STORE_DIR, None)
+    bump_index_version(VECTOR_STORE_DIR)
+    print(f"Incremental update done in {time.perf_counter() - start:.1f}s "
+          f"({len(documents)} chunks upserted, {len(stale_ids)} deleted).")
+    return len(new), len(changed), len(removed)
+
 def sanity_check(collection):
     print("\n--- Sanity Retrieval Test ---")
     question = "Billing issues with credit cards"
@@ -159,7 +461,7 @@ def sanity_check(collection):
     # However, since we passed raw embeddings, we might need to embed the query manually or set the function in collection.
     # Simplest: Embed query manually here using the model we already loaded (re-instantiate or pass it).
     
-    model = SentenceTransformer(EMBEDDING_MODEL_NAME)
+    model = load_embedder(EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND)
     query_vec = model.encode([question]).tolist()
     
     results = collection.query(
@@ -175,16 +477,35 @@ def sanity_check(collection):
         print("-" * 50)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chunk, embed and index complaints into complaints_rag.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only index new/changed complaints of --input and delete removed ones (no sampling)")
+    parser.add_argument("--extend-sample", action="store_true",
+                        help="With --incremental, allow adding complaints outside the sample of a default build "
+                             "(prefer --full for the full corpus)")
+    parser.add_argument("--full", action="store_true",
+                        help="Index every complaint of --input (no sampling), resuming an interrupted run")
+    parser.add_argument("--restart", action="store_true",
+                        help="With --full, ignore any checkpoint and start from the first row")
+    parser.add_argument("--no-dedup", action="store_true",
+                        help="Embed every narrative, including exact and near duplicates")
+    parser.add_argument("--input", default=INPUT_FILE, help="Processed complaints CSV for --incremental and --full")
+    args = parser.parse_args()
+
     ensure_dir_clean(VECTOR_STORE_DIR)
-    
-    # 2. Sample
-    sample_df = load_and_sample_data()
-    
-    # 3. Chunk
-    chunks = chunk_data(sample_df)
-    
-    # 5 & 6. Embed and Index
-    client, collection = create_vector_store(chunks)
-    
-    # 8. Test
-    sanity_check(collection)
+
+    if args.full:
+        client, collection = ingest_full_corpus(args.input, resume=not args.restart, dedup=not args.no_dedup)
+        sanity_check(collection)
+    elif args.incremental:
+        print(f"Loading data from {args.input}...")
+        incremental_update(pd.read_csv(args.input), extend_sample=args.extend_sample)
+    else:
+        # 2. Sample
+        sample_df = load_and_sample_data()
+        
+        # 3, 5 & 6. Chunk, Embed and Index
+        client, collection = create_vector_store(sample_df, dedup=not args.no_dedup, sampled=True)
+        
+        # 8. Test
+        sanity_check(collection)
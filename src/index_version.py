@@ -0,0 +1,26 @@
+import os
+import time
+import uuid
+
+# Marker written next to the Chroma files whenever the complaints index changes.
+# Readers compare it to detect a rebuilt or updated collection cheaply.
+INDEX_VERSION_FILENAME = 'index_version.txt'
+
+
+def bump_index_version(store_dir):
+    os.makedirs(store_dir, exist_ok=True)
+    version = f"{int(time.time())}-{uuid.uuid4().hex[:8]}"
+    path = os.path.join(store_dir, INDEX_VERSION_FILENAME)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(version)
+    os.replace(tmp_path, path)
+    return version
+
+
+def read_index_version(store_dir):
+    try:
+        with open(os.path.join(store_dir, INDEX_VERSION_FILENAME)) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
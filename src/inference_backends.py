@@ -0,0 +1,145 @@
+import os
+import time
+
+# Supported CPU inference backends
+# fp32: stock PyTorch weights
+# int8: torch dynamic quantization of all Linear layers (weights int8, activations quantized on the fly)
+# onnx: ONNX Runtime export via optimum (optional dependency: pip install "optimum[onnxruntime]")
+# offline: deterministic local stand-ins (offline_models), no downloads; for benchmarks and tests
+BACKENDS = ("fp32", "int8", "onnx", "offline")
+DEFAULT_BACKEND = "fp32"
+# Pool size charged for a model whose weights can't be measured (never 0, so LRU eviction still sees it)
+MODEL_SIZE_FALLBACK_MB = float(os.getenv("MODEL_SIZE_FALLBACK_MB", "1024"))
+ONNX_WEIGHT_SUFFIXES = (".onnx", ".onnx_data", ".onnx.data")
+
+
+def validate_backend(backend):
+    backend = (backend or DEFAULT_BACKEND).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}'. Choose one of: {', '.join(BACKENDS)}")
+    return backend
+
+
+def quantize_int8(model):
+    import torch
+    model.eval()
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def _onnx_import_error(e):
+    return RuntimeError(
+        "The 'onnx' backend requires optimum with ONNX Runtime: pip install \"optimum[onnxruntime]\""
+    ).with_traceback(e.__traceback__)
+
+
+def load_embedder(model_name, backend=DEFAULT_BACKEND):
+    backend = validate_backend(backend)
+    if backend == "offline":
+        from offline_models import HashingEmbedder
+        return HashingEmbedder()
+
+    from sentence_transformers import SentenceTransformer
+    if backend == "onnx":
+        try:
+            return SentenceTransformer(model_name, device="cpu", backend="onnx")
+        except ImportError as e:
+            raise _onnx_import_error(e)
+
+    model = SentenceTransformer(model_name, device="cpu")
+    if backend == "int8":
+        model = quantize_int8(model)
+    return model
+
+
+def load_seq2seq(model_name, backend=DEFAULT_BACKEND):
+    backend = validate_backend(backend)
+    if backend == "offline":
+        from offline_models import build_offline_seq2seq
+        return build_offline_seq2seq()
+
+    from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if backend == "onnx":
+        try:
+            from optimum.onnxruntime import ORTModelForSeq2SeqLM
+        except ImportError as e:
+            raise _onnx_import_error(e)
+        model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True)
+        return tokenizer, model
+
+    model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
+    model.eval()
+    if backend == "int8":
+        model = quantize_int8(model)
+    return tokenizer, model
+
+
+def compare_retrieval_overlap(collection, questions, reference_embedder, candidate_embedder, k=5):
+    """Runs each question through both embedders against the same collection and
+    reports how many of the reference top-k ids the candidate also returns."""
+    overlaps = []
+    reference_times = []
+    candidate_times = []
+    per_question = []
+
+    for question in questions:
+        start = time.perf_counter()
+        ref_vec = reference_embedder.encode([question])
+        reference_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        cand_vec = candidate_embedder.encode([question])
+        candidate_times.append(time.perf_counter() - start)
+
+        ref_ids = collection.query(query_embeddings=ref_vec.tolist(), n_results=k, include=[])['ids'][0]
+        cand_ids = collection.query(query_embeddings=cand_vec.tolist(), n_results=k, include=[])['ids'][0]
+
+        overlap = len(set(ref_ids) & set(cand_ids)) / max(len(ref_ids), 1)
+        overlaps.append(overlap)
+        per_question.append({"question": question, "overlap": round(overlap, 3)})
+
+    n = max(len(questions), 1)
+    return {
+        "k": k,
+        "questions": len(questions),
+        "mean_overlap": round(sum(overlaps) / n, 4),
+        "min_overlap": round(min(overlaps), 4) if overlaps else 0.0,
+        "reference_embed_ms": round(sum(reference_times) / n * 1000, 2),
+        "candidate_embed_ms": round(sum(candidate_times) / n * 1000, 2),
+        "per_question": per_question,
+    }
+
+
+def _onnx_file_bytes(model):
+    """Size of an ONNX Runtime model's .onnx/.onnx_data files on disk, or 0 if none are found."""
+    save_dir = getattr(model, "model_save_dir", None)
+    if save_dir is None or not os.path.isdir(save_dir):
+        return 0
+    total = 0
+    for root, _, files in os.walk(save_dir):
+        for name in files:
+            if name.endswith(ONNX_WEIGHT_SUFFIXES):
+                total += os.path.getsize(os.path.join(root, name))
+    return total
+
+
+def estimate_model_bytes(model):
+    """Approximate resident size of a model's weights, including int8 packed params.
+
+    ONNX Runtime models have no state_dict and are sized from their exported files;
+    anything unmeasurable is charged MODEL_SIZE_FALLBACK_MB.
+    """
+    fallback = int(MODEL_SIZE_FALLBACK_MB * 1024 ** 2)
+    try:
+        state = model.state_dict()
+    except Exception:
+        return _onnx_file_bytes(model) or fallback
+
+    def tensor_bytes(value):
+        if isinstance(value, (tuple, list)):
+            return sum(tensor_bytes(v) for v in value)
+        if hasattr(value, "element_size") and hasattr(value, "numel"):
+            return value.element_size() * value.numel()
+        return 0
+
+    return sum(tensor_bytes(v) for v in state.values()) or fallback
@@ -0,0 +1,119 @@
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+# Written next to the Chroma files; maps complaint_id -> {"hash", "chunks"} for every
+# complaint currently in complaints_rag
+MANIFEST_FILENAME = 'ingest_manifest.json'
+# Progress of an unfinished full-corpus build (see embedding_pipeline.ingest_full_corpus)
+CHECKPOINT_FILENAME = 'ingest_checkpoint.json'
+# Present while the manifest only covers a sample of the corpus (the default build)
+SAMPLE_FILENAME = 'ingest_sample.json'
+# Row fields that end up in chunk text or metadata; any change re-indexes the complaint
+HASHED_FIELDS = ('cleaned_narrative', 'product', 'issue', 'sub_issue', 'company', 'date_received')
+
+
+def manifest_path(store_dir):
+    return os.path.join(store_dir, MANIFEST_FILENAME)
+
+
+def complaint_hash(row):
+    digest = hashlib.sha1()
+    for field in HASHED_FIELDS:
+        value = row.get(field, '')
+        digest.update(('' if pd.isna(value) else str(value)).encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+
+def hash_complaints(df):
+    # complaint_id -> content hash (same as complaint_hash), for rows that have a narrative
+    # to index. The fields are joined column-wise, leaving one sha1 call per row.
+    rows = df[df['cleaned_narrative'].notna()]
+    joined = pd.Series('', index=rows.index, dtype=object)
+    for field in HASHED_FIELDS:
+        if field in rows.columns:
+            values = rows[field].astype(object)
+            joined = joined + values.where(values.notna(), '').astype(str)
+        joined = joined + '\x1f'
+    return dict(zip(rows['complaint_id'].astype(str),
+                    (hashlib.sha1(text.encode('utf-8')).hexdigest() for text in joined)))
+
+
+def build_manifest(hashes, documents):
+    chunks = {}
+    for doc in documents:
+        complaint_id = doc['metadata']['complaint_id']
+        chunks[complaint_id] = chunks.get(complaint_id, 0) + 1
+    return {cid: {"hash": h, "chunks": chunks.get(cid, 0)} for cid, h in hashes.items()}
+
+
+def _load_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _save_json(path, data):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_manifest(store_dir):
+    return _load_json(manifest_path(store_dir))
+
+
+def save_manifest(store_dir, manifest):
+    _save_json(manifest_path(store_dir), manifest)
+
+
+def load_checkpoint(store_dir):
+    return _load_json(os.path.join(store_dir, CHECKPOINT_FILENAME))
+
+
+def save_checkpoint(store_dir, checkpoint):
+    _save_json(os.path.join(store_dir, CHECKPOINT_FILENAME), checkpoint)
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def clear_checkpoint(store_dir):
+    _remove(os.path.join(store_dir, CHECKPOINT_FILENAME))
+
+
+def load_sample_info(store_dir):
+    # {"complaints": n} when the manifest was built from a sample, else None
+    return _load_json(os.path.join(store_dir, SAMPLE_FILENAME))
+
+
+def save_sample_info(store_dir, sample_info):
+    if sample_info is None:
+        _remove(os.path.join(store_dir, SAMPLE_FILENAME))
+    else:
+        _save_json(os.path.join(store_dir, SAMPLE_FILENAME), sample_info)
+
+
+def diff_manifest(manifest, hashes):
+    """Returns (new, changed, removed) complaint id lists between the manifest and current hashes."""
+    new = [cid for cid in hashes if cid not in manifest]
+    changed = [cid for cid, h in hashes.items() if cid in manifest and manifest[cid]["hash"] != h]
+    removed = [cid for cid in manifest if cid not in hashes]
+    return new, changed, removed
+
+
+def chunk_ids(manifest, complaint_ids):
+    # Chunk ids follow chunk_data's "<complaint_id>_<chunk_index>" scheme
+    return [f"{cid}_{i}" for cid in complaint_ids for i in range(manifest[cid]["chunks"])]
@@ -0,0 +1,341 @@
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Streaming ingestion: rows -> parallel chunking -> batched embedding -> vector store writes.
+# Stages run concurrently and are connected by bounded queues, so memory is set by the
+# batch sizes below and not by the corpus size.
+CPU_COUNT = os.cpu_count() or 2
+# Chunking worker processes; embedding keeps the remaining cores
+CHUNK_WORKERS = int(os.getenv("INGEST_CHUNK_WORKERS", str(max(1, CPU_COUNT // 4))))
+# Rows sent to a chunking worker per task
+CHUNK_TASK_ROWS = int(os.getenv("INGEST_CHUNK_TASK_ROWS", "500"))
+# Chunks per embedder.encode call (and per vector store write)
+EMBED_BATCH_SIZE = int(os.getenv("INGEST_EMBED_BATCH_SIZE", "256"))
+# Batches buffered between two stages
+QUEUE_BATCHES = int(os.getenv("INGEST_QUEUE_BATCHES", "4"))
+# Seconds between progress lines
+PROGRESS_INTERVAL = float(os.getenv("INGEST_PROGRESS_INTERVAL", "10"))
+# Default chunking: characters per chunk, and characters repeated between adjacent chunks
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+
+ROW_FIELDS = ('complaint_id', 'product', 'issue', 'sub_issue', 'company', 'date_received', 'cleaned_narrative',
+              'duplicate_ids', 'duplicate_dates', 'duplicate_count')
+
+_DONE = object()
+
+
+class _FrameEnd:
+    # Follows the last chunk of an input frame through every queue
+    def __init__(self, index):
+        self.index = index
+
+_splitters = {}
+
+
+def _splitter(chunk_size, chunk_overlap):
+    # One splitter per worker process and configuration
+    key = (chunk_size, chunk_overlap)
+    if key not in _splitters:
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        _splitters[key] = RecursiveCharacterTextSplitter(
+            chunk_size=chunk_size,
+            chunk_overlap=chunk_overlap,
+            length_function=len,
+            separators=["\n\n", "\n", ".", " ", ""]
+        )
+    return _splitters[key]
+
+
+def _is_missing(value):
+    return value is None or (isinstance(value, float) and value != value)
+
+
+def chunk_records(records, chunk_size, chunk_overlap):
+    """Splits complaint row dicts into chunk documents with ids and metadata."""
+    splitter = _splitter(chunk_size, chunk_overlap)
+    documents = []
+    for row in records:
+        narrative = row.get('cleaned_narrative')
+        if _is_missing(narrative):
+            continue
+
+        chunks = splitter.split_text(str(narrative))
+        total_chunks = len(chunks)
+        base_meta = {
+            'complaint_id': str(row['complaint_id']),
+            'product': row['product'],
+            'issue': row['issue'],
+            'sub_issue': row.get('sub_issue', ''),
+            'company': row['company'],
+            'date_received': row['date_received'],
+        }
+        # Clean none/nan values in metadata (missing values are NaN from CSV, None from Parquet)
+        base_meta = {k: '' if _is_missing(v) else str(v) for k, v in base_meta.items()}
+        # Complaints with the same narrative that were folded into this one, and the other
+        # days they were received on (see dedup.py)
+        base_meta['duplicate_ids'] = str(row.get('duplicate_ids') or '')
+        base_meta['duplicate_dates'] = str(row.get('duplicate_dates') or '')
+        base_meta['duplicate_count'] = int(row.get('duplicate_count') or 0)
+
+        for i, chunk in enumerate(chunks):
+            documents.append({
+                'text': chunk,
+                'metadata': dict(base_meta, chunk_index=i, total_chunks=total_chunks),
+                'id': f"{row['complaint_id']}_{i}"
+            })
+    return documents
+
+
+def frame_records(df):
+    columns = [c for c in ROW_FIELDS if c in df.columns]
+    return df[columns].to_dict('records')
+
+
+class StageStats:
+    def __init__(self, name, unit):
+        self.name = name
+        self.unit = unit
+        self.items = 0
+        self.busy = 0.0
+
+    def report(self, wall):
+        return {
+            "items": self.items,
+            "unit": self.unit,
+            "busy_seconds": round(self.busy, 3),
+            "per_second": round(self.items / wall, 1) if wall else 0.0,
+            "per_busy_second": round(self.items / self.busy, 1) if self.busy else 0.0,
+        }
+
+
+class IngestPipeline:
+    """Chunks, embeds and writes complaint rows as a pipeline of concurrent stages.
+
+    - chunking: a process pool over CHUNK_TASK_ROWS-row tasks, results kept in input order
+    - embedding: EMBED_BATCH_SIZE chunks per `encode` call, on its own thread
+    - writing: each `writer(ids, embeddings, texts, metadatas)` runs on the calling thread
+      while the next batches are being chunked and embedded
+
+    `on_written(documents)` is called after every batch reaches all writers, and
+    `on_frame_written(index)` once every chunk of the index-th input frame has.
+    """
+
+    def __init__(self, embedder, writers, chunk_size, chunk_overlap, workers=CHUNK_WORKERS,
+                 embed_batch_size=EMBED_BATCH_SIZE, queue_batches=QUEUE_BATCHES, on_written=None, on_frame_written=None, progress=None):
+        self.embedder = embedder
+        self.writers = writers
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.workers = max(0, int(workers))
+        self.embed_batch_size = max(1, int(embed_batch_size))
+        self.on_written = on_written
+        self.on_frame_written = on_frame_written
+        self.progress = progress
+        self._chunk_queue = queue.Queue(maxsize=max(1, queue_batches))
+        self._write_queue = queue.Queue(maxsize=max(1, queue_batches))
+        self._stop = threading.Event()
+        self._error = None
+        self.stats = {
+            "read": StageStats("read", "rows"),
+            "chunk": StageStats("chunk", "chunks"),
+            "embed": StageStats("embed", "chunks"),
+            "write": StageStats("write", "chunks"),
+        }
+        self.max_queue_depth = {"chunk": 0, "write": 0}
+
+    # --- Queue helpers that give up when another stage failed ---
+
+    def _put(self, q, item, name):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                self.max_queue_depth[name] = max(self.max_queue_depth[name], q.qsize())
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _DONE
+
+    def _fail(self, error):
+        if self._error is None:
+            self._error = error
+        self._stop.set()
+
+    # --- Stages ---
+
+    def _chunk_stage(self, frames):
+        pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers else None
+        pending = deque()
+        try:
+            def drain(limit):
+                while len(pending) > limit:
+                    started, future = pending.popleft()
+                    if isinstance(future, _FrameEnd):
+                        if not self._put(self._chunk_queue, future, "chunk"):
+                            return False
+                        continue
+                    documents = future.result()
+                    # Submit-to-result time per task, so it includes time waiting for a worker
+                    self.stats["chunk"].items += len(documents)
+                    self.stats["chunk"].busy += time.perf_counter() - started
+                    if documents and not self._put(self._chunk_queue, documents, "chunk"):
+                        return False
+                return True
+
+            frames = iter(frames)
+            frame_index = 0
+            while True:
+                started = time.perf_counter()
+                frame = next(frames, None)
+                if frame is None:
+                    break
+                records = frame_records(frame)
+                self.stats["read"].items += len(records)
+                self.stats["read"].busy += time.perf_counter() - started
+                for start in range(0, len(records), CHUNK_TASK_ROWS):
+                    task = records[start:start + CHUNK_TASK_ROWS]
+                    started = time.perf_counter()
+                    if pool is None:
+                        documents = chunk_records(task, self.chunk_size, self.chunk_overlap)
+                        self.stats["chunk"].items += len(documents)
+                        self.stats["chunk"].busy += time.perf_counter() - started
+                        if documents and not self._put(self._chunk_queue, documents, "chunk"):
+                            return
+                        continue
+                    pending.append((started, pool.submit(chunk_records, task, self.chunk_size, self.chunk_overlap)))
+                    # Keep every worker busy without queuing the whole input
+                    if not drain(2 * self.workers):
+                        return
+                if pool is None:
+                    if not self._put(self._chunk_queue, _FrameEnd(frame_index), "chunk"):
+                        return
+                else:
+                    pending.append((None, _FrameEnd(frame_index)))
+                frame_index += 1
+                if self._stop.is_set():
+                    return
+            if drain(0):
+                self._put(self._chunk_queue, _DONE, "chunk")
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+    def _embed_stage(self):
+        buffer = []
+        try:
+            while True:
+                item = self._get(self._chunk_queue)
+                # Frame ends and the final marker flush the partial batch ahead of them
+                flush = not isinstance(item, list)
+                if not flush:
+                    buffer.extend(item)
+                while len(buffer) >= self.embed_batch_size or (flush and buffer):
+                    batch, buffer = buffer[:self.embed_batch_size], buffer[self.embed_batch_size:]
+                    started = time.perf_counter()
+                    embeddings = np.asarray(self.embedder.encode([doc['text'] for doc in batch]), dtype=np.float32)
+                    self.stats["embed"].items += len(batch)
+                    self.stats["embed"].busy += time.perf_counter() - started
+                    if not self._put(self._write_queue, (batch, embeddings), "write"):
+                        return
+                if item is _DONE:
+                    self._put(self._write_queue, _DONE, "write")
+                    return
+                if flush and not self._put(self._write_queue, item, "write"):
+                    return
+        except BaseException as e:
+            self._fail(e)
+
+    def _write_stage(self, started):
+        last_progress = time.perf_counter()
+        while True:
+            item = self._get(self._write_queue)
+            if item is _DONE:
+                return
+            if isinstance(item, _FrameEnd):
+                if self.on_frame_written is not None:
+                    self.on_frame_written(item.index)
+                continue
+            batch, embeddings = item
+            write_start = time.perf_counter()
+            ids = [doc['id'] for doc in batch]
+            texts = [doc['text'] for doc in batch]
+            metadatas = [doc['metadata'] for doc in batch]
+            for writer in self.writers:
+                writer(ids, embeddings, texts, metadatas)
+            self.stats["write"].items += len(batch)
+            self.stats["write"].busy += time.perf_counter() - write_start
+            if self.on_written is not None:
+                self.on_written(batch)
+            if time.perf_counter() - last_progress >= PROGRESS_INTERVAL:
+                last_progress = time.perf_counter()
+                self._print_progress(last_progress - started)
+
+    def _print_progress(self, elapsed):
+        if self.progress is not None:
+            self.progress(self, elapsed)
+            return
+        written = self.stats["write"].items
+        print(f"  {self.stats['read'].items} rows read, {written} chunks written "
+              f"({written / elapsed:.0f} chunks/s, {elapsed:.0f}s elapsed)")
+
+    def run(self, frames):
+        """Runs the pipeline over an iterable of DataFrames and returns a per-stage report."""
+        self._size_embedding_threads()
+        started = time.perf_counter()
+        threads = [
+            threading.Thread(target=self._chunk_stage, args=(frames,), name="ingest-chunk", daemon=True),
+            threading.Thread(target=self._embed_stage, name="ingest-embed", daemon=True),
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            self._write_stage(started)
+        except BaseException as e:
+            self._fail(e)
+        finally:
+            self._stop.set()
+            for thread in threads:
+                thread.join()
+        if self._error is not None:
+            raise self._error
+
+        wall = time.perf_counter() - started
+        return {
+            "wall_seconds": round(wall, 3),
+            "chunk_workers": self.workers,
+            "embed_batch_size": self.embed_batch_size,
+            "stages": {name: stage.report(wall) for name, stage in self.stats.items()},
+            "max_queue_depth": dict(self.max_queue_depth),
+        }
+
+    def _size_embedding_threads(self):
+        # Torch would otherwise claim every core and contend with the chunking workers
+        if "torch" in sys.modules:
+            sys.modules["torch"].set_num_threads(max(1, CPU_COUNT - self.workers))
+
+
+def print_report(report):
+    print(f"\nIngestion finished in {report['wall_seconds']:.1f}s "
+          f"({report['chunk_workers']} chunking workers, embed batch {report['embed_batch_size']})")
+    print(f"{'Stage':<8}{'Items':>10}{'Unit':>8}{'Busy s':>10}{'Per s':>10}{'Per busy s':>12}")
+    for name, stage in report["stages"].items():
+        print(f"{name:<8}{stage['items']:>10}{stage['unit']:>8}{stage['busy_seconds']:>10}"
+              f"{stage['per_second']:>10}{stage['per_busy_second']:>12}")
+    print(f"Max queue depth (batches): {report['max_queue_depth']}")
@@ -0,0 +1,158 @@
+import os
+
+import numpy as np
+
+# Metadata fields written by chunk_data that can be filtered on, by one value or a list (IN)
+FILTER_FIELDS = ('product', 'company', 'issue', 'sub_issue', 'complaint_id')
+# Inclusive date range filters on date_received
+DATE_FIELD = 'date_received'
+DATE_FILTERS = ('date_from', 'date_to')
+# Candidate sets up to this many chunks are searched exactly instead of through HNSW
+EXACT_SEARCH_MAX_CANDIDATES = int(os.getenv("EXACT_SEARCH_MAX_CANDIDATES", "20000"))
+# Date column value for missing/unparseable dates (never matches a range)
+MISSING_DAY = np.iinfo(np.int64).min
+# Comma-joined ids and other received dates of the duplicates folded into a chunk's
+# complaint (see dedup.py); a chunk also matches the complaint_id and date filters on them
+MEMBER_IDS_FIELD = 'duplicate_ids'
+MEMBER_DATES_FIELD = 'duplicate_dates'
+
+
+def parse_day(value):
+    # "2023-01-05", "2023-01-05 00:00:00" or a date object -> days since epoch
+    return int(np.datetime64(str(value)[:10], 'D').astype(np.int64))
+
+
+def split_filters(filters):
+    """Splits request filters into ({field: [values]}, date_from, date_to).
+
+    Empty values are ignored; unknown fields and malformed dates raise ValueError.
+    """
+    values = {}
+    date_from = date_to = None
+    for key, val in (filters or {}).items():
+        if val is None or val == "" or val == []:
+            continue
+        if key == 'date_from':
+            date_from = parse_day(val)
+        elif key == 'date_to':
+            date_to = parse_day(val)
+        elif key in FILTER_FIELDS:
+            values[key] = [str(v) for v in val] if isinstance(val, (list, tuple, set)) else [str(val)]
+        else:
+            raise ValueError(f"Cannot filter on unknown field '{key}'")
+    return values, date_from, date_to
+
+
+class MetadataIndex:
+    """Resolves chunk metadata filters to a sorted array of candidate rows of a NumpyIndex.
+
+    Each field keeps a posting list per value (rows grouped by dictionary code), so an
+    equality or IN filter costs the size of the matching rows rather than a scan of the
+    collection. Dates are held as day numbers sorted once, so a range is a binary search.
+    Several filters are intersected smallest-first. Rows deleted from the index are left out.
+    A representative of folded duplicates also matches its members' ids and dates.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self._postings = {}
+        for field in FILTER_FIELDS + (MEMBER_IDS_FIELD, MEMBER_DATES_FIELD):
+            codes = index.columns[field]
+            order = np.argsort(codes, kind='stable')
+            order = order[index.live[order]]
+            bounds = np.searchsorted(codes[order], np.arange(len(index.vocab[field]) + 1))
+            self._postings[field] = (order, bounds)
+
+        days_of_code = []
+        for value in index.vocab[DATE_FIELD]:
+            try:
+                days_of_code.append(parse_day(value))
+            except ValueError:
+                days_of_code.append(MISSING_DAY)
+        days = np.asarray(days_of_code, dtype=np.int64)[index.columns[DATE_FIELD]] \
+            if days_of_code else np.zeros(index.count, dtype=np.int64)
+        self.days = days
+        dated = np.flatnonzero((days != MISSING_DAY) & index.live)
+        order = np.argsort(days[dated], kind='stable')
+        self._date_rows = dated[order]
+        self._date_sorted = days[self._date_rows]
+        self._row_of = None
+
+        # Member complaint_id -> duplicate_ids codes, and (day, duplicate_dates code) pairs by day
+        self._member_codes = {}
+        for code, value in enumerate(index.vocab[MEMBER_IDS_FIELD]):
+            for cid in value.split(','):
+                if cid:
+                    self._member_codes.setdefault(cid, []).append(code)
+        member_days, member_day_codes = [], []
+        for code, value in enumerate(index.vocab[MEMBER_DATES_FIELD]):
+            for date in value.split(','):
+                try:
+                    member_days.append(parse_day(date))
+                except ValueError:
+                    continue
+                member_day_codes.append(code)
+        order = np.argsort(np.asarray(member_days, dtype=np.int64), kind='stable')
+        self._member_days = np.asarray(member_days, dtype=np.int64)[order]
+        self._member_day_codes = np.asarray(member_day_codes, dtype=np.int64)[order]
+
+    def row_of(self, chunk_id):
+        if self._row_of is None:
+            live = self.index.live
+            self._row_of = {chunk_id: row for row, chunk_id in enumerate(self.index.ids) if live[row]}
+        return self._row_of.get(chunk_id)
+
+    def _code_rows(self, field, codes):
+        order, bounds = self._postings[field]
+        parts = [order[bounds[code]:bounds[code + 1]] for code in codes]
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+    def _field_rows(self, field, values):
+        code_of = self.index._code_of[field]
+        rows = self._code_rows(field, [code for code in (code_of.get(v) for v in values) if code is not None])
+        if field == 'complaint_id':
+            members = [code for v in values for code in self._member_codes.get(v, ())]
+            if members:
+                rows = np.unique(np.concatenate([rows, self._code_rows(MEMBER_IDS_FIELD, members)]))
+        return rows
+
+    def _member_date_codes(self, date_from, date_to):
+        # duplicate_dates codes with a member received within the range
+        lo = 0 if date_from is None else np.searchsorted(self._member_days, date_from, side='left')
+        hi = len(self._member_days) if date_to is None else np.searchsorted(self._member_days, date_to, side='right')
+        return np.unique(self._member_day_codes[lo:hi])
+
+    def _date_rows_between(self, date_from, date_to):
+        lo = 0 if date_from is None else np.searchsorted(self._date_sorted, date_from, side='left')
+        hi = len(self._date_sorted) if date_to is None else np.searchsorted(self._date_sorted, date_to, side='right')
+        return self._date_rows[lo:hi]
+
+    def resolve(self, filters):
+        """Returns the sorted candidate rows for `filters`, or None when nothing is filtered."""
+        values, date_from, date_to = split_filters(filters)
+        if not values and date_from is None and date_to is None:
+            return None
+
+        candidate_sets = [self._field_rows(field, vals) for field, vals in values.items()]
+        candidate_sets.sort(key=len)
+        if candidate_sets:
+            rows = np.sort(candidate_sets[0])
+            for other in candidate_sets[1:]:
+                if len(rows) == 0:
+                    break
+                rows = rows[np.isin(rows, other, assume_unique=True)]
+            if date_from is not None or date_to is not None:
+                # Check the few candidates directly rather than materializing the date range
+                day = self.days[rows]
+                keep = day != MISSING_DAY
+                if date_from is not None:
+                    keep &= day >= date_from
+                if date_to is not None:
+                    keep &= day <= date_to
+                keep |= np.isin(self.index.columns[MEMBER_DATES_FIELD][rows], self._member_date_codes(date_from, date_to))
+                rows = rows[keep]
+            return rows
+        member_rows = self._code_rows(MEMBER_DATES_FIELD, self._member_date_codes(date_from, date_to))
+        return np.union1d(self._date_rows_between(date_from, date_to), member_rows)
@@ -0,0 +1,194 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class ModelHandle:
+    def __init__(self, name, backend, tokenizer, model, batcher, packer=None, size_bytes=0, load_seconds=0.0):
+        self.name = name
+        self.backend = backend
+        self.tokenizer = tokenizer
+        self.model = model
+        self.batcher = batcher
+        self.packer = packer
+        self.size_bytes = size_bytes
+        self.load_seconds = load_seconds
+        self.in_flight = 0
+        self.last_used = time.time()
+
+    @property
+    def key(self):
+        return (self.name, self.backend)
+
+    def info(self):
+        return {
+            "model": self.name,
+            "backend": self.backend,
+            "size_mb": round(self.size_bytes / 1024 ** 2, 1),
+            "load_seconds": round(self.load_seconds, 2),
+            "in_flight": self.in_flight,
+            "idle_seconds": round(time.time() - self.last_used, 1),
+        }
+
+
+class ModelRegistry:
+    """Keeps several LLMs resident and switches between them atomically.
+
+    `loader(name, backend)` returns a ModelHandle. Loads run on a background thread;
+    switching to a model that is not resident returns immediately and activates it
+    once loaded (unless a newer switch was requested in the meantime). Requests take
+    a handle with `acquire()` and keep using it until `release()`, so a switch never
+    changes the model under an in-flight request. Idle, inactive models are evicted
+    in LRU order when the pool exceeds `max_bytes`.
+    """
+
+    def __init__(self, loader, max_bytes=None, on_activate=None):
+        self._loader = loader
+        self.max_bytes = max_bytes
+        self._on_activate = on_activate
+
+        self._models = OrderedDict()
+        self._loading = {}
+        self._failed = {}
+        self._active_key = None
+        # Model a switch is waiting for; never evicted until the switch has completed
+        self._pending_key = None
+        self._switch_seq = 0
+        self._lock = threading.RLock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-loader")
+
+    # --- Loading ---
+
+    def load(self, name, backend):
+        key = (name, backend)
+        with self._lock:
+            if key in self._models:
+                future = Future()
+                future.set_result(self._models[key])
+                return future
+            if key in self._loading:
+                return self._loading[key]
+            self._failed.pop(key, None)
+            future = self._executor.submit(self._load, key)
+            self._loading[key] = future
+            return future
+
+    def _load(self, key):
+        try:
+            handle = self._loader(*key)
+        except Exception as e:
+            with self._lock:
+                self._loading.pop(key, None)
+                self._failed[key] = str(e)
+            print(f"Failed to load model {key[0]} ({key[1]}): {e}")
+            raise
+        with self._lock:
+            self._models[key] = handle
+            self._loading.pop(key, None)
+            # Never evict the model that was just loaded, it may be the pending switch target
+            self._evict(protect=key)
+        return handle
+
+    def preload(self, specs):
+        for name, backend in specs:
+            self.load(name, backend)
+
+    # --- Switching ---
+
+    def activate(self, name, backend, wait=False):
+        key = (name, backend)
+        with self._lock:
+            self._switch_seq += 1
+            seq = self._switch_seq
+            if key in self._models:
+                self._pending_key = None
+                self._set_active(key)
+                return "active"
+            future = self.load(name, backend)
+            self._pending_key = key
+
+        def finish_switch():
+            # A newer switch request supersedes this one (and owns _pending_key)
+            if seq == self._switch_seq:
+                self._pending_key = None
+                if key in self._models:
+                    self._set_active(key)
+
+        if wait:
+            try:
+                future.result()
+            finally:
+                with self._lock:
+                    finish_switch()
+            with self._lock:
+                return "active" if self._active_key == key else "superseded"
+
+        def activate_when_loaded(f):
+            with self._lock:
+                finish_switch()
+
+        future.add_done_callback(activate_when_loaded)
+        return "loading"
+
+    def _set_active(self, key):
+        changed = key != self._active_key
+        self._active_key = key
+        self._models.move_to_end(key)
+        self._models[key].last_used = time.time()
+        if changed:
+            print(f"Active model is now {key[0]} ({key[1]})")
+            if self._on_activate:
+                self._on_activate(self._models[key])
+            self._evict()
+
+    @property
+    def active(self):
+        with self._lock:
+            return self._models[self._active_key] if self._active_key else None
+
+    # --- Request lifecycle ---
+
+    def acquire(self):
+        with self._lock:
+            if self._active_key is None:
+                raise RuntimeError("No model is loaded yet")
+            handle = self._models[self._active_key]
+            handle.in_flight += 1
+            handle.last_used = time.time()
+            self._models.move_to_end(self._active_key)
+            return handle
+
+    def release(self, handle):
+        with self._lock:
+            handle.in_flight -= 1
+            self._evict()
+
+    # --- Eviction ---
+
+    def resident_bytes(self):
+        return sum(h.size_bytes for h in self._models.values())
+
+    def _evict(self, protect=None):
+        if not self.max_bytes:
+            return
+        for key in list(self._models.keys()):
+            if self.resident_bytes() <= self.max_bytes:
+                return
+            handle = self._models[key]
+            if key in (self._active_key, self._pending_key, protect) or handle.in_flight > 0:
+                continue
+            print(f"Evicting model {handle.name} ({handle.backend}) to stay within the memory budget")
+            del self._models[key]
+            handle.batcher.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": self._models[self._active_key].info() if self._active_key else None,
+                "resident": [h.info() for h in self._models.values()],
+                "loading": [{"model": k[0], "backend": k[1]} for k in self._loading],
+                "failed": [{"model": k[0], "backend": k[1], "error": err} for k, err in self._failed.items()],
+                "resident_mb": round(self.resident_bytes() / 1024 ** 2, 1),
+                "max_mb": round(self.max_bytes / 1024 ** 2, 1) if self.max_bytes else None,
+            }
@@ -0,0 +1,389 @@
+import json
+import os
+import shutil
+from array import array
+
+import numpy as np
+
+# Written inside the vector store directory, next to the Chroma files
+NUMPY_INDEX_DIRNAME = 'numpy_index'
+# Chunk metadata kept as dictionary-encoded columns for filtering
+CATEGORICAL_FIELDS = ('complaint_id', 'product', 'company', 'issue', 'sub_issue', 'date_received', 'duplicate_ids',
+                      'duplicate_dates')
+INTEGER_FIELDS = ('chunk_index', 'total_chunks', 'duplicate_count')
+# Rows scored per block during a full scan (bounds temporary memory per query batch)
+SCAN_BLOCK_ROWS = 32768
+# index.json version of the appendable layout (raw files plus deleted rows); older indexes
+# hold .npy files and are rewritten once by the first update
+NUMPY_INDEX_VERSION = 2
+# An update rewrites the index without its deleted rows once they exceed this share of it
+COMPACT_DELETED_FRACTION = float(os.getenv("NUMPY_INDEX_COMPACT_FRACTION", "0.25"))
+
+
+def numpy_index_dir(store_dir):
+    return os.path.join(store_dir, NUMPY_INDEX_DIRNAME)
+
+
+class NumpyIndexWriter:
+    """Streams rows into a NumpyIndex directory, holding at most one batch in memory.
+
+    Every per-row array, the ids and the metadata vocabularies are appended to raw files
+    as rows arrive, and deleted rows to deleted.raw. `checkpoint()` records the file sizes,
+    and `resume()` truncates back to them, so an interrupted build continues where it was
+    last checkpointed. `finish()` writes index.json with those sizes; readers only look at
+    that many rows, so a new build is swapped in whole and `reopen()` appends to a live
+    index in place without readers seeing a half-written update.
+    """
+
+    def __init__(self, out_dir, dtype='float32', state=None, in_place=False):
+        self.out_dir = out_dir
+        self.dtype = dtype
+        self.tmp_dir = out_dir + '.tmp'
+        self.in_place = in_place
+        self.dir = out_dir if in_place else self.tmp_dir
+        self.count = 0
+        self.deleted = 0
+        self.dim = None
+        names = ['embeddings.raw', 'documents.bin', 'doc_offsets.raw', 'sq_norms.raw', 'ids.txt', 'deleted.raw']
+        names += [f'meta_{field}.raw' for field in CATEGORICAL_FIELDS + INTEGER_FIELDS]
+        names += [f'vocab_{field}.txt' for field in CATEGORICAL_FIELDS]
+        self._code_of = {field: {} for field in CATEGORICAL_FIELDS}
+
+        if state is None:
+            if os.path.exists(self.tmp_dir):
+                shutil.rmtree(self.tmp_dir)
+            os.makedirs(self.tmp_dir)
+            self._files = {name: open(os.path.join(self.tmp_dir, name), 'wb') for name in names}
+            self._files['doc_offsets.raw'].write(np.zeros(1, dtype=np.int64).tobytes())
+            self._doc_bytes = 0
+            return
+
+        # Drop whatever was appended after the checkpoint (checkpoints taken before
+        # deletions existed have no deleted.raw)
+        self.count = state['count']
+        self.dim = state['dim']
+        self.deleted = state.get('deleted', 0)
+        self._doc_bytes = state['sizes']['documents.bin']
+        for name in names:
+            with open(os.path.join(self.dir, name), 'ab') as f:
+                f.truncate(state['sizes'].get(name, 0))
+        # Fields added after the index was written read as '' / 0 for its rows
+        for field in CATEGORICAL_FIELDS + INTEGER_FIELDS:
+            if f'meta_{field}.raw' not in state['sizes']:
+                with open(os.path.join(self.dir, f'meta_{field}.raw'), 'ab') as f:
+                    f.write(np.zeros(self.count, dtype=np.int32).tobytes())
+            if field in CATEGORICAL_FIELDS and f'vocab_{field}.txt' not in state['sizes']:
+                with open(os.path.join(self.dir, f'vocab_{field}.txt'), 'ab') as f:
+                    f.write((json.dumps('') + '\n').encode('utf-8'))
+        for field in CATEGORICAL_FIELDS:
+            codes = self._code_of[field]
+            for value in _read_lines(os.path.join(self.dir, f'vocab_{field}.txt')):
+                codes[json.loads(value)] = len(codes)
+        self._files = {name: open(os.path.join(self.dir, name), 'ab') for name in names}
+
+    @classmethod
+    def resume(cls, out_dir, state):
+        return cls(out_dir, dtype=state['dtype'], state=state)
+
+    @classmethod
+    def reopen(cls, out_dir):
+        """A writer that appends to (and deletes from) the finished index in `out_dir`."""
+        with open(os.path.join(out_dir, 'index.json')) as f:
+            state = json.load(f)
+        return cls(out_dir, dtype=state['dtype'], state=state, in_place=True)
+
+    def add(self, ids, embeddings, documents, metadatas):
+        if not len(ids):
+            return
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(ids), -1)
+        if self.dim is None:
+            self.dim = int(matrix.shape[1])
+        stored = matrix.astype(self.dtype)
+        self._files['embeddings.raw'].write(stored.tobytes())
+        # Squared norms of the stored (possibly float16) vectors, for L2 distances
+        restored = stored.astype(np.float32)
+        self._files['sq_norms.raw'].write(np.einsum('ij,ij->i', restored, restored).astype(np.float32).tobytes())
+
+        # Texts as one UTF-8 blob plus offsets, sliced on demand
+        offsets = array('q')
+        for text in documents:
+            data = text.encode('utf-8')
+            self._files['documents.bin'].write(data)
+            self._doc_bytes += len(data)
+            offsets.append(self._doc_bytes)
+        self._files['doc_offsets.raw'].write(offsets.tobytes())
+
+        columns = {field: array('i') for field in CATEGORICAL_FIELDS + INTEGER_FIELDS}
+        for meta in metadatas:
+            for field in CATEGORICAL_FIELDS:
+                codes = self._code_of[field]
+                value = str(meta.get(field, ''))
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(codes)
+                    self._files[f'vocab_{field}.txt'].write((json.dumps(value) + '\n').encode('utf-8'))
+                columns[field].append(code)
+            for field in INTEGER_FIELDS:
+                columns[field].append(int(meta.get(field, 0) or 0))
+        for field, column in columns.items():
+            self._files[f'meta_{field}.raw'].write(column.tobytes())
+
+        self._files['ids.txt'].write(''.join(f'{chunk_id}\n' for chunk_id in ids).encode('utf-8'))
+        self.count += len(ids)
+
+    def delete(self, rows):
+        """Marks rows written earlier as deleted; searches skip them from then on."""
+        rows = np.asarray(rows, dtype=np.int64)
+        self._files['deleted.raw'].write(rows.tobytes())
+        self.deleted += len(rows)
+
+    def row_bytes(self):
+        # Average on-disk size of one row's vector and text
+        if not self.count:
+            return 0
+        return (self.dim or 0) * np.dtype(self.dtype).itemsize + self._doc_bytes / self.count
+
+    def checkpoint(self):
+        """Flushes everything written so far to disk and returns the state `resume()` needs."""
+        for f in self._files.values():
+            f.flush()
+            os.fsync(f.fileno())
+        return {
+            "count": self.count,
+            "deleted": self.deleted,
+            "dim": self.dim,
+            "dtype": self.dtype,
+            "sizes": {name: f.tell() for name, f in self._files.items()},
+        }
+
+    def finish(self):
+        state = self.checkpoint()
+        for f in self._files.values():
+            f.close()
+        state["version"] = NUMPY_INDEX_VERSION
+        state["dim"] = self.dim or 0
+        # index.json is the commit point: written last, and atomically
+        tmp_path = os.path.join(self.dir, 'index.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, os.path.join(self.dir, 'index.json'))
+
+        if not self.in_place:
+            if os.path.exists(self.out_dir):
+                shutil.rmtree(self.out_dir)
+            os.replace(self.tmp_dir, self.out_dir)
+        print(f"Wrote NumPy index ({self.count - self.deleted} rows x {self.dim or 0}, {self.dtype}) to {self.out_dir}")
+
+    def abort(self):
+        for f in self._files.values():
+            f.close()
+        # In place, the next reopen() truncates back to the last committed sizes
+        if not self.in_place:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+
+def _read_lines(path, limit=None):
+    # Complete lines only: a writer may be appending to the file
+    try:
+        with open(path, encoding='utf-8') as f:
+            lines = f.read().split('\n')[:-1]
+    except FileNotFoundError:
+        return []
+    return lines if limit is None else lines[:limit]
+
+
+def build_numpy_index(out_dir, ids, embeddings, documents, metadatas, dtype='float32'):
+    """Writes the chunk matrix, texts and columnar metadata for NumpyIndex in one go."""
+    writer = NumpyIndexWriter(out_dir, dtype=dtype)
+    writer.add(ids, embeddings, documents, metadatas)
+    writer.finish()
+
+
+def _rewrite(index, keep, dtype):
+    # Streams the kept rows of `index` into a new index, block by block
+    writer = NumpyIndexWriter(index.index_dir, dtype=dtype)
+    for start in range(0, len(keep), SCAN_BLOCK_ROWS):
+        rows = keep[start:start + SCAN_BLOCK_ROWS]
+        writer.add(
+            [index.ids[row] for row in rows],
+            np.asarray(index.embeddings[rows], dtype=np.float32),
+            [index.document(row) for row in rows],
+            [index.metadata(row) for row in rows],
+        )
+    return writer
+
+
+def update_numpy_index(out_dir, complaint_ids, ids, embeddings, documents, metadatas, dtype=None):
+    """Deletes every row of `complaint_ids` from an existing index and appends the given rows.
+
+    The rows to delete are found with one pass over the complaint_id column and recorded
+    in deleted.raw; the new rows are appended to the live files. Only the delta is written,
+    except that an index in the old .npy layout, or one whose deleted rows would exceed
+    COMPACT_DELETED_FRACTION, is rewritten once without them.
+    """
+    index = NumpyIndex(out_dir)
+    code_of = index._code_of['complaint_id']
+    codes = [code_of[str(cid)] for cid in complaint_ids if str(cid) in code_of]
+    stale = np.flatnonzero(np.isin(index.columns['complaint_id'], codes) & index.live)
+
+    dtype = dtype or index.dtype
+    deleted = index.count - index.live_count + len(stale)
+    if index.version != NUMPY_INDEX_VERSION or dtype != index.dtype or \
+            deleted > COMPACT_DELETED_FRACTION * (index.count + len(ids)):
+        keep = np.flatnonzero(index.live)
+        writer = _rewrite(index, keep[~np.isin(keep, stale)], dtype)
+    else:
+        writer = NumpyIndexWriter.reopen(out_dir)
+        writer.delete(stale)
+    try:
+        writer.add(ids, embeddings, documents, metadatas)
+    except BaseException:
+        writer.abort()
+        raise
+    writer.finish()
+    return len(stale)
+
+
+class NumpyIndex:
+    """Exact L2 search over a memory-mapped chunk matrix.
+
+    Distances are squared L2, the same metric as the default Chroma collection, so
+    scores are comparable between backends.
+    """
+
+    def __init__(self, index_dir):
+        self.index_dir = index_dir
+        with open(os.path.join(index_dir, 'index.json')) as f:
+            info = json.load(f)
+        self.version = info.get('version', 1)
+        self.count = info['count']
+        self.dim = info['dim']
+        self.dtype = info['dtype']
+        if self.version == NUMPY_INDEX_VERSION:
+            self._load_raw(info)
+        else:
+            self._load_npy(info)
+        # Indexes written before a field existed read it as '' / 0
+        for field in CATEGORICAL_FIELDS:
+            self.vocab.setdefault(field, [''])
+            if field not in self.columns:
+                self.columns[field] = np.zeros(self.count, dtype=np.int32)
+        for field in INTEGER_FIELDS:
+            self.columns.setdefault(field, np.zeros(self.count, dtype=np.int32))
+        self._code_of = {field: {v: i for i, v in enumerate(values)} for field, values in self.vocab.items()}
+        self._documents = np.memmap(os.path.join(index_dir, 'documents.bin'), dtype=np.uint8, mode='r') \
+            if self.doc_offsets[-1] > 0 else np.zeros(0, dtype=np.uint8)
+
+        # Rows deleted by incremental updates stay in the files but are never returned
+        self.live = np.ones(self.count, dtype=bool)
+        self.live[self._deleted] = False
+        self.live_count = int(self.live.sum())
+
+    def _raw(self, name, dtype, shape):
+        # The first `shape` rows of a raw file; later rows belong to an update in progress
+        path = os.path.join(self.index_dir, name)
+        if not np.prod(shape) or name not in self._sizes:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(path, dtype=dtype, mode='r', shape=shape)
+
+    def _load_raw(self, info):
+        self._sizes = info['sizes']
+        self.ids = _read_lines(os.path.join(self.index_dir, 'ids.txt'), self.count)
+        self.vocab = {field: [json.loads(value) for value in
+                              _read_lines(os.path.join(self.index_dir, f'vocab_{field}.txt'))]
+                      for field in CATEGORICAL_FIELDS if f'vocab_{field}.txt' in self._sizes}
+        self.embeddings = self._raw('embeddings.raw', self.dtype, (self.count, self.dim))
+        self.sq_norms = np.array(self._raw('sq_norms.raw', np.float32, (self.count,)))
+        self.doc_offsets = np.array(self._raw('doc_offsets.raw', np.int64, (self.count + 1,)))
+        self.columns = {field: np.array(self._raw(f'meta_{field}.raw', np.int32, (self.count,)))
+                        for field in CATEGORICAL_FIELDS + INTEGER_FIELDS}
+        self._deleted = np.array(self._raw('deleted.raw', np.int64, (info.get('deleted', 0),)))
+
+    def _load_npy(self, info):
+        self.ids = info['ids']
+        self.vocab = info['vocab']
+        self.embeddings = np.load(os.path.join(self.index_dir, 'embeddings.npy'), mmap_mode='r')
+        self.sq_norms = np.load(os.path.join(self.index_dir, 'sq_norms.npy'))
+        self.doc_offsets = np.load(os.path.join(self.index_dir, 'doc_offsets.npy'))
+        self.columns = {}
+        for field in CATEGORICAL_FIELDS + INTEGER_FIELDS:
+            path = os.path.join(self.index_dir, f'meta_{field}.npy')
+            if os.path.exists(path):
+                self.columns[field] = np.load(path)
+        self._deleted = np.zeros(0, dtype=np.int64)
+
+    @classmethod
+    def exists(cls, index_dir):
+        return os.path.exists(os.path.join(index_dir, 'index.json'))
+
+    # --- Row accessors ---
+
+    def document(self, row):
+        start, end = self.doc_offsets[row], self.doc_offsets[row + 1]
+        return bytes(self._documents[start:end]).decode('utf-8')
+
+    def metadata(self, row):
+        meta = {field: self.vocab[field][self.columns[field][row]] for field in CATEGORICAL_FIELDS}
+        for field in INTEGER_FIELDS:
+            meta[field] = int(self.columns[field][row])
+        return meta
+
+    # --- Search ---
+
+    def _distances(self, queries, q_sq, block, norms):
+        scores = queries @ np.asarray(block, dtype=np.float32).T
+        return q_sq[:, None] + norms[None, :] - 2.0 * scores
+
+    def search(self, query_vecs, k, mask=None, rows=None):
+        """Returns (rows, distances) arrays of shape (n_queries, <=k).
+
+        `mask` is a boolean row filter; `rows` restricts the scan to the given row ids.
+        Deleted rows are never returned.
+        """
+        queries = np.atleast_2d(np.asarray(query_vecs, dtype=np.float32))
+        q_sq = np.einsum('ij,ij->i', queries, queries)
+
+        if rows is None and mask is not None:
+            rows = np.flatnonzero(mask)
+        if rows is not None:
+            rows = np.asarray(rows, dtype=np.int64)
+            if self.live_count < self.count:
+                rows = rows[self.live[rows]]
+            if len(rows) == 0:
+                return np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0), dtype=np.float32)
+            dists = self._distances(queries, q_sq, self.embeddings[rows], self.sq_norms[rows])
+            return self._top_k(dists, k, rows)
+
+        # Full scan in blocks, keeping the running top-k of each block. Deleted rows score
+        # inf; with k capped at the live rows they never reach the final top-k
+        k = min(k, self.live_count)
+        cand_rows = []
+        cand_dists = []
+        for start in range(0, self.count if k else 0, SCAN_BLOCK_ROWS):
+            end = min(start + SCAN_BLOCK_ROWS, self.count)
+            dists = self._distances(queries, q_sq, self.embeddings[start:end], self.sq_norms[start:end])
+            if self.live_count < self.count:
+                dists[:, ~self.live[start:end]] = np.inf
+            block_rows, block_dists = self._top_k(dists, k, np.arange(start, end))
+            cand_rows.append(block_rows)
+            cand_dists.append(block_dists)
+        if not cand_rows:
+            return np.zeros((len(queries), 0), dtype=np.int64), np.zeros((len(queries), 0), dtype=np.float32)
+        all_rows = np.concatenate(cand_rows, axis=1)
+        all_dists = np.concatenate(cand_dists, axis=1)
+        order = np.argsort(all_dists, axis=1)[:, :k]
+        return np.take_along_axis(all_rows, order, axis=1), np.take_along_axis(all_dists, order, axis=1)
+
+    @staticmethod
+    def _top_k(dists, k, row_ids):
+        k = min(k, dists.shape[1])
+        if k < dists.shape[1]:
+            part = np.argpartition(dists, k - 1, axis=1)[:, :k]
+        else:
+            part = np.tile(np.arange(dists.shape[1]), (dists.shape[0], 1))
+        part_dists = np.take_along_axis(dists, part, axis=1)
+        order = np.argsort(part_dists, axis=1)
+        best = np.take_along_axis(part, order, axis=1)
+        return row_ids[best], np.take_along_axis(part_dists, order, axis=1)
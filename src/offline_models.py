@@ -0,0 +1,103 @@
+import hashlib
+import re
+
+import numpy as np
+
+# Deterministic stand-ins for the embedding model and the LLM, used by the "offline"
+# inference backend so benchmarks and local runs need no downloads. They exercise
+# the same code paths (batching, packing, streaming) at a small, stable cost; their
+# outputs carry no meaning.
+OFFLINE_EMBEDDING_DIM = 384
+OFFLINE_MAX_INPUT_TOKENS = 512
+OFFLINE_SEED = 0
+
+_WORD = re.compile(r"[a-z0-9']+")
+# Vocabulary of the stand-in tokenizer; other words map to <unk>
+_VOCAB_WORDS = (
+    "a about account after all also am an and any are as at bank be been being billing but by call called "
+    "card charge charged charges closed company complaint complaints consumer credit customer customers "
+    "did do does dispute disputed don't enough fee fees for from fund funds had has have how i if in "
+    "information interest is issue issues it late loan loans me money month my no not of on or paid "
+    "payment payments personal problem problems refund refused report reported said savings service "
+    "she since still than that the their them there they this to transfer transferred transaction "
+    "transactions unauthorized was we were what when which who why will with without would you your"
+).split()
+
+
+class HashingEmbedder:
+    """Feature-hashing sentence embedder with the SentenceTransformer `encode` interface.
+
+    Words and word bigrams are hashed (blake2b, so vectors are identical across
+    processes) into a fixed number of signed buckets, then L2-normalized. Texts that
+    share words land close together, which is enough to make retrieval non-trivial.
+    """
+
+    def __init__(self, dim=OFFLINE_EMBEDDING_DIM):
+        self.dim = dim
+
+    def get_sentence_embedding_dimension(self):
+        return self.dim
+
+    def _vector(self, text):
+        words = _WORD.findall(str(text).lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        vec = np.zeros(self.dim, dtype=np.float32)
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vec[value % self.dim] += 1.0 if (value >> 63) else -1.0
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def encode(self, texts, **kwargs):
+        if isinstance(texts, str):
+            return self._vector(texts)
+        return np.stack([self._vector(text) for text in texts]) if len(texts) else np.zeros((0, self.dim), dtype=np.float32)
+
+
+def build_offline_tokenizer():
+    from tokenizers import Tokenizer, decoders, models, normalizers, pre_tokenizers
+    from transformers import PreTrainedTokenizerFast
+
+    vocab = {"<pad>": 0, "</s>": 1, "<unk>": 2}
+    for word in _VOCAB_WORDS:
+        vocab.setdefault(word, len(vocab))
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="<unk>"))
+    tokenizer.normalizer = normalizers.Lowercase()
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.decoder = decoders.WordPiece(prefix="##")
+    return PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        pad_token="<pad>",
+        eos_token="</s>",
+        unk_token="<unk>",
+        model_max_length=OFFLINE_MAX_INPUT_TOKENS,
+    )
+
+
+def build_offline_seq2seq(seed=OFFLINE_SEED):
+    """Returns (tokenizer, model): a word-level tokenizer and a tiny seeded T5."""
+    import torch
+    from transformers import T5Config, T5ForConditionalGeneration
+
+    tokenizer = build_offline_tokenizer()
+    config = T5Config(
+        vocab_size=len(tokenizer),
+        d_model=64,
+        d_ff=128,
+        num_layers=2,
+        num_heads=2,
+        d_kv=32,
+        decoder_start_token_id=tokenizer.pad_token_id,
+        pad_token_id=tokenizer.pad_token_id,
+        eos_token_id=tokenizer.eos_token_id,
+        tie_word_embeddings=False,
+    )
+    torch.manual_seed(seed)
+    model = T5ForConditionalGeneration(config)
+    # Random weights favour whatever token wins argmax; zeroing the special-token logits
+    # makes the model emit vocabulary words for the full max_new_tokens every time
+    with torch.no_grad():
+        model.lm_head.weight[[tokenizer.pad_token_id, tokenizer.eos_token_id, tokenizer.unk_token_id]] = 0
+    model.eval()
+    return tokenizer, model
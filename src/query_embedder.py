@@ -0,0 +1,88 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from batching import EmbeddingBatcher
+
+
+def normalize_query(text):
+    # all-MiniLM-L6-v2 is uncased, so case and whitespace do not change the vector
+    return " ".join(str(text).lower().split())
+
+
+class QueryEmbedder:
+    """Memoizes query vectors by normalized text and batches concurrent misses.
+
+    Requests for a text that is already being encoded wait on the same future
+    instead of queueing a second encode.
+    """
+
+    def __init__(self, embedder, max_entries=4096, max_batch_size=32, max_wait_ms=5):
+        self.max_entries = max_entries
+        self.batcher = EmbeddingBatcher(embedder, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+
+        self._cache = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def encode(self, text):
+        key = normalize_query(text)
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return vector
+
+            future = self._pending.get(key)
+            if future is not None:
+                self.coalesced += 1
+                owner = False
+            else:
+                future = Future()
+                self._pending[key] = future
+                self.misses += 1
+                owner = True
+
+        if not owner:
+            return future.result()
+
+        try:
+            vector = self.batcher.encode(key)
+        except Exception as e:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._pending[key]
+            self._cache[key] = vector
+            while len(self._cache) > self.max_entries:
+                self._cache.popitem(last=False)
+        future.set_result(vector)
+        return vector
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def close(self):
+        self.batcher.close()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._cache),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "hit_rate": round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+                "batching": self.batcher.stats(),
+            }
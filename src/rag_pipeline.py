@@ -1,31 +1,106 @@
 import chromadb
-from sentence_transformers import SentenceTransformer
-from transformers import AutoTokenizer, AutoModelForSeq2SeqLM, pipeline
-from langchain_community.llms import HuggingFacePipeline
 from langchain_core.prompts import PromptTemplate
 import json
+import os
+import time
+from batching import GenerationBatcher, TokenQueue
+from answer_cache import AnswerCache
+from query_embedder import QueryEmbedder
+from index_version import read_index_version
+from inference_backends import load_embedder, load_seq2seq, validate_backend, estimate_model_bytes
+from model_registry import ModelHandle, ModelRegistry
+from context_packer import ContextPacker, model_input_limit
+from retrieval_backends import load_backend
+from answer_modes import AnswerModePolicy, NO_INFO_ANSWER, extract_answer, validate_mode
+from metrics import STAGE_SECONDS, REQUEST_SECONDS, TIME_TO_FIRST_TOKEN, snapshot
 
 # Configuration
-VECTOR_STORE_DIR = 'vector_store'
+VECTOR_STORE_DIR = os.getenv("VECTOR_STORE_DIR", 'vector_store')
 EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
 LLM_MODEL_NAME = "google/flan-t5-base" # Lightweight, CPU-friendly
 TOP_K = 5
-MAX_CONTEXT_LENGTH = 1000 # Character limit for context to avoid token limits
+# Retrieval backend: chroma (HNSW) | numpy (exact search over the memory-mapped matrix)
+RETRIEVAL_BACKEND = os.getenv("RETRIEVAL_BACKEND", "chroma")
+MAX_NEW_TOKENS = 200
+
+# CPU inference backends (fp32 | int8 | onnx | offline), switchable at runtime via the settings API
+LLM_BACKEND = os.getenv("LLM_BACKEND", "fp32")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "fp32")
+
+# Generation micro-batching: prompts arriving within the wait window share one generate call
+GEN_BATCH_MAX_SIZE = int(os.getenv("GEN_BATCH_MAX_SIZE", "8"))
+GEN_BATCH_MAX_WAIT_MS = float(os.getenv("GEN_BATCH_MAX_WAIT_MS", "15"))
+
+# Answer cache: exact normalized-question hits, plus optional embedding-similarity hits
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_SIMILARITY = float(os.environ["ANSWER_CACHE_SIMILARITY"]) if os.getenv("ANSWER_CACHE_SIMILARITY") else None
+
+# Query embeddings: memoized by normalized text, concurrent misses share one encode call
+QUERY_EMBED_CACHE_SIZE = int(os.getenv("QUERY_EMBED_CACHE_SIZE", "4096"))
+QUERY_EMBED_BATCH_MAX_SIZE = int(os.getenv("QUERY_EMBED_BATCH_MAX_SIZE", "32"))
+QUERY_EMBED_BATCH_MAX_WAIT_MS = float(os.getenv("QUERY_EMBED_BATCH_MAX_WAIT_MS", "5"))
+
+# Warm model pool: resident LLMs share this budget, least recently used idle models are evicted
+MODEL_POOL_MAX_MB = float(os.getenv("MODEL_POOL_MAX_MB", "4096"))
+# Comma-separated models to load in the background at startup, e.g. "google/flan-t5-small,google/flan-t5-base:int8"
+MODEL_PRELOAD = os.getenv("MODEL_PRELOAD", "")
+
+# Answer modes (auto | generative | extractive | retrieval), overridable per request.
+# The calibration file (scripts/calibrate_answer_modes.py) supplies the relevance gate
+# for auto mode; ANSWER_RELEVANCE_MAX_DISTANCE overrides it.
+ANSWER_MODE = os.getenv("ANSWER_MODE", "auto")
+ANSWER_MODE_CALIBRATION = os.getenv("ANSWER_MODE_CALIBRATION", "data/answer_mode_calibration.json")
+ANSWER_RELEVANCE_MAX_DISTANCE = float(os.environ["ANSWER_RELEVANCE_MAX_DISTANCE"]) if os.getenv("ANSWER_RELEVANCE_MAX_DISTANCE") else None
+
+
+def parse_model_specs(spec_str, default_backend=LLM_BACKEND):
+    specs = []
+    for item in spec_str.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, backend = item.partition(":")
+        specs.append((name, validate_backend(backend or default_backend)))
+    return specs
 
 class RAGPipeline:
-    def __init__(self, initial_model="google/flan-t5-base"):
-        self.active_model = initial_model
+    def __init__(self, initial_model="google/flan-t5-base", llm_backend=LLM_BACKEND, embedding_backend=EMBEDDING_BACKEND):
+        self.embedding_backend = validate_backend(embedding_backend)
+        self.query_embedder = None
+        self.load_timings = {}
         print("Initializing RAG Pipeline...")
         # 1. Load Vector Store
+        stage_start = time.perf_counter()
         self.chroma_client = chromadb.PersistentClient(path=VECTOR_STORE_DIR)
         self.collection = self.chroma_client.get_collection("complaints_rag")
+        self.retriever = load_backend(RETRIEVAL_BACKEND, self.collection, VECTOR_STORE_DIR)
+        self.index_version = read_index_version(VECTOR_STORE_DIR)
+        self.answer_cache = AnswerCache(
+            max_entries=ANSWER_CACHE_SIZE,
+            ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+            similarity_threshold=ANSWER_CACHE_SIMILARITY,
+        )
+        self.answer_modes = AnswerModePolicy.from_calibration(
+            ANSWER_MODE, ANSWER_MODE_CALIBRATION, relevance_max_distance=ANSWER_RELEVANCE_MAX_DISTANCE
+        )
+        self.load_timings["vector_store"] = time.perf_counter() - stage_start
         
         # 2. Load Embedding Model
-        print(f"Loading Embedding Model: {EMBEDDING_MODEL_NAME}...")
-        self.embedder = SentenceTransformer(EMBEDDING_MODEL_NAME)
+        stage_start = time.perf_counter()
+        self._load_embedder(self.embedding_backend)
+        self.load_timings["embedder"] = time.perf_counter() - stage_start
         
-        # 3. Load LLM
-        self._load_llm(self.active_model)
+        # 3. Load LLM into the warm pool, then preload the configured extras in the background
+        stage_start = time.perf_counter()
+        self.models = ModelRegistry(
+            self._load_llm,
+            max_bytes=MODEL_POOL_MAX_MB * 1024 ** 2,
+            on_activate=self._on_model_activated,
+        )
+        self.models.activate(initial_model, validate_backend(llm_backend), wait=True)
+        self.load_timings["llm"] = time.perf_counter() - stage_start
+        self.models.preload(parse_model_specs(MODEL_PRELOAD))
         
         # 4. Define Prompt
         template = """You are a financial analyst Assistant for CrediTrust. Use the following context to answer the question. 
@@ -38,145 +113,314 @@ Question: {question}
 
 Answer:"""
         self.prompt = PromptTemplate(template=template, input_variables=["context", "question"])
-        self.chain = self.prompt | self.llm
         print("Pipeline Initialized.")
 
-    def _load_llm(self, model_name):
-        print(f"Loading LLM: {model_name}...")
-        tokenizer = AutoTokenizer.from_pretrained(model_name)
-        model = AutoModelForSeq2SeqLM.from_pretrained(model_name)
-        self.generate_text = pipeline(
-            task="text-generation",
-            model=model,
-            tokenizer=tokenizer,
-            max_new_tokens=200,
+    def _load_embedder(self, backend):
+        print(f"Loading Embedding Model: {EMBEDDING_MODEL_NAME} ({backend})...")
+        self.embedder = load_embedder(EMBEDDING_MODEL_NAME, backend)
+        old_query_embedder = self.query_embedder
+        self.query_embedder = QueryEmbedder(
+            self.embedder,
+            max_entries=QUERY_EMBED_CACHE_SIZE,
+            max_batch_size=QUERY_EMBED_BATCH_MAX_SIZE,
+            max_wait_ms=QUERY_EMBED_BATCH_MAX_WAIT_MS,
         )
-        self.llm = HuggingFacePipeline(pipeline=self.generate_text)
+        self.embedding_backend = backend
+        if old_query_embedder is not None:
+            old_query_embedder.close()
 
-    def switch_model(self, new_model_name):
-        print(f"Switching model from {self.active_model} to {new_model_name}")
-        self._load_llm(new_model_name)
-        self.active_model = new_model_name
-        self.chain = self.prompt | self.llm
-        return self.active_model
+    def _load_llm(self, model_name, backend):
+        print(f"Loading LLM: {model_name} ({backend})...")
+        start = time.perf_counter()
+        tokenizer, model = load_seq2seq(model_name, backend)
+        batcher = GenerationBatcher(
+            model,
+            tokenizer,
+            max_new_tokens=MAX_NEW_TOKENS,
+            max_batch_size=GEN_BATCH_MAX_SIZE,
+            max_wait_ms=GEN_BATCH_MAX_WAIT_MS,
+        )
+        return ModelHandle(
+            model_name,
+            backend,
+            tokenizer,
+            model,
+            batcher,
+            packer=ContextPacker(tokenizer, model_input_limit(tokenizer, model)),
+            size_bytes=estimate_model_bytes(model),
+            load_seconds=time.perf_counter() - start,
+        )
 
-    def retrieve_context(self, question, filters=None, k=TOP_K):
-        # Embed query
-        query_vec = self.embedder.encode([question]).tolist()
-        
-        # Build filter dict
-        where_filter = {}
-        if filters:
-            # Simple equality filters for now
-            for key, val in filters.items():
-                if val:
-                    where_filter[key] = val
-                    
-        # Query Chroma
-        # Handle case where filter is empty
-        query_args = {
-            "query_embeddings": query_vec,
-            "n_results": k,
+    def _on_model_activated(self, handle):
+        # Cached answers were produced by the previous model
+        self.answer_cache.clear(reason=f"model switched to {handle.name} ({handle.backend})")
+
+    @property
+    def active_model(self):
+        return self.models.active.name
+
+    @property
+    def llm_backend(self):
+        return self.models.active.backend
+
+    def switch_model(self, new_model_name, backend=None, embedding_backend=None, wait=False):
+        backend = validate_backend(backend or self.llm_backend)
+        embedding_backend = validate_backend(embedding_backend or self.embedding_backend)
+
+        if embedding_backend != self.embedding_backend:
+            print(f"Switching embedding backend from {self.embedding_backend} to {embedding_backend}")
+            self._load_embedder(embedding_backend)
+            self.answer_cache.clear(reason=f"embedding backend switched to {embedding_backend}")
+
+        # Resident models switch immediately; others load in the background and
+        # become active once ready. In-flight requests keep the model they acquired.
+        return self.models.activate(new_model_name, backend, wait=wait)
+
+    def details(self):
+        # Cold-start cost per stage, reported by the API readiness endpoint
+        return {
+            "load_seconds": {stage: round(secs, 3) for stage, secs in self.load_timings.items()},
+            "active_model": self.active_model,
         }
-        if where_filter:
-            query_args["where"] = where_filter
-            
-        results = self.collection.query(**query_args)
-        
-        # Format results
-        docs = []
-        if results['documents']:
-            for i, doc_text in enumerate(results['documents'][0]):
-                meta = results['metadatas'][0][i]
-                docs.append({
-                    "text": doc_text,
-                    "metadata": meta,
-                    "score": results['distances'][0][i] if results['distances'] else 0
-                })
-        return docs
-
-    def format_context(self, retrieved_docs):
-        context_str = ""
-        for doc in retrieved_docs:
-            # Clean newlines to save space
-            clean_text = doc['text'].replace("\n", " ")
-            entry = f"- [Product: {doc['metadata']['product']}] {clean_text}\n"
-            if len(context_str) + len(entry) < MAX_CONTEXT_LENGTH:
-                context_str += entry
-            else:
-                break
+
+    def get_runtime_stats(self):
+        return {
+            "active_model": self.active_model,
+            "llm_backend": self.llm_backend,
+            "embedding_backend": self.embedding_backend,
+            "retrieval": self.retriever.stats(),
+            "batching": self.models.active.batcher.stats(),
+            "context_packing": self.models.active.packer.stats(),
+            "model_pool": self.models.stats(),
+            "answer_cache": self.answer_cache.stats(),
+            "query_embeddings": self.query_embedder.stats(),
+            "answer_modes": self.answer_modes.stats(),
+        }
+
+    def collect_metrics(self):
+        # Scrape-time view of the counters the components already keep
+        cache = self.answer_cache.stats()
+        embeddings = self.query_embedder.stats()
+        handle = self.models.active
+        packing = handle.packer.stats()
+        batchers = [("generation", handle.batcher.stats()), ("query_embedding", embeddings["batching"])]
+        pool = self.models.stats()
+        metrics = [
+            snapshot("rag_answer_cache_lookups_total", "Answer cache lookups by result", "counter",
+                     [(("hit",), cache["hits"]), (("semantic_hit",), cache["semantic_hits"]), (("miss",), cache["misses"])], ["result"]),
+            snapshot("rag_answer_cache_entries", "Answers held in the answer cache", "gauge", [((), cache["entries"])]),
+            snapshot("rag_query_embedding_lookups_total", "Query embedding cache lookups by result", "counter",
+                     [(("hit",), embeddings["hits"]), (("coalesced",), embeddings["coalesced"]), (("miss",), embeddings["misses"])], ["result"]),
+            snapshot("rag_token_count_cache_lookups_total", "Context packer token-count cache lookups by result", "counter",
+                     [(("hit",), packing["cache_hits"]), (("miss",), packing["cache_misses"])], ["result"]),
+            snapshot("rag_batcher_queue_depth", "Requests waiting for a micro-batch", "gauge",
+                     [((name,), stats["queue_depth"]) for name, stats in batchers], ["batcher"]),
+            snapshot("rag_batcher_batches_total", "Micro-batches run", "counter",
+                     [((name,), stats["batches"]) for name, stats in batchers], ["batcher"]),
+            snapshot("rag_batcher_requests_total", "Requests served by micro-batches", "counter",
+                     [((name,), stats["requests"]) for name, stats in batchers], ["batcher"]),
+            snapshot("rag_batcher_avg_occupancy", "Average batch size relative to the maximum", "gauge",
+                     [((name,), stats["avg_occupancy"]) for name, stats in batchers], ["batcher"]),
+            snapshot("rag_model_pool_resident_bytes", "Estimated bytes of resident LLMs", "gauge",
+                     [((), pool["resident_mb"] * 1024 ** 2)]),
+            snapshot("rag_model_pool_models", "LLMs by pool state", "gauge",
+                     [(("resident",), len(pool["resident"])), (("loading",), len(pool["loading"]))], ["state"]),
+        ]
+        paths = self.retriever.stats().get("queries_by_path")
+        if paths:
+            metrics.append(snapshot("rag_retrieval_queries_total", "Retrieval queries by search path", "counter",
+                                    [((path,), count) for path, count in paths.items()], ["path"]))
+        return metrics
+
+    def _check_index_version(self):
+        # The embedding pipeline bumps the marker whenever complaints_rag is rebuilt
+        version = read_index_version(VECTOR_STORE_DIR)
+        if version != self.index_version:
+            self.collection = self.chroma_client.get_collection("complaints_rag")
+            self.retriever = load_backend(RETRIEVAL_BACKEND, self.collection, VECTOR_STORE_DIR)
+            self.index_version = version
+            self.answer_cache.clear(reason="complaints_rag collection rebuilt")
+
+    def embed_query(self, question):
+        with STAGE_SECONDS.time(stage="embed"):
+            return self.query_embedder.encode(question)
+
+    def retrieve_context(self, question, filters=None, k=TOP_K, query_vec=None):
+        # Embed query
+        if query_vec is None:
+            query_vec = self.embed_query(question)
+        with STAGE_SECONDS.time(stage="search"):
+            return self.retriever.query([query_vec], k, filters)[0]
+
+    def retrieve_context_batch(self, questions, filters=None, k=TOP_K):
+        # Several questions share one search call (one matrix product on the numpy backend)
+        query_vecs = [self.embed_query(q) for q in questions]
+        return self.retriever.query(query_vecs, k, filters)
+
+    def format_context(self, retrieved_docs, question="", handle=None):
+        # Budget is the model's real input window minus the prompt template and question,
+        # measured in its own tokenizer's tokens
+        handle = handle or self.models.active
+        with STAGE_SECONDS.time(stage="format_context"):
+            reserved = handle.packer.count_tokens(self.prompt.format(context="", question=question)) + 1
+            context_str, _ = handle.packer.pack(retrieved_docs, reserved_tokens=reserved)
         return context_str if context_str else "No relevant complaints found."
 
-    def answer_question(self, question, filters=None):
+    def _lookup_cache(self, question, filters):
+        # Exact hits skip the embedding entirely; semantic hits need the query vector
+        self._check_index_version()
+        semantic = self.answer_cache.similarity_threshold is not None
+        with STAGE_SECONDS.time(stage="cache_lookup"):
+            # With semantic lookups enabled, an exact miss is only counted by the second get
+            cached = self.answer_cache.get(question, filters, self.active_model, count_miss=not semantic)
+        query_vec = None
+        if cached is None and semantic:
+            query_vec = self.embed_query(question)
+            with STAGE_SECONDS.time(stage="cache_lookup"):
+                cached = self.answer_cache.get(question, filters, self.active_model, embedding=query_vec)
+        return cached, query_vec
+
+    def _format_sources(self, docs):
+        return [
+            {
+                "text": doc['text'], # React UI expects 'text'
+                "product": doc['metadata']['product'],
+                "company": doc['metadata']['company'],
+                "complaint_id": doc['metadata']['complaint_id'],
+                "duplicate_count": int(doc['metadata'].get('duplicate_count') or 0)
+            } for doc in docs
+        ]
+
+    def _start_request(self, question, filters, mode):
+        # Only generated answers are cached, so only modes that may generate consult the cache
+        mode = validate_mode(mode or self.answer_modes.default_mode)
+        if mode in ("auto", "generative"):
+            cached, query_vec = self._lookup_cache(question, filters)
+        else:
+            self._check_index_version()
+            cached, query_vec = None, None
+        return mode, cached, query_vec
+
+    def _record_request(self, endpoint, mode, start):
+        seconds = time.perf_counter() - start
+        self.answer_modes.latency.record(mode, seconds)
+        REQUEST_SECONDS.observe(seconds, endpoint=endpoint, mode=mode)
+
+    def _fast_answer(self, answer_mode, question, docs):
+        # Answers for the modes that skip the LLM
+        if answer_mode == "retrieval":
+            return ""
+        if answer_mode == "extractive":
+            return extract_answer(question, docs) or NO_INFO_ANSWER
+        return NO_INFO_ANSWER
+
+    def answer_question(self, question, filters=None, mode=None, latency_budget_ms=None):
+        start = time.perf_counter()
+        # 0. Cache
+        mode, cached, query_vec = self._start_request(question, filters, mode)
+        if cached is not None:
+            self._record_request("ask", "cached", start)
+            return dict(cached, question=question)
+
         # 1. Retrieve
         print(f"Retrieving for: {question}...")
-        docs = self.retrieve_context(question, filters)
-        
-        # 2. Format Context
-        context = self.format_context(docs)
-        
-        # 3. Generate
-        # If no docs found, fallback immediately? 
-        # But 'No relevant complaints found' is in context, so LLM should handle it via prompt instructions.
-        print("Generating Answer...")
-        response = self.chain.invoke({"context": context, "question": question})
-        
-        # 4. Structure Output
+        docs = self.retrieve_context(question, filters, query_vec=query_vec)
+
+        # 2. Pick how to answer from the retrieval scores and what is left of the budget
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        answer_mode = self.answer_modes.choose(mode, docs, elapsed_ms, latency_budget_ms)
+
+        if answer_mode == "generative":
+            # Generation runs on the model that is active when it starts
+            handle = self.models.acquire()
+            try:
+                # 3. Format Context
+                context = self.format_context(docs, question, handle)
+
+                # 4. Generate
+                # Concurrent callers are batched into a single generate call by the batcher.
+                print("Generating Answer...")
+                prompt = self.prompt.format(context=context, question=question)
+                with STAGE_SECONDS.time(stage="generate"):
+                    answer = handle.batcher.generate(prompt).strip()
+            finally:
+                self.models.release(handle)
+        else:
+            answer = self._fast_answer(answer_mode, question, docs)
+
+        # 5. Structure Output
         result = {
             "question": question,
-            "answer": response.strip(),
-            "sources": [
-                {
-                    "text": doc['text'], # React UI expects 'text'
-                    "product": doc['metadata']['product'],
-                    "company": doc['metadata']['company'],
-                    "complaint_id": doc['metadata']['complaint_id']
-                } for doc in docs
-            ]
+            "answer": answer,
+            "sources": self._format_sources(docs),
+            "mode": answer_mode,
         }
+        self._record_request("ask", answer_mode, start)
+        if answer_mode == "generative":
+            self.answer_cache.put(question, result, filters, handle.name, embedding=query_vec)
         return result
 
-    def answer_question_stream(self, question, filters=None):
-        from transformers import TextIteratorStreamer
-        from threading import Thread
-        
+    def answer_question_stream(self, question, filters=None, sink=None, mode=None, latency_budget_ms=None):
+        # Tokens are written to `sink` (see batching.TokenQueue / streaming.AsyncTokenStream).
+        # Without one, a blocking iterator over the tokens is returned.
+        start = time.perf_counter()
+        iterate = sink is None
+        if sink is None:
+            sink = TokenQueue()
+
+        # 0. Cache: replay the cached answer as a single chunk
+        mode, cached, query_vec = self._start_request(question, filters, mode)
+        if cached is not None:
+            TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - start)
+            sink.put(cached["answer"])
+            sink.close()
+            self._record_request("stream", "cached", start)
+            return (iter(sink) if iterate else sink), cached["sources"]
+
         # 1. Retrieve
         print(f"Retrieving for stream: {question}...")
-        docs = self.retrieve_context(question, filters)
-        
-        # 2. Format Context
-        context = self.format_context(docs)
-        
-        # 3. Generate Prompt
-        prompt = self.prompt.format(context=context, question=question)
-        
-        # 4. Streamer setup
-        streamer = TextIteratorStreamer(self.generate_text.tokenizer, skip_prompt=True, skip_special_tokens=True)
-        inputs = self.generate_text.tokenizer([prompt], return_tensors="pt")
-        
-        # Ensure model is on correct device if applicable
-        if hasattr(self.generate_text.model, 'device'):
-            inputs = {k: v.to(self.generate_text.model.device) for k, v in inputs.items()}
+        docs = self.retrieve_context(question, filters, query_vec=query_vec)
+        sources = self._format_sources(docs)
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        answer_mode = self.answer_modes.choose(mode, docs, elapsed_ms, latency_budget_ms)
+        if answer_mode != "generative":
+            # Non-generative answers are complete at once and go out as a single chunk
+            answer = self._fast_answer(answer_mode, question, docs)
+            if answer:
+                TIME_TO_FIRST_TOKEN.observe(time.perf_counter() - start)
+                sink.put(answer)
+            sink.close()
+            self._record_request("stream", answer_mode, start)
+            return (iter(sink) if iterate else sink), sources
+
+        # Held until generation finishes or is cancelled
+        handle = self.models.acquire()
+        try:
+            # 2. Format Context
+            context = self.format_context(docs, question, handle)
             
-        generation_kwargs = dict(inputs, streamer=streamer, max_new_tokens=200)
-        
-        thread = Thread(target=self.generate_text.model.generate, kwargs=generation_kwargs)
-        thread.start()
-        
-        sources = [
-            {
-                "text": doc['text'],
-                "product": doc['metadata']['product'],
-                "company": doc['metadata']['company'],
-                "complaint_id": doc['metadata']['complaint_id']
-            } for doc in docs
-        ]
+            # 3. Generate Prompt
+            prompt = self.prompt.format(context=context, question=question)
+            
+            # 4. Stream through the batcher so streaming requests share generate calls too
+            generate_start = time.perf_counter()
+            future = handle.batcher.stream_to(prompt, sink, started=start)
+        except Exception:
+            self.models.release(handle)
+            raise
         
-        def token_generator():
-            for text in streamer:
-                yield text
-                
-        return token_generator(), sources
+        def on_done(f):
+            self.models.release(handle)
+            # Only complete answers are cached and timed
+            if f.exception() is None and not sink.cancelled.is_set():
+                STAGE_SECONDS.observe(time.perf_counter() - generate_start, stage="generate")
+                self._record_request("stream", "generative", start)
+                result = {"question": question, "answer": f.result(), "sources": sources, "mode": "generative"}
+                self.answer_cache.put(question, result, filters, handle.name, embedding=query_vec)
+
+        future.add_done_callback(on_done)
+        return (iter(sink) if iterate else sink), sources
 
 # Simple CLI test
 if __name__ == "__main__":
@@ -0,0 +1,159 @@
+import threading
+
+from numpy_index import NumpyIndex, numpy_index_dir
+from metadata_index import MetadataIndex, EXACT_SEARCH_MAX_CANDIDATES, parse_day, split_filters
+
+# chroma: HNSW search in the persisted Chroma collection
+# numpy: exact search over the memory-mapped matrix written alongside it at index time
+RETRIEVAL_BACKENDS = ("chroma", "numpy")
+# HNSW results fetched per requested result when they still have to be post-filtered
+ANN_OVERFETCH = 4
+
+
+def chroma_where(filters):
+    # Equality and IN on the categorical fields. Dates are strings in the collection,
+    # which Chroma cannot range-compare, so date filters are applied after the query.
+    # Folded duplicates' ids are only matched through a MetadataIndex (see ChromaBackend.query).
+    values, _, _ = split_filters(filters)
+    clauses = [{key: vals[0]} if len(vals) == 1 else {key: {"$in": vals}} for key, vals in values.items()]
+    if not clauses:
+        return None
+    # Chroma needs an explicit $and when more than one field is filtered
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def _date_matches(meta, date_from, date_to):
+    # The chunk's own date, or one of its folded duplicates' (see dedup.py)
+    dates = [meta.get('date_received', '')] + str(meta.get('duplicate_dates') or '').split(',')
+    for date in dates:
+        try:
+            day = parse_day(date)
+        except ValueError:
+            continue
+        if (date_from is None or day >= date_from) and (date_to is None or day <= date_to):
+            return True
+    return False
+
+
+def index_docs(index, rows, dists):
+    return [
+        {
+            "id": index.ids[row],
+            "text": index.document(row),
+            "metadata": index.metadata(row),
+            "score": float(dist),
+        }
+        for row, dist in zip(rows, dists)
+    ]
+
+
+class ChromaBackend:
+    """HNSW search in Chroma, with metadata pre-filtering when a MetadataIndex is available.
+
+    Filters are first resolved to candidate rows. Small candidate sets skip HNSW and are
+    searched exactly; large ones go through HNSW with a `where` clause (and an over-fetch
+    plus post-filter for date ranges), falling back to the exact path if post-filtering
+    leaves fewer than k results.
+    """
+    name = "chroma"
+
+    def __init__(self, collection, metadata_index=None):
+        self.collection = collection
+        self.metadata_index = metadata_index
+        self._lock = threading.Lock()
+        self._counts = {"unfiltered": 0, "exact": 0, "ann": 0, "ann_fallback_exact": 0}
+
+    def _count(self, path, n=1):
+        with self._lock:
+            self._counts[path] += n
+
+    def _ann(self, query_vecs, n_results, filters):
+        query_args = {
+            "query_embeddings": [list(map(float, vec)) for vec in query_vecs],
+            "n_results": n_results,
+        }
+        where = chroma_where(filters)
+        if where:
+            query_args["where"] = where
+
+        results = self.collection.query(**query_args)
+
+        all_docs = []
+        for q in range(len(query_vecs)):
+            docs = []
+            if results['documents']:
+                for i, doc_text in enumerate(results['documents'][q]):
+                    docs.append({
+                        "id": results['ids'][q][i],
+                        "text": doc_text,
+                        "metadata": results['metadatas'][q][i],
+                        "score": results['distances'][q][i] if results['distances'] else 0
+                    })
+            all_docs.append(docs)
+        return all_docs
+
+    def query(self, query_vecs, k, filters=None):
+        values, date_from, date_to = split_filters(filters)
+        has_dates = date_from is not None or date_to is not None
+
+        rows = self.metadata_index.resolve(filters) if self.metadata_index is not None else None
+        if rows is None and not has_dates:
+            self._count("unfiltered" if not filters else "ann", len(query_vecs))
+            return self._ann(query_vecs, k, filters)
+
+        # A complaint_id `where` in Chroma misses representatives of folded duplicates
+        if rows is not None and (len(rows) <= EXACT_SEARCH_MAX_CANDIDATES or 'complaint_id' in values):
+            self._count("exact", len(query_vecs))
+            return self._exact(query_vecs, k, rows)
+
+        self._count("ann", len(query_vecs))
+        if not has_dates:
+            return self._ann(query_vecs, k, filters)
+
+        all_docs = []
+        for vec, docs in zip(query_vecs, self._ann(query_vecs, k * ANN_OVERFETCH, filters)):
+            docs = [doc for doc in docs if _date_matches(doc['metadata'], date_from, date_to)][:k]
+            if len(docs) < k and rows is not None and len(rows) >= k:
+                self._count("ann_fallback_exact")
+                docs = self._exact([vec], k, rows)[0]
+            all_docs.append(docs)
+        return all_docs
+
+    def _exact(self, query_vecs, k, rows):
+        index = self.metadata_index.index
+        found, dists = index.search(query_vecs, k, rows=rows)
+        return [index_docs(index, r, d) for r, d in zip(found, dists)]
+
+    def stats(self):
+        with self._lock:
+            return {"name": self.name, "metadata_index": self.metadata_index is not None, "queries_by_path": dict(self._counts)}
+
+
+class NumpyBackend:
+    name = "numpy"
+
+    def __init__(self, index, metadata_index=None):
+        self.index = index
+        self.metadata_index = metadata_index or MetadataIndex(index)
+
+    def query(self, query_vecs, k, filters=None):
+        # Always exact; filters only narrow the rows that are scored
+        rows, dists = self.index.search(query_vecs, k, rows=self.metadata_index.resolve(filters))
+        return [index_docs(self.index, r, d) for r, d in zip(rows, dists)]
+
+    def stats(self):
+        return {"name": self.name, "metadata_index": True, "chunks": self.index.live_count}
+
+
+def load_backend(name, collection, store_dir):
+    if name not in RETRIEVAL_BACKENDS:
+        raise ValueError(f"Unknown retrieval backend '{name}'. Choose one of: {', '.join(RETRIEVAL_BACKENDS)}")
+    index_dir = numpy_index_dir(store_dir)
+    if not NumpyIndex.exists(index_dir):
+        print(f"Warning: no NumPy index at {index_dir}; filters go straight to Chroma. Re-run the embedding pipeline to build it.")
+        return ChromaBackend(collection)
+    index = NumpyIndex(index_dir)
+    metadata_index = MetadataIndex(index)
+    if name == "numpy":
+        return NumpyBackend(index, metadata_index)
+    return ChromaBackend(collection, metadata_index)
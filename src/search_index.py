@@ -0,0 +1,267 @@
+import argparse
+import json
+import os
+import re
+import sqlite3
+import time
+from contextlib import closing
+
+import pandas as pd
+
+from data_lake import COMPLAINTS_LAKE, changed_months, iter_lake, lake_exists, load_lake_info, load_month_checksums
+
+# Full-text search over complaints: a SQLite database holding the fields search returns, an
+# FTS5 index over narrative, company and complaint id (external content, so each text is
+# stored once) and B-tree indexes for the product filter and date order. A query reads the
+# postings of its words and one page of rows; totals are counted inside SQLite.
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", 'data/search_index.db')
+SEARCH_INDEX_VERSION = 2
+SEARCH_CHUNK_ROWS = int(os.getenv("SEARCH_INDEX_CHUNK_ROWS", "100000"))
+SORT_ORDERS = ('relevance', 'date')
+
+# Raw column -> index column
+INDEX_COLUMNS = {
+    'Complaint ID': 'complaint_id',
+    'Product': 'product',
+    'Issue': 'issue',
+    'Company': 'company',
+    'State': 'state',
+    'Date received': 'date',
+    'Consumer complaint narrative': 'narrative',
+}
+SOURCE_DTYPES = {
+    'Complaint ID': 'Int64',
+    'Product': 'category',
+    'Issue': 'category',
+    'Company': 'category',
+    'State': 'category',
+    'Date received': 'object',
+    'Consumer complaint narrative': 'object',
+}
+RESULT_COLUMNS = ['complaint_id', 'product', 'issue', 'company', 'state', 'date', 'narrative']
+
+_SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE complaints (
+    complaint_id INTEGER, product TEXT, issue TEXT, company TEXT, state TEXT,
+    date TEXT, month TEXT, narrative TEXT
+);
+CREATE VIRTUAL TABLE complaints_fts USING fts5(
+    narrative, company, complaint_id, content='complaints', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TABLE product_counts (product TEXT, complaints INTEGER);
+"""
+# Created after the bulk load of a build, which fills the FTS index in one 'rebuild' pass
+_INDEXES = """
+INSERT INTO complaints_fts (complaints_fts) VALUES ('rebuild');
+CREATE INDEX complaints_date ON complaints (date DESC, complaint_id DESC);
+CREATE INDEX complaints_product_date ON complaints (product, date DESC, complaint_id DESC);
+CREATE INDEX complaints_month ON complaints (month);
+CREATE TRIGGER complaints_insert AFTER INSERT ON complaints BEGIN
+    INSERT INTO complaints_fts (rowid, narrative, company, complaint_id)
+    VALUES (new.rowid, new.narrative, new.company, new.complaint_id);
+END;
+CREATE TRIGGER complaints_delete AFTER DELETE ON complaints BEGIN
+    INSERT INTO complaints_fts (complaints_fts, rowid, narrative, company, complaint_id)
+    VALUES ('delete', old.rowid, old.narrative, old.company, old.complaint_id);
+END;
+"""
+_DATE_ORDER = "c.date DESC, c.complaint_id DESC"
+
+_WORD = re.compile(r'\w+')
+# Complaint ids are shown as "CFPB-<id>"
+_ID_PREFIX = re.compile(r'^\s*cfpb-', re.IGNORECASE)
+
+
+def match_expression(query):
+    """The FTS5 query for a search box string, or None if it has no words.
+
+    The words must appear as a phrase and the last one may be a prefix, so "late fe"
+    matches "late fees" (matches start at word boundaries).
+    """
+    words = _WORD.findall(_ID_PREFIX.sub('', query).lower())
+    if not words:
+        return None
+    return '"' + ' '.join(words) + '"*'
+
+
+def _column(frame, name):
+    return frame[name] if name in frame.columns else pd.Series(None, index=frame.index, dtype=object)
+
+
+def _rows(frame):
+    # Index rows of a chunk of raw complaints, with None for missing values
+    dates = pd.to_datetime(_column(frame, 'Date received'), errors='coerce')
+    values = {name: _column(frame, column) for column, name in INDEX_COLUMNS.items()}
+    values['date'] = dates.dt.strftime('%Y-%m-%d')
+    values['month'] = dates.dt.strftime('%Y-%m')
+    columns = []
+    for name in ['complaint_id', 'product', 'issue', 'company', 'state', 'date', 'month', 'narrative']:
+        series = values[name].astype(object)
+        columns.append(series.where(series.notna(), None).tolist())
+    return zip(*columns)
+
+
+def _insert(db, frames):
+    for frame in frames:
+        db.executemany("INSERT INTO complaints VALUES (?, ?, ?, ?, ?, ?, ?, ?)", _rows(frame))
+
+
+class SearchIndex:
+    """Search over the complaints index database at `path`."""
+
+    def __init__(self, path=SEARCH_INDEX_PATH):
+        self.path = path
+
+    def _connect(self, path=None):
+        db = sqlite3.connect(path or self.path, timeout=30)
+        db.row_factory = sqlite3.Row
+        return db
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def state(self):
+        """What the index was built from (source, checksums, rows), or None if there is no usable index."""
+        if not self.exists():
+            return None
+        try:
+            with closing(self._connect()) as db:
+                row = db.execute("SELECT value FROM meta WHERE key = 'state'").fetchone()
+        except sqlite3.DatabaseError:
+            return None
+        state = json.loads(row['value']) if row else None
+        return state if state and state.get("version") == SEARCH_INDEX_VERSION else None
+
+    def _finish(self, db, source, checksums):
+        db.execute("DELETE FROM product_counts")
+        db.execute("INSERT INTO product_counts SELECT product, count(*) FROM complaints GROUP BY product")
+        rows = db.execute("SELECT coalesce(sum(complaints), 0) FROM product_counts").fetchone()[0]
+        state = {"version": SEARCH_INDEX_VERSION, "source": source, "checksums": checksums, "rows": rows}
+        db.execute("INSERT OR REPLACE INTO meta VALUES ('state', ?)", (json.dumps(state),))
+        db.commit()
+
+    def _build(self, frames, source, checksums):
+        # Built next to the live index and swapped in, so searches never see a partial index
+        tmp_path = self.path + '.tmp'
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        with closing(self._connect(tmp_path)) as db:
+            db.executescript(_SCHEMA)
+            _insert(db, frames)
+            db.executescript(_INDEXES)
+            self._finish(db, source, checksums)
+        os.replace(tmp_path, self.path)
+
+    def _update(self, months, frames, source, checksums):
+        # One transaction: the triggers keep the FTS index in step with the deletes and inserts
+        with closing(self._connect()) as db:
+            if months:
+                # '' is the complaints without a date, stored with a NULL month
+                dated = [m for m in months if m]
+                where = f"month IN ({', '.join('?' * len(dated))})"
+                if '' in months:
+                    where += " OR month IS NULL"
+                db.execute(f"DELETE FROM complaints WHERE {where}", dated)
+            _insert(db, frames)
+            self._finish(db, source, checksums)
+
+    def refresh(self, data_path, lake_dir=None, rebuild=False):
+        """Brings the index up to date with the lake (if built) or the CSV; True if it changed.
+
+        Works like StatsCube.refresh: on a lake indexed before, only months whose content
+        checksum changed are deleted and indexed again; anything else, or `rebuild`, indexes
+        everything again.
+        """
+        state = None if rebuild else self.state()
+        previous = state["source"] if state else None
+        if lake_dir is not None and lake_exists(lake_dir):
+            info = load_lake_info(lake_dir)
+            source = {"lake": os.path.abspath(lake_dir), "created": info["created"]}
+            if source == previous:
+                return False
+            checksums = load_month_checksums(lake_dir, info)
+            columns = [c for c in INDEX_COLUMNS if c in info["columns"]]
+            if previous is not None and previous.get("lake") == source["lake"]:
+                months = changed_months(checksums, state["checksums"])
+                print(f"Updating search index from {lake_dir} ({len(months)} months)...")
+                current = [m for m in months if m in checksums]
+                frames = iter_lake(lake_dir, columns=columns, months=current) if current else []
+                self._update(months, frames, source, checksums)
+                return True
+            print(f"Building search index from {lake_dir}...")
+            frames = iter_lake(lake_dir, columns=columns)
+        else:
+            if not os.path.exists(data_path):
+                return False
+            stat = os.stat(data_path)
+            source = {"csv": os.path.abspath(data_path), "size": stat.st_size, "mtime": int(stat.st_mtime)}
+            if source == previous:
+                return False
+            print(f"Building search index from {data_path}...")
+            checksums = {}
+            frames = pd.read_csv(data_path, usecols=lambda c: c in SOURCE_DTYPES, dtype=SOURCE_DTYPES,
+                                 chunksize=SEARCH_CHUNK_ROWS)
+        self._build(frames, source, checksums)
+        return True
+
+    def search(self, query=None, product=None, sort=None, page=1, limit=50):
+        """(total, rows) for one page of complaints matching `query` (see match_expression).
+
+        `sort` is "relevance" (BM25, the default with a query) or "date" (newest first, the
+        default and only order without one). Rows are dicts of RESULT_COLUMNS.
+        """
+        sort = sort or ('relevance' if query else 'date')
+        if sort not in SORT_ORDERS:
+            raise ValueError(f"Unknown sort '{sort}'; expected one of: {', '.join(SORT_ORDERS)}")
+        offset = max(page - 1, 0) * limit
+        fields = ', '.join(f"c.{name}" for name in RESULT_COLUMNS)
+
+        with closing(self._connect()) as db:
+            if query:
+                match = match_expression(query)
+                if match is None:
+                    return 0, []
+                source = "complaints_fts JOIN complaints c ON c.rowid = complaints_fts.rowid"
+                where, params = "complaints_fts MATCH ?", [match]
+                if product:
+                    where += " AND c.product = ?"
+                    params.append(product)
+                    total = db.execute(f"SELECT count(*) FROM {source} WHERE {where}", params).fetchone()[0]
+                else:
+                    total = db.execute("SELECT count(*) FROM complaints_fts WHERE complaints_fts MATCH ?",
+                                       params).fetchone()[0]
+                order = "complaints_fts.rank" if sort == 'relevance' else _DATE_ORDER
+            else:
+                source, where, params = "complaints c", "1", []
+                if product:
+                    where, params = "c.product = ?", [product]
+                    total = db.execute("SELECT coalesce(sum(complaints), 0) FROM product_counts WHERE product = ?",
+                                       params).fetchone()[0]
+                else:
+                    total = db.execute("SELECT coalesce(sum(complaints), 0) FROM product_counts").fetchone()[0]
+                order = _DATE_ORDER
+            if offset >= total:
+                return total, []
+            rows = db.execute(f"SELECT {fields} FROM {source} WHERE {where} ORDER BY {order} LIMIT ? OFFSET ?",
+                              params + [limit, offset]).fetchall()
+        return total, [dict(row) for row in rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or update the complaint search index.")
+    parser.add_argument("--input", default='data/raw/complaints.csv', help="Complaints CSV (used without a lake)")
+    parser.add_argument("--lake", default=COMPLAINTS_LAKE, help="Complaints lake, used when it exists")
+    parser.add_argument("--output", default=SEARCH_INDEX_PATH, help="Index database")
+    parser.add_argument("--rebuild", action="store_true", help="Index everything again")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    index = SearchIndex(args.output)
+    if index.refresh(args.input, args.lake, rebuild=args.rebuild):
+        print(f"✅ {index.state()['rows']} complaints indexed in {args.output} in {time.perf_counter() - start:.1f}s")
+    elif index.state() is None:
+        print(f"❌ Neither {args.lake} nor {args.input} exists")
+    else:
+        print(f"✅ {args.output} is up to date")
@@ -0,0 +1,186 @@
+import math
+
+import numpy as np
+
+# Mergeable streaming summaries of numeric columns (e.g. narrative lengths). Each holds a
+# fixed amount of state however many values it has seen, is fed whole arrays at a time,
+# and two summaries of different chunks or processes combine with `merge`.
+TDIGEST_COMPRESSION = 200
+
+
+class FixedHistogram:
+    """Counts per equal-width bin over [lo, hi), plus underflow and overflow counts."""
+
+    def __init__(self, lo, hi, bins):
+        self.edges = np.linspace(lo, hi, bins + 1)
+        # counts[0] is below lo, counts[-1] at or above hi
+        self.counts = np.zeros(bins + 2, dtype=np.int64)
+
+    @property
+    def bin_counts(self):
+        return self.counts[1:-1]
+
+    def add(self, values):
+        slots = np.searchsorted(self.edges, np.asarray(values, dtype=np.float64), side='right')
+        self.counts += np.bincount(slots, minlength=len(self.counts))
+
+    def merge(self, other):
+        if not np.array_equal(self.edges, other.edges):
+            raise ValueError("Cannot merge histograms with different bins")
+        self.counts += other.counts
+
+    def to_dict(self):
+        return {"lo": float(self.edges[0]), "hi": float(self.edges[-1]), "bins": len(self.edges) - 1,
+                "counts": self.counts.tolist()}
+
+    @classmethod
+    def from_dict(cls, state):
+        histogram = cls(state["lo"], state["hi"], state["bins"])
+        histogram.counts = np.asarray(state["counts"], dtype=np.int64)
+        return histogram
+
+
+class TDigest:
+    """Quantile sketch: a merging t-digest with the k1 (arcsine) scale function.
+
+    Values are kept as at most ~compression/2 weighted centroids, small near the tails and
+    larger around the median, so extreme quantiles stay accurate. Batches are merged into
+    the centroids with sorting and bincount rather than one value at a time.
+    """
+
+    def __init__(self, compression=TDIGEST_COMPRESSION):
+        self.compression = compression
+        self.means = np.zeros(0)
+        self.weights = np.zeros(0)
+        self.min = math.inf
+        self.max = -math.inf
+
+    @property
+    def count(self):
+        return float(self.weights.sum())
+
+    def add(self, values, weights=None):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not len(values):
+            return
+        weights = np.ones(len(values)) if weights is None else np.asarray(weights, dtype=np.float64)
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self._compress(np.concatenate([self.means, values]), np.concatenate([self.weights, weights]))
+
+    def merge(self, other):
+        if len(other.means):
+            self.add(other.means, other.weights)
+            self.min = min(self.min, other.min)
+            self.max = max(self.max, other.max)
+
+    def _compress(self, means, weights):
+        order = np.argsort(means, kind='stable')
+        means, weights = means[order], weights[order]
+        # Points whose left edge falls in the same unit of k = d/(2 pi) * asin(2q - 1)
+        # become one centroid
+        q_left = (np.cumsum(weights) - weights) / weights.sum()
+        k = np.floor(self.compression / (2 * math.pi) * np.arcsin(np.clip(2 * q_left - 1, -1, 1)))
+        _, group = np.unique(k, return_inverse=True)
+        self.weights = np.bincount(group, weights=weights)
+        self.means = np.bincount(group, weights=weights * means) / self.weights
+
+    def quantile(self, q):
+        if not len(self.means):
+            return math.nan
+        # Interpolates between centroid centres, anchored at the exact min and max
+        centres = np.cumsum(self.weights) - self.weights / 2
+        positions = np.concatenate([[0.0], centres, [self.weights.sum()]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return float(np.interp(q * self.weights.sum(), positions, values))
+
+    def to_dict(self):
+        empty = not len(self.means)
+        return {"compression": self.compression, "means": self.means.tolist(), "weights": self.weights.tolist(),
+                "min": None if empty else self.min, "max": None if empty else self.max}
+
+    @classmethod
+    def from_dict(cls, state):
+        digest = cls(state["compression"])
+        digest.means = np.asarray(state["means"], dtype=np.float64)
+        digest.weights = np.asarray(state["weights"], dtype=np.float64)
+        if len(digest.means):
+            digest.min, digest.max = state["min"], state["max"]
+        return digest
+
+
+class ValueSketch:
+    """Exact count, mean, std, min and max, a FixedHistogram and a TDigest of one column."""
+
+    def __init__(self, lo, hi, bins, compression=TDIGEST_COMPRESSION):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.histogram = FixedHistogram(lo, hi, bins)
+        self.digest = TDigest(compression)
+
+    @property
+    def min(self):
+        return self.digest.min
+
+    @property
+    def max(self):
+        return self.digest.max
+
+    @property
+    def std(self):
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else math.nan
+
+    def _combine(self, count, mean, m2):
+        # Chan et al.'s pairwise update, so the variance stays exact across merges
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self._m2 += m2 + delta * delta * self.count * count / total
+        self.count = total
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        if not len(values):
+            return
+        mean = float(values.mean())
+        self._combine(len(values), mean, float(((values - mean) ** 2).sum()))
+        self.histogram.add(values)
+        self.digest.add(values)
+
+    def merge(self, other):
+        if other.count:
+            self._combine(other.count, other.mean, other._m2)
+            self.histogram.merge(other.histogram)
+            self.digest.merge(other.digest)
+
+    def quantile(self, q):
+        return self.digest.quantile(q)
+
+    def to_dict(self):
+        # JSON-serializable state; from_dict restores a sketch that keeps merging exactly
+        return {"count": self.count, "mean": self.mean, "m2": self._m2,
+                "histogram": self.histogram.to_dict(), "digest": self.digest.to_dict()}
+
+    @classmethod
+    def from_dict(cls, state):
+        histogram = FixedHistogram.from_dict(state["histogram"])
+        sketch = cls(histogram.edges[0], histogram.edges[-1], len(histogram.edges) - 1,
+                     state["digest"]["compression"])
+        sketch.count, sketch.mean, sketch._m2 = state["count"], state["mean"], state["m2"]
+        sketch.histogram = histogram
+        sketch.digest = TDigest.from_dict(state["digest"])
+        return sketch
+
+    def summary(self):
+        # Same fields as pandas' describe(); the quartiles are t-digest estimates
+        return {
+            'count': float(self.count),
+            'mean': self.mean,
+            'std': self.std,
+            'min': self.min,
+            '25%': self.quantile(0.25),
+            '50%': self.quantile(0.5),
+            '75%': self.quantile(0.75),
+            'max': self.max,
+        }
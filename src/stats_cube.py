@@ -0,0 +1,264 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_lake import (
+    COMPLAINTS_LAKE, MONTH_COLUMN, changed_months, iter_lake, lake_exists, load_lake_info, load_month_checksums
+)
+from preprocessing import NARRATIVE_WORDS_BINS, NARRATIVE_WORDS_MAX, word_counts
+from sketches import ValueSketch
+
+# Pre-aggregated complaint counts behind the dashboard APIs: one row per (product, issue,
+# company, state, month, resolved) with the number of complaints and how many have a
+# narrative, plus narrative length sketches per month. Built in one streaming pass over the
+# full dataset and saved to disk; a refresh re-aggregates only the months that changed.
+STATS_CUBE_DIR = os.getenv("STATS_CUBE_DIR", 'data/stats_cube')
+CUBE_CELLS_FILENAME = 'cells.parquet'
+CUBE_STATE_FILENAME = 'cube.json'
+CUBE_VERSION = 2
+CUBE_CHUNK_ROWS = int(os.getenv("STATS_CUBE_CHUNK_ROWS", "200000"))
+# Per-chunk aggregates are folded into one table once they hold this many cells
+CUBE_CONSOLIDATE_CELLS = 1000000
+
+DIMENSIONS = ['product', 'issue', 'company', 'state', 'month', 'resolved']
+MEASURES = ['complaints', 'narratives']
+# Raw column -> cube dimension (month and resolved are derived)
+DIMENSION_COLUMNS = {'Product': 'product', 'Issue': 'issue', 'Company': 'company', 'State': 'state'}
+RESPONSE_COLUMN = 'Company response to consumer'
+NARRATIVE_COLUMN = 'Consumer complaint narrative'
+SOURCE_DTYPES = {
+    'Date received': 'object',
+    'Product': 'category',
+    'Issue': 'category',
+    'Company': 'category',
+    'State': 'category',
+    RESPONSE_COLUMN: 'category',
+    NARRATIVE_COLUMN: 'object',
+}
+
+# Narrative length histograms: 50 bins over 0-10000 characters
+NARRATIVE_CHARS_MAX = 10000
+NARRATIVE_CHARS_BINS = 50
+
+
+def narrative_sketches():
+    """Empty character- and word-count ValueSketches for complaint narratives."""
+    return {
+        "chars": ValueSketch(0, NARRATIVE_CHARS_MAX, NARRATIVE_CHARS_BINS),
+        "words": ValueSketch(0, NARRATIVE_WORDS_MAX, NARRATIVE_WORDS_BINS),
+    }
+
+
+def _column(frame, name):
+    return frame[name] if name in frame.columns else pd.Series(None, index=frame.index, dtype=object)
+
+
+def _empty_cells():
+    cells = {dim: pd.Series(dtype='category') for dim in DIMENSIONS}
+    cells['resolved'] = pd.Series(dtype=bool)
+    cells.update({measure: pd.Series(dtype=np.int64) for measure in MEASURES})
+    return pd.DataFrame(cells)
+
+
+def _save_atomic(path, write):
+    tmp_path = path + '.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+class StatsCube:
+    """Complaint counts by DIMENSIONS and narrative length sketches by month."""
+
+    def __init__(self):
+        self._clear()
+
+    def _clear(self):
+        self.cells = _empty_cells()
+        # month ('' when the date is missing) -> {"chars": ValueSketch, "words": ValueSketch}
+        self.sketches = {}
+        # What the cube was built from, and the lake's month checksums at that time
+        self.source = None
+        self.checksums = {}
+        self._parts = []
+
+    def add(self, frame):
+        """Folds a chunk of raw complaints (CFPB column names) into the cube."""
+        if not len(frame):
+            return
+        if MONTH_COLUMN in frame.columns:
+            months = frame[MONTH_COLUMN].astype(object)
+        else:
+            months = pd.to_datetime(frame['Date received'], errors='coerce').dt.strftime('%Y-%m').astype(object)
+        keys = {dim: _column(frame, column) for column, dim in DIMENSION_COLUMNS.items()}
+        keys['month'] = months
+        # Same test as the old per-request stats: any "Closed ..." response counts as resolved
+        keys['resolved'] = _column(frame, RESPONSE_COLUMN).astype(object).str.contains('Closed', case=False, na=False)
+        narratives = _column(frame, NARRATIVE_COLUMN)
+        has_narrative = narratives.notna()
+
+        cells = pd.DataFrame(keys).assign(complaints=1, narratives=has_narrative.astype(np.int64))
+        self._parts.append(cells.groupby(DIMENSIONS, observed=True, dropna=False)[MEASURES].sum().reset_index())
+        if sum(len(part) for part in self._parts) > CUBE_CONSOLIDATE_CELLS:
+            self._consolidate()
+        self._add_narratives(narratives[has_narrative], months[has_narrative])
+
+    def _add_narratives(self, narratives, months):
+        if not len(narratives):
+            return
+        lengths = narratives.str.len().to_numpy(dtype=float)
+        words = word_counts(narratives)
+        codes, uniques = pd.factorize(months.fillna(''))
+        for code, month in enumerate(uniques):
+            rows = codes == code
+            sketches = self.sketches.setdefault(month, narrative_sketches())
+            sketches["chars"].add(lengths[rows])
+            sketches["words"].add(words[rows])
+
+    def _consolidate(self):
+        if not self._parts:
+            return
+        cells = pd.concat([self.cells] + self._parts, ignore_index=True)
+        self._parts = []
+        for dim in DIMENSIONS[:-1]:
+            cells[dim] = cells[dim].astype('category')
+        cells = cells.groupby(DIMENSIONS, observed=True, dropna=False)[MEASURES].sum().reset_index()
+        for dim in DIMENSIONS[:-1]:
+            cells[dim] = cells[dim].cat.remove_unused_categories()
+        self.cells = cells
+
+    def _drop_months(self, months):
+        # '' is the cells (and sketches) of complaints without a date
+        self._consolidate()
+        drop = self.cells['month'].isin([m for m in months if m])
+        if '' in months:
+            drop |= self.cells['month'].isna()
+        self.cells = self.cells[~drop].reset_index(drop=True)
+        for month in months:
+            self.sketches.pop(month, None)
+
+    def refresh(self, data_path, lake_dir=None, rebuild=False):
+        """Brings the cube up to date with the lake (if built) or the CSV; True if it changed.
+
+        On a lake that was aggregated before, only months whose content checksum (see
+        data_lake.write_lake) changed are read again. A changed CSV, a different source or
+        `rebuild` aggregates everything again, streaming CUBE_CHUNK_ROWS rows at a time.
+        """
+        if rebuild:
+            self._clear()
+        if lake_dir is not None and lake_exists(lake_dir):
+            info = load_lake_info(lake_dir)
+            source = {"lake": os.path.abspath(lake_dir), "created": info["created"]}
+            if source == self.source:
+                return False
+            checksums = load_month_checksums(lake_dir, info)
+            columns = [c for c in list(DIMENSION_COLUMNS) + [RESPONSE_COLUMN, NARRATIVE_COLUMN]
+                       if c in info["columns"]] + [MONTH_COLUMN]
+            if self.source is not None and self.source.get("lake") == source["lake"]:
+                months = changed_months(checksums, self.checksums)
+                print(f"Updating stats cube from {lake_dir} ({len(months)} months)...")
+                self._drop_months(months)
+                months = [m for m in months if m in checksums]
+                frames = iter_lake(lake_dir, columns=columns, months=months) if months else []
+            else:
+                print(f"Building stats cube from {lake_dir}...")
+                self._clear()
+                frames = iter_lake(lake_dir, columns=columns)
+        else:
+            if not os.path.exists(data_path):
+                return False
+            stat = os.stat(data_path)
+            source = {"csv": os.path.abspath(data_path), "size": stat.st_size, "mtime": int(stat.st_mtime)}
+            if source == self.source:
+                return False
+            print(f"Building stats cube from {data_path}...")
+            self._clear()
+            checksums = {}
+            frames = pd.read_csv(data_path, usecols=lambda c: c in SOURCE_DTYPES, dtype=SOURCE_DTYPES,
+                                 chunksize=CUBE_CHUNK_ROWS)
+
+        for frame in frames:
+            self.add(frame)
+        self._consolidate()
+        self.source = source
+        self.checksums = checksums
+        return True
+
+    def rollup(self, dimensions):
+        """MEASURES summed by `dimensions`; cells with a missing value in them are left out."""
+        self._consolidate()
+        return self.cells.groupby(dimensions, observed=True)[MEASURES].sum()
+
+    def totals(self):
+        self._consolidate()
+        return {measure: int(self.cells[measure].sum()) for measure in MEASURES}
+
+    def narrative_summary(self):
+        """Character- and word-count ValueSketches of every narrative, merged over months."""
+        merged = narrative_sketches()
+        for sketches in self.sketches.values():
+            for name, sketch in sketches.items():
+                merged[name].merge(sketch)
+        return merged
+
+    def save(self, cube_dir):
+        self._consolidate()
+        os.makedirs(cube_dir, exist_ok=True)
+        _save_atomic(os.path.join(cube_dir, CUBE_CELLS_FILENAME), lambda path: self.cells.to_parquet(path, index=False))
+        state = {
+            "version": CUBE_VERSION,
+            "source": self.source,
+            "checksums": self.checksums,
+            "cells": len(self.cells),
+            "sketches": {month: {name: sketch.to_dict() for name, sketch in sketches.items()}
+                         for month, sketches in self.sketches.items()},
+        }
+
+        def write_state(path):
+            with open(path, 'w') as f:
+                json.dump(state, f)
+        # The state goes last; its cell count tells load() whether the cells file belongs to it
+        _save_atomic(os.path.join(cube_dir, CUBE_STATE_FILENAME), write_state)
+
+    @classmethod
+    def load(cls, cube_dir):
+        """The cube saved in `cube_dir`, or an empty one if there is none (or it is incomplete)."""
+        cube = cls()
+        try:
+            with open(os.path.join(cube_dir, CUBE_STATE_FILENAME)) as f:
+                state = json.load(f)
+            cells = pd.read_parquet(os.path.join(cube_dir, CUBE_CELLS_FILENAME))
+        except FileNotFoundError:
+            return cube
+        if state.get("version") != CUBE_VERSION or len(cells) != state["cells"]:
+            return cube
+        cube.cells = cells
+        cube.source = state["source"]
+        cube.checksums = state["checksums"]
+        cube.sketches = {month: {name: ValueSketch.from_dict(sketch) for name, sketch in sketches.items()}
+                         for month, sketches in state["sketches"].items()}
+        return cube
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build or update the complaint stats cube.")
+    parser.add_argument("--input", default='data/raw/complaints.csv', help="Complaints CSV (used without a lake)")
+    parser.add_argument("--lake", default=COMPLAINTS_LAKE, help="Complaints lake, used when it exists")
+    parser.add_argument("--output", default=STATS_CUBE_DIR, help="Cube directory")
+    parser.add_argument("--rebuild", action="store_true", help="Aggregate everything again")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    cube = StatsCube.load(args.output)
+    if cube.refresh(args.input, args.lake, rebuild=args.rebuild):
+        cube.save(args.output)
+        totals = cube.totals()
+        print(f"✅ {totals['complaints']} complaints in {len(cube.cells)} cells saved to {args.output} "
+              f"in {time.perf_counter() - start:.1f}s")
+    elif cube.source is None:
+        print(f"❌ Neither {args.lake} nor {args.input} exists")
+    else:
+        print(f"✅ {args.output} is up to date")
@@ -1,78 +1,101 @@
 import pandas as pd
-import os
 import time
+from metrics import STATS_ENGINE_SECONDS, timed
+from search_index import SEARCH_INDEX_PATH, SearchIndex
+from stats_cube import STATS_CUBE_DIR, StatsCube
+
+def _rounded(value):
+    return int(round(value)) if value == value else 0
+
+def _top(counts, n=5):
+    counts = counts[counts > 0].sort_values(ascending=False, kind='stable')
+    return counts.head(n)
+
+def _slice(counts, key):
+    # counts.loc[key] on the first index level, or no counts
+    return counts.loc[key] if key in counts.index else pd.Series(dtype='int64')
+
+def _text(value, default="Unknown"):
+    return str(value) if value is not None else default
+
+def _month_label(month, fmt):
+    # Cube months are "YYYY-MM"
+    return pd.Timestamp(month + '-01').strftime(fmt)
 
 class StatsEngine:
-    def __init__(self, data_path: str):
+    def __init__(self, data_path: str, lake_dir: str = None, cube_dir: str = STATS_CUBE_DIR,
+                 search_index_path: str = SEARCH_INDEX_PATH):
         self.data_path = data_path
+        self.lake_dir = lake_dir
+        self.cube_dir = cube_dir
+        self.cube = None
+        self.search_index = SearchIndex(search_index_path)
         self._cached_stats = None
         self._last_loaded = 0
+        self._load_seconds = None
 
-    def load_and_compute(self, force=False):
-        # Cache for 24 hours or until forced
-        if not force and self._cached_stats and (time.time() - self._last_loaded < 86400):
+    @timed(STATS_ENGINE_SECONDS, method="load_and_compute")
+    def load_and_compute(self, force=False, rebuild=False):
+        # Cache for 24 hours or until forced; `rebuild` also rebuilds the cube and search index
+        if not (force or rebuild) and self._cached_stats and (time.time() - self._last_loaded < 86400):
             return self._cached_stats
 
-        print(f"Loading stats from {self.data_path} (limit 500k rows)...")
-        if not os.path.exists(self.data_path):
-            print(f"Warning: Data file {self.data_path} not found.")
-            return self._get_fallback_stats()
-
+        start = time.perf_counter()
         try:
-            # Read first 500k rows for stats
-            df = pd.read_csv(self.data_path, nrows=500000, low_memory=False)
-            
-            # Basic cleaning
-            df['Date received'] = pd.to_datetime(df['Date received'], errors='coerce')
-            
-            self.df = df # Cache the dataframe for search/explorer APIs
-            
+            # Aggregates of the full dataset, saved in cube_dir; a refresh only reads what changed
+            cube = self.cube or StatsCube.load(self.cube_dir)
+            if cube.refresh(self.data_path, self.lake_dir, rebuild=rebuild):
+                cube.save(self.cube_dir)
+            if cube.source is None:
+                print(f"Warning: Data file {self.data_path} not found.")
+                return self._get_fallback_stats()
+            self.cube = cube
+            # Full-text index for search, refreshed the same way
+            self.search_index.refresh(self.data_path, self.lake_dir, rebuild=rebuild)
+
+            # Small rollups of the cube; every stats, compare and trends request reads these
+            self._products = cube.rollup(['product'])['complaints']
+            self._product_issues = cube.rollup(['product', 'issue'])['complaints']
+            months = cube.rollup(['month'])['complaints']
+            months.index = months.index.astype(str)
+            self._months = months.sort_index()
+            self._month_issues = cube.rollup(['month', 'issue'])['complaints']
+
             # Product Stats
-            product_counts = df['Product'].value_counts().head(5)
-            by_product = [{"name": str(k), "value": int(v)} for k, v in product_counts.items()]
+            by_product = [{"name": str(k), "value": int(v)} for k, v in _top(self._products).items()]
 
-            # Monthly Stats
-            df['Month'] = df['Date received'].dt.strftime('%b %Y') # e.g. Jun 2025
-            
-            # Sort chronologically, take last 6 months
-            month_counts = df.groupby('Month').size().reset_index(name='complaints')
-            month_counts['date_sort'] = pd.to_datetime(month_counts['Month'], format='%b %Y')
-            month_counts = month_counts.sort_values('date_sort').tail(6)
-            
-            # Count resolved (Closed)
-            resolved_mask = df['Company response to consumer'].str.contains('Closed', na=False, case=False)
-            resolved_counts = df[resolved_mask].groupby('Month').size().reset_index(name='resolved')
-            
-            monthly = pd.merge(month_counts, resolved_counts, on='Month', how='left').fillna(0)
-            
+            # Monthly Stats: last 6 months, with resolved (Closed) counts
+            resolved = _slice(cube.rollup(['resolved', 'month'])['complaints'], True)
             by_month = [
                 {
-                    "month": str(row['Month']).split(' ')[0], # Just short month name
-                    "complaints": int(row['complaints']), 
-                    "resolved": int(row['resolved'])
-                } 
-                for _, row in monthly.iterrows()
+                    "month": _month_label(month, '%b'), # Just short month name
+                    "complaints": int(count),
+                    "resolved": int(resolved.get(month, 0))
+                }
+                for month, count in self._months.tail(6).items()
             ]
 
             # Top Issues
-            issue_counts = df['Issue'].value_counts().head(5)
-            top_issues = [{"issue": str(k), "count": int(v)} for k, v in issue_counts.items()]
+            top_issues = [{"issue": str(k), "count": int(v)}
+                          for k, v in _top(cube.rollup(['issue'])['complaints']).items()]
 
             # Top Companies
-            company_counts = df['Company'].value_counts().head(5)
-            top_companies = [{"company": str(k), "count": int(v)} for k, v in company_counts.items()]
+            top_companies = [{"company": str(k), "count": int(v)}
+                             for k, v in _top(cube.rollup(['company'])['complaints']).items()]
 
             # Narrative Stats
-            total = len(df)
-            has_narrative = df['Consumer complaint narrative'].notna().sum()
-            avg_len = 0
-            if has_narrative > 0:
-                avg_len = int(df['Consumer complaint narrative'].dropna().str.len().mean())
+            totals = cube.totals()
+            sketches = cube.narrative_summary()
+            chars, words = sketches["chars"], sketches["words"]
 
             narrative_stats = {
-                "total": int(total),
-                "withNarrative": int(has_narrative),
-                "avgLength": avg_len
+                "total": totals["complaints"],
+                "withNarrative": totals["narratives"],
+                "avgLength": int(chars.mean),
+                "medianLength": _rounded(chars.quantile(0.5)),
+                "avgWords": _rounded(words.mean),
+                "medianWords": _rounded(words.quantile(0.5)),
+                "p90Words": _rounded(words.quantile(0.9)),
             }
 
             self._cached_stats = {
@@ -83,12 +106,22 @@ class StatsEngine:
                 "narrativeStats": narrative_stats
             }
             self._last_loaded = time.time()
+            self._load_seconds = time.perf_counter() - start
             return self._cached_stats
 
         except Exception as e:
             print(f"Error computing stats: {e}")
             return self._get_fallback_stats()
 
+    def details(self):
+        return {
+            "cube_cells": len(self.cube.cells) if self.cube is not None else 0,
+            "cube_months": len(self._months) if self.cube is not None else 0,
+            "search_index_rows": (self.search_index.state() or {}).get("rows", 0),
+            "load_seconds": round(self._load_seconds, 3) if self._load_seconds is not None else None,
+        }
+
+    @timed(STATS_ENGINE_SECONDS, method="get_stats")
     def get_stats(self):
         if not self._cached_stats:
             return self.load_and_compute()
@@ -100,44 +133,29 @@ class StatsEngine:
             "byMonth": [{"month": "Jan", "complaints": 0, "resolved": 0}],
             "topIssues": [{"issue": "Unknown", "count": 0}],
             "topCompanies": [{"company": "Unknown", "count": 0}],
-            "narrativeStats": {"total": 0, "withNarrative": 0, "avgLength": 0}
+            "narrativeStats": {"total": 0, "withNarrative": 0, "avgLength": 0, "medianLength": 0,
+                               "avgWords": 0, "medianWords": 0, "p90Words": 0}
         }
 
-    def search_complaints(self, query: str = None, product: str = None, page: int = 1, limit: int = 50):
-        if not hasattr(self, 'df') or self.df is None:
+    @timed(STATS_ENGINE_SECONDS, method="search_complaints")
+    def search_complaints(self, query: str = None, product: str = None, page: int = 1, limit: int = 50,
+                          sort: str = None):
+        if not self.search_index.exists():
             return {"data": [], "total": 0, "page": page, "pages": 0}
-            
-        filtered = self.df.copy()
-        
-        if product:
-            filtered = filtered[filtered['Product'] == product]
-            
-        if query:
-            # Search in narrative or ID or company
-            q = query.lower()
-            mask = (
-                filtered['Consumer complaint narrative'].str.lower().fillna('').str.contains(q) |
-                filtered['Complaint ID'].astype(str).str.contains(q) |
-                filtered['Company'].str.lower().fillna('').str.contains(q)
-            )
-            filtered = filtered[mask]
-            
-        total = len(filtered)
-        start = (page - 1) * limit
-        end = start + limit
-        
-        page_data = filtered.iloc[start:end]
+
+        # Search in narrative or ID or company; sort is "relevance" or "date" (see SearchIndex.search)
+        total, rows = self.search_index.search(query, product, sort, page, limit)
         
         results = []
-        for _, row in page_data.iterrows():
+        for row in rows:
             results.append({
-                "id": f"CFPB-{row['Complaint ID']}" if pd.notna(row['Complaint ID']) else "CFPB-0000",
-                "product": str(row['Product']) if pd.notna(row['Product']) else "Unknown",
-                "issue": str(row['Issue']) if pd.notna(row['Issue']) else "Unknown",
-                "company": str(row['Company']) if pd.notna(row['Company']) else "Unknown",
-                "state": str(row['State']) if pd.notna(row['State']) else "Unknown",
-                "date": str(row['Date received'].strftime('%Y-%m-%d')) if pd.notna(row['Date received']) else "Unknown",
-                "narrative": str(row['Consumer complaint narrative']) if pd.notna(row['Consumer complaint narrative']) else ""
+                "id": f"CFPB-{row['complaint_id']}" if row['complaint_id'] is not None else "CFPB-0000",
+                "product": _text(row['product']),
+                "issue": _text(row['issue']),
+                "company": _text(row['company']),
+                "state": _text(row['state']),
+                "date": _text(row['date']),
+                "narrative": _text(row['narrative'], "")
             })
             
         return {
@@ -147,16 +165,16 @@ class StatsEngine:
             "pages": (total + limit - 1) // limit
         }
 
+    @timed(STATS_ENGINE_SECONDS, method="compare_products")
     def compare_products(self, productA: str, productB: str):
-        if not hasattr(self, 'df') or self.df is None:
+        if self.cube is None:
             return {"productA": {}, "productB": {}}
             
         def get_prod_stats(p):
-            pdf = self.df[self.df['Product'] == p]
-            top_issues = pdf['Issue'].value_counts().head(5)
+            top_issues = _top(_slice(self._product_issues, p))
             return {
                 "name": p,
-                "totalComplaints": len(pdf),
+                "totalComplaints": int(self._products.get(p, 0)),
                 "topIssues": [{"issue": str(k), "count": int(v)} for k, v in top_issues.items()]
             }
             
@@ -165,22 +183,20 @@ class StatsEngine:
             "productB": get_prod_stats(productB)
         }
 
+    @timed(STATS_ENGINE_SECONDS, method="get_trends")
     def get_trends(self):
-        if not hasattr(self, 'df') or self.df is None:
+        if self.cube is None:
             return {"trending": [], "timeline": []}
             
-        # Get last 2 months for MoM comparison
-        recent_months = self.df['Month'].drop_duplicates().tail(2).tolist()
+        # Last 2 months for MoM comparison
+        recent_months = self._months.index[-2:].tolist()
         if len(recent_months) < 2:
             return {"trending": [], "timeline": []}
             
         prev_month, curr_month = recent_months[0], recent_months[1]
         
-        curr_df = self.df[self.df['Month'] == curr_month]
-        prev_df = self.df[self.df['Month'] == prev_month]
-        
-        curr_issues = curr_df['Issue'].value_counts().head(5)
-        prev_issues = prev_df['Issue'].value_counts()
+        curr_issues = _top(_slice(self._month_issues, curr_month))
+        prev_issues = _slice(self._month_issues, prev_month)
         
         trending = []
         for issue, count in curr_issues.items():
@@ -195,9 +211,9 @@ class StatsEngine:
                 "count": int(count)
             })
             
-        # Overall timeline
-        timeline_df = self.df.groupby('Month').size().reset_index(name='count').tail(12)
-        timeline = [{"date": str(row['Month']), "count": int(row['count'])} for _, row in timeline_df.iterrows()]
+        # Overall timeline: last 12 months
+        timeline = [{"date": _month_label(month, '%b %Y'), "count": int(count)}
+                    for month, count in self._months.tail(12).items()]
         
         return {
             "trending": trending,
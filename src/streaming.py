@@ -0,0 +1,73 @@
+import asyncio
+import threading
+
+# Max chunks buffered per stream before new tokens are merged into the last chunk
+STREAM_MAX_BUFFERED_CHUNKS = 32
+
+
+class AsyncTokenStream:
+    """Token sink that hands text from the generation thread to an asyncio consumer.
+
+    The producer never blocks: tokens are handed to the event loop with
+    `call_soon_threadsafe`. When the consumer falls behind (e.g. a slow socket), new
+    tokens are merged into the last buffered chunk, so a slow client receives fewer,
+    larger messages and the buffer stays bounded. `cancel()` sets the flag the
+    generation stopping criteria watches.
+    """
+
+    def __init__(self, loop=None, max_buffered=STREAM_MAX_BUFFERED_CHUNKS):
+        self._loop = loop or asyncio.get_running_loop()
+        self._max_buffered = max_buffered
+        self._chunks = []
+        self._wakeup = asyncio.Event()
+        self._done = False
+        self._error = None
+        self.cancelled = threading.Event()
+        self.coalesced = 0
+
+    # --- Producer side (any thread) ---
+
+    def put(self, text):
+        self._loop.call_soon_threadsafe(self._append, text)
+
+    def close(self, error=None):
+        self._loop.call_soon_threadsafe(self._finish, error)
+
+    def cancel(self):
+        self.cancelled.set()
+        self._loop.call_soon_threadsafe(self._abort)
+
+    # --- Loop side ---
+
+    def _append(self, text):
+        if self._done:
+            return
+        if len(self._chunks) >= self._max_buffered:
+            self._chunks[-1] += text
+            self.coalesced += 1
+        else:
+            self._chunks.append(text)
+        self._wakeup.set()
+
+    def _finish(self, error):
+        if not self._done:
+            self._done = True
+            self._error = error
+        self._wakeup.set()
+
+    def _abort(self):
+        self._chunks.clear()
+        self._finish(None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while not self._chunks:
+            if self._done:
+                if self._error is not None:
+                    raise self._error
+                raise StopAsyncIteration
+            self._wakeup.clear()
+            await self._wakeup.wait()
+        return self._chunks.pop(0)
@@ -122,13 +122,14 @@ export async function updateProfile(name?: string, password?: string): Promise<a
     return response.json();
 }
 
-export async function searchComplaints(query: string, product?: string, page: number = 1): Promise<any> {
+export async function searchComplaints(query: string, product?: string, page: number = 1, sort?: "relevance" | "date"): Promise<any> {
     const params = new URLSearchParams({
         q: query || "",
         page: page.toString(),
         limit: "20"
     });
     if (product) params.append("product", product);
+    if (sort) params.append("sort", sort);
     
     const response = await fetch(`${API_URL}/api/complaints/search?${params.toString()}`, {
         headers: getAuthHeaders()
@@ -82,6 +82,10 @@ export interface AnalyticsData {
     total: number;
     withNarrative: number;
     avgLength: number;
+    medianLength: number;
+    avgWords: number;
+    medianWords: number;
+    p90Words: number;
   };
 }
 